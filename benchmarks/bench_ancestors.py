@@ -0,0 +1,77 @@
+"""
+Benchmark: nestedCount computation (ancestor counts for every node).
+
+Compares graph_core.count_ancestors (single pass, SCC condensation + bitsets) with the
+previous approach of calling nx.ancestors() once per node, on layered random DAGs
+shaped like a medallion warehouse. The networkx baseline is skipped above
+--baseline-limit nodes because it grows quadratically.
+
+Usage:
+    python benchmarks/bench_ancestors.py
+    python benchmarks/bench_ancestors.py --sizes 100 1000 10000 50000 --fan-in 3 --cycles 5
+"""
+import argparse
+import random
+import time
+
+import networkx as nx
+
+from sql_dag_flow.graph_core import count_ancestors
+
+
+def layered_dag(node_count, fan_in, layers=20, cycles=0, seed=0):
+    """Random DAG where every node depends on `fan_in` nodes from earlier layers."""
+    rng = random.Random(seed)
+    per_layer = max(1, node_count // layers)
+    names = [f"t{i}" for i in range(node_count)]
+    edges = []
+    for i in range(per_layer, node_count):
+        upstream_end = (i // per_layer) * per_layer
+        for _ in range(fan_in):
+            edges.append((names[rng.randrange(upstream_end)], names[i]))
+    # Back edges create cycles, which must be handled via SCC condensation
+    for _ in range(cycles):
+        a, b = sorted(rng.sample(range(node_count), 2))
+        edges.append((names[b], names[a]))
+    return edges
+
+
+def networkx_baseline(edges):
+    G = nx.DiGraph()
+    G.add_edges_from(edges)
+    return {n: len(nx.ancestors(G, n)) for n in G.nodes}
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000, 10000, 25000, 50000])
+    arg_parser.add_argument("--fan-in", type=int, default=3)
+    arg_parser.add_argument("--layers", type=int, default=20, help="Depth of the generated DAG")
+    arg_parser.add_argument("--cycles", type=int, default=0, help="Number of back edges to inject")
+    arg_parser.add_argument("--baseline-limit", type=int, default=5000,
+                            help="Largest size for which the nx.ancestors baseline is run")
+    args = arg_parser.parse_args()
+
+    print(f"{'nodes':>8} {'edges':>8} {'single-pass (s)':>16} {'nx.ancestors (s)':>17} {'speedup':>8}")
+    for size in args.sizes:
+        edges = layered_dag(size, args.fan_in, layers=args.layers, cycles=args.cycles)
+
+        start = time.perf_counter()
+        counts = count_ancestors(edges)
+        fast = time.perf_counter() - start
+
+        baseline = "-"
+        speedup = "-"
+        if size <= args.baseline_limit:
+            start = time.perf_counter()
+            expected = networkx_baseline(edges)
+            slow = time.perf_counter() - start
+            assert counts == expected, "count_ancestors disagrees with nx.ancestors"
+            baseline = f"{slow:.3f}"
+            speedup = f"{slow / fast:.0f}x"
+
+        print(f"{size:>8} {len(edges):>8} {fast:>16.3f} {baseline:>17} {speedup:>8}")
+
+
+if __name__ == "__main__":
+    main()
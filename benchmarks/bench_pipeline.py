@@ -0,0 +1,175 @@
+"""
+Benchmark: end-to-end pipeline on synthetic medallion warehouses.
+
+For every size, generates a warehouse with benchmarks/warehouse.py and times:
+  - parse_sql_files (cold, no parse cache)
+  - build_graph (dependency resolution, edges, nested counts)
+  - the HTTP endpoints, in-process through FastAPI's TestClient: a cold /graph,
+    a conditional /graph answered with 304, /graph/subgraph and /node/lineage
+Peak Python memory of parsing and graph building is measured with tracemalloc in a
+separate pass (tracemalloc slows allocation-heavy code down, so it never overlaps a
+timed run; it also only sees the main process, so use --workers 1 for it to be meaningful).
+
+Results are printed as a table and, with --output, written as JSON. --compare prints
+the ratio of every timing against a previous JSON result.
+
+Usage:
+    python benchmarks/bench_pipeline.py
+    python benchmarks/bench_pipeline.py --sizes 1000 10000 50000 --fan-in 4 --cycles 10 --output after.json
+    python benchmarks/bench_pipeline.py --sizes 1000 10000 --compare before.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import sqlglot
+
+from sql_dag_flow.parser import parse_sql_files, build_graph
+from sql_dag_flow.resolver import TableResolver
+
+from warehouse import generate, add_generator_arguments
+
+
+def timed(function, *args, **kwargs):
+    started = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def peak_memory(function, *args, **kwargs):
+    """Peak traced Python memory (MB) while running function."""
+    tracemalloc.start()
+    try:
+        function(*args, **kwargs)
+        return tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+    finally:
+        tracemalloc.stop()
+
+
+def bench_library(directory, args):
+    def parse():
+        return parse_sql_files(directory, dialect=args.dialect, cache=None, workers=args.workers)
+
+    def build(tables):
+        resolver = TableResolver.from_tables(tables, dialect=args.dialect)
+        return build_graph(tables, resolver=resolver, dialect=args.dialect)
+
+    tables, parse_seconds = timed(parse)
+    (nodes, edges), build_seconds = timed(build, tables)
+    result = {
+        "nodes": len(nodes),
+        "edges": len(edges),
+        "seconds": {"parse_sql_files": parse_seconds, "build_graph": build_seconds},
+    }
+    if args.memory:
+        result["peak_mb"] = {"parse_sql_files": peak_memory(parse), "build_graph": peak_memory(build, tables)}
+    return result, nodes
+
+
+def bench_http(directory, args, nodes, cache_dir):
+    from fastapi.testclient import TestClient
+    from sql_dag_flow import main
+    from sql_dag_flow.registry import ProjectRegistry
+
+    main.CURRENT_DIRECTORY = directory
+    # Cold, and keeps the user's cache untouched
+    main.REGISTRY = ProjectRegistry(cache_root=cache_dir, metrics=main.METRICS)
+    main.PARSE_WORKERS = args.workers
+    client = TestClient(main.app)
+    params = {"dialect": args.dialect, "compact": "true"}
+
+    response, cold = timed(client.get, "/graph", params=params)
+    response.raise_for_status()
+    size = len(response.content)
+    etag = response.headers.get("etag")
+    response, conditional = timed(client.get, "/graph", params=params, headers={"If-None-Match": etag or ""})
+
+    # A gold table at the end of the graph has the deepest lineage
+    target = next(n["id"] for n in reversed(nodes) if n["data"].get("layer") == "gold")
+    _, subgraph = timed(client.get, "/graph/subgraph", params={"id": target, "direction": "upstream",
+                                                               "dialect": args.dialect})
+    _, lineage = timed(client.get, "/node/lineage", params={"id": target})
+    return {
+        "seconds": {"GET /graph": cold, "GET /graph (304)": conditional, "GET /graph/subgraph": subgraph,
+                    "GET /node/lineage": lineage},
+        "graph_bytes": size, # Decoded JSON size
+        "conditional_status": response.status_code,
+    }
+
+
+def run(size, args):
+    workdir = tempfile.mkdtemp(prefix="sql_dag_flow_bench_")
+    try:
+        directory = os.path.join(workdir, "warehouse")
+        summary, generate_seconds = timed(
+            generate, directory, files=size, fan_in=args.fan_in, cte_depth=args.cte_depth, nesting=args.nesting,
+            cycles=args.cycles, dialect=args.dialect, seed=args.seed)
+
+        library, nodes = bench_library(directory, args)
+        result = {"files": size, "generator": summary, "nodes": library.pop("nodes"), "edges": library.pop("edges"),
+                  "seconds": {"generate": generate_seconds, **library.pop("seconds")}}
+        result.update(library)
+        if args.http:
+            http = bench_http(directory, args, nodes, os.path.join(workdir, "cache"))
+            result["seconds"].update(http.pop("seconds"))
+            result.update(http)
+        return result
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def print_run(result, baseline=None):
+    print(f"{result['files']} files -> {result['nodes']} nodes, {result['edges']} edges")
+    for name, seconds in result["seconds"].items():
+        line = f"  {name:<22} {seconds:10.3f} s"
+        if baseline and name in baseline.get("seconds", {}) and baseline["seconds"][name]:
+            line += f"  ({seconds / baseline['seconds'][name]:.2f}x of baseline)"
+        print(line)
+    for name, megabytes in result.get("peak_mb", {}).items():
+        print(f"  {name + ' peak':<22} {megabytes:10.1f} MB")
+    if "graph_bytes" in result:
+        print(f"  {'/graph payload':<22} {result['graph_bytes'] / 1024:10.1f} KB")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000])
+    add_generator_arguments(arg_parser)
+    arg_parser.add_argument("--workers", type=int, default=1, help="Parser processes (0 = one per CPU core)")
+    arg_parser.add_argument("--no-memory", dest="memory", action="store_false",
+                            help="Skip the tracemalloc passes")
+    arg_parser.add_argument("--no-http", dest="http", action="store_false", help="Skip the HTTP endpoints")
+    arg_parser.add_argument("--output", help="Write the results as JSON to this file")
+    arg_parser.add_argument("--compare", help="JSON results of a previous run to compare against")
+    args = arg_parser.parse_args()
+
+    baselines = {}
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baselines = {run["files"]: run for run in json.load(f)["runs"]}
+
+    report = {
+        "environment": {"python": platform.python_version(), "platform": platform.platform(),
+                        "sqlglot": sqlglot.__version__, "cpus": os.cpu_count()},
+        "parameters": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "runs": [],
+    }
+    for size in args.sizes:
+        result = run(size, args)
+        report["runs"].append(result)
+        print_run(result, baselines.get(size))
+        sys.stdout.flush()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
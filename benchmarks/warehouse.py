@@ -0,0 +1,132 @@
+"""
+Synthetic medallion warehouse generator for benchmarks.
+
+Writes a tree of bronze/silver/gold .sql files shaped like a real dbt-less warehouse:
+bronze tables read external raw sources, silver tables read bronze and earlier silver
+tables, gold tables read silver and earlier gold tables. Every file is a
+CREATE OR REPLACE TABLE ... AS WITH <cte chain> SELECT ... joining `fan_in` upstream tables.
+Output is deterministic for a given seed.
+
+Usage:
+    python benchmarks/warehouse.py /tmp/warehouse --files 10000
+    python benchmarks/warehouse.py /tmp/warehouse --files 1000 --fan-in 4 --cte-depth 3 --nesting 2 --cycles 5
+"""
+import argparse
+import os
+import random
+
+LAYERS = ("bronze", "silver", "gold")
+LAYER_SHARES = (0.3, 0.4, 0.3)
+DATASETS_PER_LAYER = 8
+COLUMNS = ("id", "customer_id", "amount", "status", "updated_at")
+
+
+def _table_ref(dialect, project, dataset, name):
+    if dialect == "bigquery":
+        return f"`{project}.{dataset}.{name}`"
+    return f"{dataset}.{name}"
+
+
+def _file_sql(dialect, target, sources, cte_depth):
+    """CREATE OR REPLACE TABLE target AS WITH s0 .. s(cte_depth-1) SELECT ... from `sources`."""
+    columns = ", ".join(COLUMNS)
+    head, *joined = sources
+    from_clause = f"{head} AS t0" + "".join(
+        f"\n    LEFT JOIN {source} AS t{i} ON t0.id = t{i}.id" for i, source in enumerate(joined, start=1))
+    base = f"SELECT t0.id, t0.customer_id, t0.amount, t0.status, t0.updated_at\n    FROM {from_clause}"
+
+    if cte_depth <= 0:
+        return f"CREATE OR REPLACE TABLE {target} AS\n{base};\n"
+
+    ctes = [f"s0 AS (\n    {base}\n)"]
+    for level in range(1, cte_depth):
+        ctes.append(f"s{level} AS (\n    SELECT {columns}\n    FROM s{level - 1}\n"
+                    f"    WHERE amount > {level}\n)")
+    return (f"CREATE OR REPLACE TABLE {target} AS\nWITH " + ",\n".join(ctes) +
+            f"\nSELECT {columns}, COUNT(*) OVER (PARTITION BY customer_id) AS n\nFROM s{cte_depth - 1};\n")
+
+
+def _folder(rng, layer, dataset, nesting):
+    parts = [layer, dataset]
+    parts += [f"part_{rng.randrange(4)}" for _ in range(nesting)]
+    return os.path.join(*parts)
+
+
+def generate(directory, files=1000, fan_in=3, cte_depth=2, nesting=1, cycles=0, dialect="bigquery",
+             project="warehouse", seed=0):
+    """
+    Writes `files` .sql files under `directory`. Returns a summary dict
+    (files, tables per layer, expected dependency count, injected cycles).
+    """
+    rng = random.Random(seed)
+    counts = [int(files * share) for share in LAYER_SHARES]
+    counts[-1] = files - sum(counts[:-1])
+
+    tables = [] # (layer, dataset, name, folder)
+    for layer, count in zip(LAYERS, counts):
+        for i in range(count):
+            dataset = f"{layer}_{i % DATASETS_PER_LAYER}"
+            tables.append((layer, dataset, f"{layer}_t{i}", _folder(rng, layer, dataset, nesting)))
+
+    starts = [sum(counts[:i]) for i in range(len(LAYERS))] # index of the first table of each layer
+    upstream_of = {} # table index -> [table index]
+    dependencies = 0
+    for layer_index, (start, count) in enumerate(zip(starts, counts)):
+        for index in range(start, start + count):
+            if layer_index == 0:
+                upstream_of[index] = []
+                continue
+            # The previous layer plus earlier tables of the same layer, which gives the graph depth
+            pool = range(starts[layer_index - 1], index)
+            upstream_of[index] = rng.sample(pool, min(fan_in, len(pool)))
+
+    # Back edges: an earlier (non-bronze) table also reads from a later one
+    injected = 0
+    if len(tables) - starts[1] >= 2:
+        for _ in range(cycles):
+            a = rng.randrange(starts[1], len(tables) - 1)
+            upstream_of[a].append(rng.randrange(a + 1, len(tables)))
+            injected += 1
+
+    for index, (layer, dataset, name, folder) in enumerate(tables):
+        if layer == "bronze":
+            sources = [_table_ref(dialect, "raw", f"source_{rng.randrange(DATASETS_PER_LAYER)}",
+                                  f"{name}_raw")]
+        else:
+            sources = [_table_ref(dialect, project, tables[u][1], tables[u][2]) for u in upstream_of[index]]
+        dependencies += len(sources)
+
+        path = os.path.join(directory, folder)
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, f"{name}.sql"), "w", encoding="utf-8") as f:
+            f.write(_file_sql(dialect, _table_ref(dialect, project, dataset, name), sources, cte_depth))
+
+    return {"files": len(tables), "tables": dict(zip(LAYERS, counts)), "dependencies": dependencies,
+            "cycles": injected}
+
+
+def add_generator_arguments(arg_parser):
+    arg_parser.add_argument("--fan-in", type=int, default=3, help="Upstream tables joined by each table")
+    arg_parser.add_argument("--cte-depth", type=int, default=2, help="Length of the CTE chain in each file")
+    arg_parser.add_argument("--nesting", type=int, default=1,
+                            help="Extra folder levels below <layer>/<dataset>/")
+    arg_parser.add_argument("--cycles", type=int, default=0, help="Number of back references to inject")
+    arg_parser.add_argument("--dialect", default="bigquery",
+                            help="bigquery writes `project.dataset.table`, others dataset.table")
+    arg_parser.add_argument("--seed", type=int, default=0)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("directory")
+    arg_parser.add_argument("--files", type=int, default=1000)
+    add_generator_arguments(arg_parser)
+    args = arg_parser.parse_args()
+
+    summary = generate(args.directory, files=args.files, fan_in=args.fan_in, cte_depth=args.cte_depth,
+                       nesting=args.nesting, cycles=args.cycles, dialect=args.dialect, seed=args.seed)
+    print(summary)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,7 @@ import '@xyflow/react/dist/style.css';
 // import dagre from 'dagre'; // Removed in favor of ELK
 import { getLayoutedElements } from './algorithms/elk';
 import { toPng, toSvg } from 'html-to-image';
-import { fetchGraph, saveGraph, loadGraphState, setPath, getPath, scanFolders, fetchFilteredGraph } from './api';
+import { fetchGraph, saveGraph, loadGraphState, setPath, getPath, scanFolders, fetchFilteredGraph, subscribeGraphEvents, streamProgressiveGraph, fetchSubgraph, expandCluster } from './api';
 import './index.css';
 import CustomNode from './CustomNode';
 import AnnotationNode from './AnnotationNode';
@@ -44,6 +44,9 @@ const Flow = () => {
   const nodesRef = useRef([]);
   useEffect(() => { edgesRef.current = edges; }, [edges]);
   useEffect(() => { nodesRef.current = nodes; }, [nodes]);
+  // Graph options of the loaded graph, read by node actions that query the server
+  const graphOptionsRef = useRef({ dialect: 'bigquery', discovery: false });
+  useEffect(() => { graphOptionsRef.current = { dialect, discovery: discoveryMode }; }, [dialect, discoveryMode]);
 
   // New Features State
   const [sidebarOpen, setSidebarOpen] = useState(false);
@@ -181,10 +184,13 @@ const Flow = () => {
         setHiddenNodeIds(prev => [...new Set([...prev, ...ancestors])]);
         break;
       case 'onlyTree': // Show ONLY this node and its full lineage
-        const lineage = getLineage(nodeId);
-        const allNodeIds = nodesRef.current.map(n => n.id);
-        const toHide = allNodeIds.filter(id => !lineage.has(id));
-        setHiddenNodeIds(toHide);
+        // The server answers from its adjacency index; walk the local edges if it can't
+        fetchSubgraph(nodeId, { ...graphOptionsRef.current, compact: true }).then(subgraph => {
+          const lineage = subgraph ? new Set(subgraph.nodes.map(n => n.id)) : getLineage(nodeId);
+          const allNodeIds = nodesRef.current.map(n => n.id);
+          const toHide = allNodeIds.filter(id => !lineage.has(id));
+          setHiddenNodeIds(toHide);
+        });
         break;
       case 'selectTree': // Select full lineage
         const fullLineage = getLineage(nodeId);
@@ -405,11 +411,29 @@ const Flow = () => {
     // Use provided subfolders, or fall back to state, or null (all)
     const foldersToUse = subfolders !== null ? subfolders : selectedSubfolders;
 
-    let data;
-    if (foldersToUse) {
-      data = await fetchFilteredGraph(foldersToUse, dialect, currentMode);
-    } else {
-      data = await fetchGraph({ dialect, discovery: currentMode });
+    let data = null;
+    if (nodes.length === 0 && !currentMode) {
+      // Empty canvas: paint a skeleton right away and merge the full parse as it lands
+      // (discovery mode loads the clustered graph in one request instead)
+      closeProgressiveRef.current?.();
+      data = await new Promise(resolve => {
+        closeProgressiveRef.current = streamProgressiveGraph(
+          { dialect, discovery: currentMode, subfolders: foldersToUse, layout: true },
+          {
+            onSkeleton: resolve,
+            onRefine: delta => applyGraphDeltaRef.current(delta),
+            onError: () => resolve(null) // Older server or stream failure: fall back below
+          }
+        );
+      });
+    }
+    if (!data) {
+      if (foldersToUse) {
+        data = await fetchFilteredGraph(foldersToUse, dialect, currentMode, true, true, currentMode);
+      } else {
+        // Discovery mode: ghost tables per dataset and CTEs per file arrive as cluster nodes
+        data = await fetchGraph({ dialect, discovery: currentMode, compact: true, layout: true, cluster: currentMode });
+      }
     }
 
     if (data.error) return;
@@ -420,10 +444,15 @@ const Flow = () => {
       currentPositions[n.id] = n.position;
     });
 
+    // Server-side layout (cached per graph): [x, y] per node id
+    const serverPosition = (id) => data.layout && data.layout[id]
+      ? { x: data.layout[id][0], y: data.layout[id][1] }
+      : null;
+
     const styledNodes = data.nodes.map(node => ({
       ...node,
       type: 'custom',
-      position: currentPositions[node.id] || { x: 0, y: 0 }, // Preserve or default
+      position: currentPositions[node.id] || serverPosition(node.id) || { x: 0, y: 0 }, // Preserve, server layout or default
       data: {
         ...node.data,
         layer: node.data.layer || 'other',
@@ -463,13 +492,14 @@ const Flow = () => {
     // Only run auto-layout if we really strictly need it (empty start)
     // or if we decide new nodes need it. 
     // IF we are refreshing, we likely want to keep existing layout.
-    if (nodes.length === 0) {
+    if (nodes.length === 0 && !data.layout) {
+      // Older servers don't send a layout: lay out in the browser
       const layouted = await getLayoutedElements(styledNodes, data.edges);
       finalNodes = layouted.nodes;
       finalEdges = layouted.edges;
     } else {
       // We preserve positions from `currentPositions` applied above.
-      // But what about NEW nodes? They are at 0,0.
+      // NEW nodes take their server-side position when the server sent a layout, else 0,0.
       // We can run a layout calculation but only apply it to nodes that are (0,0) and seemingly new?
       // Dagre layout is global.
 
@@ -483,13 +513,71 @@ const Flow = () => {
     setEdges(finalEdges);
   };
 
+  // Live updates (watch mode): merge node/edge deltas, keeping positions and UI handlers
+  const applyGraphDelta = (delta) => {
+    const removedNodeIds = new Set(delta.nodes.removed);
+    const changedNodes = [...delta.nodes.added, ...delta.nodes.updated];
+
+    setNodes(nds => {
+      const byId = new Map(nds.map(n => [n.id, n]));
+      removedNodeIds.forEach(id => byId.delete(id));
+      changedNodes.forEach(node => {
+        const existing = byId.get(node.id);
+        byId.set(node.id, {
+          ...(existing || node),
+          type: 'custom',
+          position: existing ? existing.position
+            : (delta.positions && delta.positions[node.id]
+              ? { x: delta.positions[node.id][0], y: delta.positions[node.id][1] }
+              : { x: 0, y: 0 }),
+          data: {
+            ...(existing ? existing.data : {}),
+            ...node.data,
+            layer: node.data.layer || 'other',
+            theme,
+            styleMode: nodeStyle,
+            palette,
+            onContextMenu: onNodeContextMenu,
+            onEdit: onEdit,
+            onAction: handleApplyAction
+          }
+        });
+      });
+      return Array.from(byId.values());
+    });
+
+    const removedEdgeIds = new Set(delta.edges.removed);
+    const addedEdgeIds = new Set(delta.edges.added.map(e => e.id));
+    setEdges(eds => [
+      ...eds.filter(e => !removedEdgeIds.has(e.id) && !addedEdgeIds.has(e.id)),
+      ...delta.edges.added
+    ]);
+  };
+
+  // Double-clicking a cluster node (discovery mode) replaces it with its member nodes
+  const expandClusterNode = async (node) => {
+    const result = await expandCluster(node.id, { ...graphOptionsRef.current, compact: true, layout: true });
+    if (!result) return;
+    applyGraphDelta({
+      nodes: { added: result.nodes, updated: [], removed: [node.id] },
+      edges: { added: result.edges, removed: edges.filter(e => e.source === node.id).map(e => e.id) },
+      positions: result.layout
+    });
+  };
+
+  // Keep the subscription stable while always applying deltas with the latest state
+  const applyGraphDeltaRef = useRef(applyGraphDelta);
+  const closeProgressiveRef = useRef(null);
+  applyGraphDeltaRef.current = applyGraphDelta;
+  useEffect(() => subscribeGraphEvents(delta => applyGraphDeltaRef.current(delta)), []);
+
   // Save Handler (Save As)
   const handleSave = async () => {
     if (!rfInstance) return;
 
-    let filename = prompt("Enter filename to save configuration:", currentConfigFile);
+    let filename = prompt("Enter filename to save configuration (.ndjson or .ndjson.gz for large graphs):", currentConfigFile);
     if (!filename) return;
-    if (!filename.endsWith(".json")) filename += ".json";
+    if (![".json", ".ndjson", ".ndjson.gz"].some(ext => filename.endsWith(ext))) filename += ".json";
 
     const flow = rfInstance.toObject();
     const stateToSave = {
@@ -1202,6 +1290,9 @@ const Flow = () => {
           setSelectedNode(prev => (prev && prev.id === node.id) ? null : node.data);
           setDetailsNode(null); // Close details on left click
         }}
+        onNodeDoubleClick={(event, node) => {
+          if (node.data.clusterSize) expandClusterNode(node);
+        }}
         panOnDrag={selectionMode === 'pan'}
         selectionOnDrag={selectionMode === 'select'}
         panOnScroll={true}
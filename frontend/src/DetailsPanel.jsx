@@ -2,6 +2,7 @@ import React, { useState, useEffect, useCallback } from 'react';
 import { Globe, FilePlus, X } from 'lucide-react';
 import { Prism as SyntaxHighlighter } from 'react-syntax-highlighter';
 import { vscDarkPlus, vs } from 'react-syntax-highlighter/dist/esm/styles/prism';
+import { fetchNodeSql, fetchNodeLineage } from './api';
 
 const DetailsPanel = ({
     node,
@@ -13,6 +14,33 @@ const DetailsPanel = ({
 }) => {
     const [width, setWidth] = useState(450);
     const [isDragging, setIsDragging] = useState(false);
+    const [sql, setSql] = useState(null); // Lazily fetched { content, ctes } when the graph is compact
+    const [lineage, setLineage] = useState(null); // Column lineage, only computed when requested
+    const [lineageLoading, setLineageLoading] = useState(false);
+
+    // Graphs are loaded without SQL bodies; fetch them when a node is opened
+    const nodeId = node?.details?.id;
+    const embeddedContent = node?.details?.content;
+    useEffect(() => {
+        setSql(null);
+        setLineage(null);
+        setLineageLoading(false);
+        if (!nodeId || embeddedContent || node?.type === 'annotation') return;
+        let cancelled = false;
+        fetchNodeSql(nodeId).then(result => {
+            if (!cancelled) setSql(result || { content: '' });
+        });
+        return () => { cancelled = true; };
+        // eslint-disable-next-line
+    }, [nodeId, embeddedContent]);
+
+    const traceLineage = useCallback(() => {
+        setLineageLoading(true);
+        fetchNodeLineage(nodeId).then(result => {
+            setLineage(result || { columns: [], error: 'Failed to compute lineage' });
+            setLineageLoading(false);
+        });
+    }, [nodeId]);
 
     // Theme-based styles
     const isDark = theme === 'dark';
@@ -228,9 +256,47 @@ const DetailsPanel = ({
                                         }}
                                         wrapLongLines={true}
                                     >
-                                        {node.details?.content || '-- No content found.'}
+                                        {node.details?.content || (sql === null ? '-- Loading...' : sql.content) || '-- No content found.'}
                                     </SyntaxHighlighter>
                                 </div>
+
+                                <div style={{ margin: '20px 0 10px', fontSize: '12px', opacity: 0.6, color: textColor }}>Column Lineage</div>
+                                {lineage === null ? (
+                                    <button
+                                        onClick={traceLineage}
+                                        disabled={lineageLoading}
+                                        style={{
+                                            padding: '8px 12px',
+                                            background: 'transparent',
+                                            color: textColor,
+                                            border: `1px solid ${borderColor}`,
+                                            borderRadius: '6px',
+                                            cursor: lineageLoading ? 'wait' : 'pointer',
+                                            fontSize: '12px'
+                                        }}
+                                    >
+                                        {lineageLoading ? 'Tracing columns...' : 'Trace Columns'}
+                                    </button>
+                                ) : lineage.error ? (
+                                    <div style={{ fontSize: '12px', color: isDark ? '#ff9f1c' : '#e67e22' }}>{lineage.error}</div>
+                                ) : (
+                                    <table style={{ width: '100%', borderCollapse: 'collapse', fontSize: '12px', color: textColor }}>
+                                        <tbody>
+                                            {lineage.columns.map(column => (
+                                                <tr key={column.column} style={{ borderBottom: `1px solid ${borderColor}` }}>
+                                                    <td style={{ padding: '6px 8px 6px 0', fontWeight: 600, verticalAlign: 'top' }}>{column.column}</td>
+                                                    <td style={{ padding: '6px 0', opacity: 0.8 }}>
+                                                        {column.sources.length === 0 ? '-' : column.sources.map(source => (
+                                                            <div key={`${source.table}.${source.column}`}>
+                                                                {source.node || source.table}.{source.column}
+                                                            </div>
+                                                        ))}
+                                                    </td>
+                                                </tr>
+                                            ))}
+                                        </tbody>
+                                    </table>
+                                )}
                             </>
                         )}
                     </>
@@ -1,12 +1,29 @@
 export const API_URL = 'http://localhost:8000';
 
-// config can be an object { dialect: '...', discovery: true/false }
+// Last graph response per request, revalidated with its ETag: refreshing an
+// unchanged project returns 304 Not Modified and we reuse the cached graph.
+const graphResponses = new Map();
+
+const fetchWithETag = async (cacheKey, url, options = {}) => {
+    const cached = graphResponses.get(cacheKey);
+    const headers = { ...(options.headers || {}) };
+    if (cached) headers['If-None-Match'] = cached.etag;
+
+    const response = await fetch(url, { ...options, headers, cache: 'no-store' });
+    if (response.status === 304 && cached) return cached.data;
+    if (!response.ok) throw new Error("Failed to fetch graph");
+
+    const data = await response.json();
+    const etag = response.headers.get('ETag');
+    if (etag) graphResponses.set(cacheKey, { etag, data });
+    return data;
+};
+
+// config can be an object { dialect: '...', discovery: true/false, compact: true/false, layout: true/false, cluster: true/false }
 export const fetchGraph = async (config = {}) => {
     try {
-        const queryParams = new URLSearchParams({ ...config, t: Date.now() }).toString();
-        const response = await fetch(`${API_URL}/graph?${queryParams}`);
-        if (!response.ok) throw new Error("Failed to fetch graph");
-        return await response.json();
+        const queryParams = new URLSearchParams(config).toString();
+        return await fetchWithETag(`graph?${queryParams}`, `${API_URL}/graph?${queryParams}`);
     } catch (error) {
         console.error(error);
         return { nodes: [], edges: [] };
@@ -90,21 +107,125 @@ export const scanFolders = async (path) => {
 };
 
 // subfolders is array, dialect is string
-export const fetchFilteredGraph = async (subfolders, dialect = 'bigquery', discovery = false) => {
+export const fetchFilteredGraph = async (subfolders, dialect = 'bigquery', discovery = false, compact = true, layout = true,
+                                         cluster = false) => {
     try {
-        const response = await fetch(`${API_URL}/graph/filtered`, {
+        const body = JSON.stringify({ subfolders, dialect, discovery, compact, layout, cluster });
+        return await fetchWithETag(`graph/filtered:${body}`, `${API_URL}/graph/filtered`, {
             method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-                'Cache-Control': 'no-cache, no-store, must-revalidate',
-                'Pragma': 'no-cache',
-                'Expires': '0'
-            },
-            body: JSON.stringify({ subfolders, dialect, discovery }),
+            headers: { 'Content-Type': 'application/json' },
+            body,
         });
-        return await response.json();
     } catch (error) {
         console.error("Error fetching filtered graph:", error);
         return { nodes: [], edges: [], error: "Failed to fetch graph" };
     }
 };
+
+// SQL content and CTE bodies of a node (graphs are fetched in compact mode without them).
+// The browser revalidates with the ETag, so repeat fetches of an unchanged node are free.
+export const fetchNodeSql = async (nodeId) => {
+    try {
+        const response = await fetch(`${API_URL}/node/sql?id=${encodeURIComponent(nodeId)}`);
+        if (!response.ok) return null;
+        return await response.json();
+    } catch (error) {
+        console.error("Error fetching node SQL:", error);
+        return null;
+    }
+};
+
+// Column-level lineage of a node: { columns: [{ column, sources: [{ node, table, column }] }] }.
+// Computed by the server on first request, so only fetch it when the user asks for it.
+export const fetchNodeLineage = async (nodeId) => {
+    try {
+        const response = await fetch(`${API_URL}/node/lineage?id=${encodeURIComponent(nodeId)}`);
+        if (!response.ok) return null;
+        return await response.json();
+    } catch (error) {
+        console.error("Error fetching column lineage:", error);
+        return null;
+    }
+};
+
+// Upstream and/or downstream lineage of one node, computed by the server so focused
+// views don't need the whole graph.
+// options: { direction: 'both' | 'upstream' | 'downstream', depth, include_virtual, dialect, discovery, compact }
+export const fetchSubgraph = async (nodeId, options = {}) => {
+    try {
+        const queryParams = new URLSearchParams({ id: nodeId, ...options }).toString();
+        return await fetchWithETag(`graph/subgraph?${queryParams}`, `${API_URL}/graph/subgraph?${queryParams}`);
+    } catch (error) {
+        console.error("Error fetching subgraph:", error);
+        return null;
+    }
+};
+
+// Member nodes and edges of a cluster node (graphs fetched with cluster: true).
+// options: { dialect, discovery, compact, layout }
+export const expandCluster = async (clusterId, options = {}) => {
+    try {
+        const queryParams = new URLSearchParams({ id: clusterId, ...options }).toString();
+        return await fetchWithETag(`graph/cluster?${queryParams}`, `${API_URL}/graph/cluster?${queryParams}`);
+    } catch (error) {
+        console.error("Error expanding cluster:", error);
+        return null;
+    }
+};
+
+// Ranked server-side search over table names, CTE names, file names and SQL content.
+// options: { offset, limit, dialect, discovery }. Results carry a snippet with highlight offsets.
+export const searchGraph = async (query, options = {}) => {
+    try {
+        const queryParams = new URLSearchParams({ q: query, ...options }).toString();
+        const response = await fetch(`${API_URL}/search?${queryParams}`);
+        if (!response.ok) return { total: 0, results: [] };
+        return await response.json();
+    } catch (error) {
+        console.error("Error searching graph:", error);
+        return { total: 0, results: [] };
+    }
+};
+
+// Two-phase graph load: `onSkeleton` gets a quick first graph (regex scan of uncached files),
+// `onRefine` gets deltas as the full parse completes. Returns a function closing the stream.
+export const streamProgressiveGraph = ({ dialect = 'bigquery', discovery = false, subfolders = null, layout = true },
+                                      { onSkeleton, onRefine, onDone, onError }) => {
+    const params = new URLSearchParams({ dialect, discovery, layout });
+    (subfolders || []).forEach(folder => params.append('subfolders', folder));
+    const source = new EventSource(`${API_URL}/graph/progressive?${params.toString()}`);
+    const handle = (callback) => (event) => {
+        try {
+            callback && callback(JSON.parse(event.data));
+        } catch (error) {
+            console.error("Invalid progressive graph event:", error);
+        }
+    };
+    source.addEventListener('skeleton', handle(onSkeleton));
+    source.addEventListener('refine', handle(onRefine));
+    source.addEventListener('done', (event) => {
+        source.close(); // EventSource would reconnect and start another build
+        handle(onDone)(event);
+    });
+    source.onerror = (error) => {
+        source.close();
+        onError && onError(error);
+    };
+    return () => source.close();
+};
+
+// Live graph updates pushed by the backend in watch mode (`sql-dag-flow --watch`).
+// onDelta receives { nodes: { added, updated, removed }, edges: { added, removed }, version }.
+// Returns a function that closes the stream.
+export const subscribeGraphEvents = (onDelta) => {
+    const source = new EventSource(`${API_URL}/graph/events`);
+    source.addEventListener('delta', (event) => {
+        try {
+            onDelta(JSON.parse(event.data));
+        } catch (error) {
+            console.error("Invalid graph delta:", error);
+        }
+    });
+    source.onerror = (error) => console.error("Graph event stream error:", error);
+    return () => source.close();
+};
@@ -0,0 +1,118 @@
+from .graph_core import csr, strongly_connected_components, ancestor_counts
+
+# Nodes kept per hotspot ranking (the analytics endpoint returns the first `limit`)
+HOTSPOTS = 100
+
+# Per-node fields added to graph nodes by with_analytics (and returned per node by the endpoint)
+NODE_FIELDS = ("descendantCount", "chainDepth", "chainHeight", "fanIn", "fanOut", "inCycle")
+
+
+def graph_analytics(nodes, edges, top=HOTSPOTS):
+    """
+    Whole-graph analytics of a built graph (React Flow nodes and edges):
+
+    - per node: descendantCount (blast radius), chainDepth / chainHeight (longest
+      dependency chain above / below it), fanIn / fanOut (distinct neighbours), inCycle;
+    - longestChain: the critical path, as node ids from a source to a sink (the hops
+      within a cycle it goes through included);
+    - hotspots: the `top` nodes by fan-in, fan-out and descendant count;
+    - cycles: strongly connected components of more than one node;
+    - orphans: nodes without any edge.
+
+    Cycles are condensed first, so chains and counts are computed with a constant number
+    of linear sweeps over the condensation in topological order. Descendant counts use
+    the bitset propagation of nestedCount (ancestor_counts) on the reversed graph.
+    """
+    ids = [node["id"] for node in nodes]
+    index = {node_id: i for i, node_id in enumerate(ids)}
+    pairs = set()
+    for edge in edges:
+        source, target = index.get(edge["source"]), index.get(edge["target"])
+        if source is not None and target is not None and source != target:
+            pairs.add((source, target))
+    pairs = sorted(pairs)
+    heads = [source for source, _ in pairs]
+    tails = [target for _, target in pairs]
+    down_offsets, down_targets = csr(len(ids), heads, tails)
+    up_offsets, up_sources = csr(len(ids), tails, heads)
+
+    component_of, components = strongly_connected_components(down_offsets, down_targets)
+    descendants = ancestor_counts(up_offsets, up_sources)
+
+    # Longest chain ending at each component (Tarjan lists sinks first, so walk backwards)
+    depth = [0] * len(components)
+    came_from = [None] * len(components) # (predecessor node, node) of the longest chain's last hop
+    for comp_id in range(len(components) - 1, -1, -1):
+        for member in components[comp_id]:
+            for pos in range(down_offsets[member], down_offsets[member + 1]):
+                child = down_targets[pos]
+                child_comp = component_of[child]
+                if child_comp != comp_id and depth[comp_id] + 1 > depth[child_comp]:
+                    depth[child_comp] = depth[comp_id] + 1
+                    came_from[child_comp] = (member, child)
+
+    # Longest chain starting at each component
+    height = [0] * len(components)
+    for comp_id in range(len(components)):
+        for member in components[comp_id]:
+            for pos in range(down_offsets[member], down_offsets[member + 1]):
+                child_comp = component_of[down_targets[pos]]
+                if child_comp != comp_id and height[child_comp] + 1 > height[comp_id]:
+                    height[comp_id] = height[child_comp] + 1
+
+    chain = []
+    longest = 0 # hops of the critical path, a cycle counting as one node
+    if components:
+        comp_id = max(range(len(components)), key=lambda c: (depth[c], -c))
+        longest = depth[comp_id]
+        chain.append(components[comp_id][0])
+        while came_from[comp_id] is not None:
+            predecessor, node = came_from[comp_id]
+            if chain[0] != node:
+                chain.insert(0, node) # Entered the cycle through another member
+            chain.insert(0, predecessor)
+            comp_id = component_of[predecessor]
+
+    metrics = {}
+    for n, node_id in enumerate(ids):
+        comp_id = component_of[n]
+        metrics[node_id] = {
+            "descendantCount": descendants[n],
+            "chainDepth": depth[comp_id],
+            "chainHeight": height[comp_id],
+            "fanIn": up_offsets[n + 1] - up_offsets[n],
+            "fanOut": down_offsets[n + 1] - down_offsets[n],
+            "inCycle": len(components[comp_id]) > 1,
+        }
+
+    def ranking(field):
+        ranked = sorted((node_id for node_id in ids if metrics[node_id][field]),
+                        key=lambda node_id: -metrics[node_id][field])
+        return [{"id": node_id, field: metrics[node_id][field]} for node_id in ranked[:top]]
+
+    cycles = [sorted(ids[member] for member in component) for component in components if len(component) > 1]
+    return {
+        "summary": {
+            "nodes": len(ids),
+            "edges": len(pairs),
+            "sources": sum(1 for n in range(len(ids)) if up_offsets[n] == up_offsets[n + 1]),
+            "sinks": sum(1 for n in range(len(ids)) if down_offsets[n] == down_offsets[n + 1]),
+            "cycles": len(cycles),
+            "longestChain": longest,
+        },
+        "longestChain": [ids[n] for n in chain],
+        "hotspots": {
+            "fanIn": ranking("fanIn"),
+            "fanOut": ranking("fanOut"),
+            "descendants": ranking("descendantCount"),
+        },
+        "cycles": sorted(cycles, key=lambda members: (-len(members), members)),
+        "orphans": [node_id for n, node_id in enumerate(ids)
+                    if up_offsets[n] == up_offsets[n + 1] and down_offsets[n] == down_offsets[n + 1]],
+        "nodes": metrics,
+    }
+
+
+def with_analytics(nodes, metrics):
+    """Copies of React Flow nodes whose data carries the NODE_FIELDS of `metrics` (see graph_analytics)."""
+    return [{**node, "data": {**node["data"], **metrics.get(node["id"], {})}} for node in nodes]
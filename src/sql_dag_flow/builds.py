@@ -0,0 +1,96 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Graph builds running at the same time; the rest wait in the queue
+BUILD_THREADS = 2
+# Distinct builds (running or queued) accepted before requests are turned away
+MAX_PENDING_BUILDS = 8
+# Seconds between two checks of whether the waiting clients are still connected
+DISCONNECT_POLL_INTERVAL = 0.25
+
+
+class BuildQueueFull(Exception):
+    """Raised by BuildCoordinator.run when MAX_PENDING_BUILDS builds are already in flight."""
+
+
+class ClientDisconnected(Exception):
+    """Raised by BuildCoordinator.run when the client gave up waiting."""
+
+
+class _Build:
+    def __init__(self, future, cancelled):
+        self.future = future
+        self.cancelled = cancelled # threading.Event, set once nobody waits for the result
+        self.waiters = 0
+
+
+class BuildCoordinator:
+    """
+    Runs graph builds off the event loop, in a small thread pool of their own.
+
+    Builds are single-flight per key (the graph fingerprint): a request for a build that
+    is already running waits for that build instead of starting another one. When every
+    client waiting for a build has disconnected, the build's `cancelled` event is set so
+    that it stops at its next checkpoint (see parse_files). At most `max_pending` distinct
+    builds are in flight; beyond that run() raises BuildQueueFull.
+    """
+
+    def __init__(self, threads=BUILD_THREADS, max_pending=MAX_PENDING_BUILDS):
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="graph-build")
+        self._builds = {} # key -> _Build, only touched from the event loop
+
+    def pending(self):
+        return len(self._builds)
+
+    async def run(self, key, function, is_disconnected=None):
+        """
+        Returns (result of function(cancelled), shared) where `shared` tells whether the
+        result comes from a build started by another request. `function` runs in the
+        build pool and receives a threading.Event it should check to stop early.
+        `is_disconnected` is an async callable, typically Request.is_disconnected.
+        """
+        build, shared = self.start(key, function)
+        return await self.wait(build, is_disconnected), shared
+
+    def start(self, key, function):
+        """
+        First half of run(), for callers that must know whether the build was accepted
+        before they start responding: (build, shared), or BuildQueueFull. The build is
+        only cancelled once someone waited for it and left (see wait).
+        """
+        build = self._builds.get(key)
+        shared = build is not None and not build.cancelled.is_set()
+        if not shared:
+            if len(self._builds) >= self.max_pending:
+                raise BuildQueueFull(f"{len(self._builds)} graph builds already in progress")
+            cancelled = threading.Event()
+            future = asyncio.get_running_loop().run_in_executor(self._executor, function, cancelled)
+            build = _Build(future, cancelled)
+            self._builds[key] = build
+            future.add_done_callback(lambda _: self._forget(key, build))
+        return build, shared
+
+    async def wait(self, build, is_disconnected=None):
+        """Second half of run(): the result of a build returned by start()."""
+        build.waiters += 1
+        try:
+            while True:
+                done, _ = await asyncio.wait({build.future}, timeout=DISCONNECT_POLL_INTERVAL)
+                if done:
+                    return build.future.result()
+                if is_disconnected is not None and await is_disconnected():
+                    raise ClientDisconnected()
+        finally:
+            build.waiters -= 1
+            if build.waiters == 0 and not build.future.done():
+                build.cancelled.set()
+
+    def _forget(self, key, build):
+        if self._builds.get(key) is build:
+            del self._builds[key]
+        if build.future.cancelled():
+            return
+        # Nobody may be left to read the exception of a cancelled build; don't log it as unretrieved
+        build.future.exception()
@@ -0,0 +1,218 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import sqlglot
+
+# Bump whenever the shape of the records produced by parse_sql_file changes,
+# so that stale cache files are discarded automatically.
+CACHE_VERSION = 4
+DEFAULT_MAX_ENTRIES = 20000
+
+# A file modified this recently (seconds) when it is cached could change again within the
+# same mtime tick, so its mtime and size are only trusted once it is older than that
+RACY_SECONDS = 2.0
+
+
+def default_cache_dir():
+    """Location of the on-disk cache. Can be overridden with SQL_DAG_FLOW_CACHE_DIR."""
+    override = os.environ.get("SQL_DAG_FLOW_CACHE_DIR")
+    if override:
+        return override
+    return os.path.join(os.path.expanduser("~"), ".cache", "sql_dag_flow")
+
+
+def content_hash(sql_content):
+    """Stable hash of a file's SQL text, used to validate cached parse results."""
+    return hashlib.sha1(sql_content.encode("utf-8")).hexdigest()
+
+
+class ParseCache:
+    """
+    Persistent cache of parsed table records.
+
+    Entries are keyed by dialect + absolute file path and hold the records (without the
+    SQL text, which is read from the file), the content hash and the file's mtime and
+    size. A file whose mtime and size are unchanged is served by lookup() without being
+    hashed; otherwise get() validates the entry against the content hash, so any edit to
+    a file invalidates its entry.
+    The cache holds at most `max_entries` files; the least recently used ones are
+    evicted first.
+    """
+
+    def __init__(self, cache_dir=None, max_entries=DEFAULT_MAX_ENTRIES):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.path = os.path.join(self.cache_dir, "parse_cache.json")
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._stat_hashes = {} # abspath -> (mtime, size, hash), in-memory only
+        self._tick = 0
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        # Invalidate everything if the cache was written by another parser version
+        if data.get("version") != CACHE_VERSION or data.get("sqlglot") != sqlglot.__version__:
+            return
+
+        self._entries = data.get("entries", {})
+        self._tick = max((e.get("used", 0) for e in self._entries.values()), default=0)
+
+    @staticmethod
+    def _key(filepath, dialect):
+        return f"{dialect}:{os.path.abspath(filepath)}"
+
+    def _hit(self, entry, filepath, sql_content):
+        self._tick += 1
+        entry["used"] = self._tick
+        self.hits += 1
+
+        records = {}
+        for table_id, record in entry["records"].items():
+            record = dict(record)
+            record["path"] = filepath
+            record["content"] = sql_content
+            records[table_id] = record
+        return records
+
+    def lookup(self, filepath, dialect, sql_content):
+        """
+        Cached records of a file whose mtime and size are those recorded when it was
+        cached, without hashing `sql_content` (just read from the file, which is stat'ed
+        after the read); None otherwise (see get).
+        """
+        try:
+            st = os.stat(filepath)
+        except OSError:
+            return None
+        with self._lock:
+            entry = self._entries.get(self._key(filepath, dialect))
+            if (entry is None or entry["mtime"] is None
+                    or (entry["mtime"], entry["size"]) != (st.st_mtime, st.st_size)):
+                return None
+            return self._hit(entry, filepath, sql_content)
+
+    def get(self, filepath, dialect, sql_content, track_stat=True):
+        """
+        Returns the cached records for a file, or None if missing or stale. With
+        track_stat=True `sql_content` was read from the file, so an entry cached without
+        its mtime and size (see put) records them for the next lookup().
+        """
+        key = self._key(filepath, dialect)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry["hash"] != content_hash(sql_content):
+                self.misses += 1
+                return None
+            if track_stat and entry["mtime"] is None:
+                try:
+                    st = os.stat(filepath)
+                    if time.time() - st.st_mtime >= RACY_SECONDS:
+                        entry["mtime"], entry["size"] = st.st_mtime, st.st_size
+                        self._dirty = True
+                except OSError:
+                    pass
+            return self._hit(entry, filepath, sql_content)
+
+    def file_hash(self, filepath, dialect=None):
+        """
+        Content hash of a file without reading it when its mtime and size are unchanged
+        since it was last hashed or parsed. Raises OSError if the file is gone.
+        """
+        abspath = os.path.abspath(filepath)
+        st = os.stat(abspath)
+        signature = (st.st_mtime, st.st_size)
+
+        with self._lock:
+            known = self._stat_hashes.get(abspath)
+            if known is not None and known[:2] == signature:
+                return known[2]
+            if dialect is not None:
+                entry = self._entries.get(self._key(abspath, dialect))
+                if entry is not None and (entry["mtime"], entry["size"]) == signature:
+                    self._stat_hashes[abspath] = signature + (entry["hash"],)
+                    return entry["hash"]
+
+        with open(abspath, "r", encoding="utf-8") as f:
+            digest = content_hash(f.read())
+        with self._lock:
+            self._stat_hashes[abspath] = signature + (digest,)
+        return digest
+
+    def put(self, filepath, dialect, sql_content, records, track_stat=True):
+        """
+        Stores the parse result of a file. With track_stat=False the content did not come
+        from the file on disk, so its mtime and size are not recorded (see file_hash).
+        """
+        mtime, size = None, None
+        if track_stat:
+            try:
+                st = os.stat(filepath)
+                if time.time() - st.st_mtime >= RACY_SECONDS:
+                    mtime, size = st.st_mtime, st.st_size
+            except OSError:
+                pass
+
+        stripped = {}
+        for table_id, record in records.items():
+            stripped[table_id] = {k: v for k, v in record.items() if k != "content"}
+
+        with self._lock:
+            self._tick += 1
+            self._entries[self._key(filepath, dialect)] = {
+                "mtime": mtime,
+                "size": size,
+                "hash": content_hash(sql_content),
+                "used": self._tick,
+                "records": stripped,
+            }
+            self._dirty = True
+            self._evict()
+
+    def _evict(self):
+        overflow = len(self._entries) - self.max_entries
+        if overflow <= 0:
+            return
+        oldest = sorted(self._entries, key=lambda k: self._entries[k]["used"])[:overflow]
+        for key in oldest:
+            del self._entries[key]
+
+    def save(self):
+        """Writes the cache to disk if it changed. Writes are atomic."""
+        with self._lock:
+            if not self._dirty:
+                return
+            payload = json.dumps({
+                "version": CACHE_VERSION,
+                "sqlglot": sqlglot.__version__,
+                "entries": self._entries,
+            })
+            self._dirty = False
+
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(payload)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Error saving parse cache: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._entries = {}
+            self._dirty = True
+        self.save()
+
+    def stats(self):
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
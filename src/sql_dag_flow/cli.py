@@ -0,0 +1,225 @@
+import os
+import sys
+import time
+import argparse
+
+# Heavy modules (FastAPI, uvicorn, sqlglot) are imported inside the commands that need
+# them, so `sql-dag-flow export` in CI never loads the web stack.
+
+COMMANDS = ("serve", "export", "diff")
+
+
+def add_parse_timeout_argument(arg_parser):
+    # Mirrors parser.DEFAULT_PARSE_TIMEOUT, not imported to keep `--help` free of sqlglot
+    arg_parser.add_argument("--parse-timeout", type=float, default=0,
+                            help="Seconds allowed to parse one file before it falls back to a "
+                                 "regex-only scan; files are then parsed in isolated worker "
+                                 "processes (default: 0 = no limit, parsed in-process)")
+
+
+def build_serve_parser():
+    arg_parser = argparse.ArgumentParser(prog="sql-dag-flow", description="SQL lineage visualizer",
+                                         epilog="Run 'sql-dag-flow export --help' for headless exports and "
+                                                "'sql-dag-flow diff --help' for lineage diffs.")
+    arg_parser.add_argument("path", nargs="?", help="SQL project directory (defaults to the current directory)")
+    arg_parser.add_argument("--workers", type=int, default=1,
+                            help="Parser processes per graph build (0 = one per CPU core, 1 = serial)")
+    arg_parser.add_argument("--watch", action="store_true",
+                            help="Watch the project for changes and push graph updates to the browser")
+    arg_parser.add_argument("--watch-interval", type=float, default=1.0,
+                            help="Polling interval in seconds for --watch (default: 1.0)")
+    arg_parser.add_argument("--no-browser", action="store_true", help="Do not open a browser window")
+    add_parse_timeout_argument(arg_parser)
+    return arg_parser
+
+
+def build_export_parser():
+    from .export import EXPORT_FORMATS
+
+    arg_parser = argparse.ArgumentParser(prog="sql-dag-flow export",
+                                         description="Parse a SQL project and write its lineage graph without starting the server.")
+    arg_parser.add_argument("path", nargs="?", default=".", help="SQL project directory (default: current directory)")
+    arg_parser.add_argument("-o", "--output", help="Output file (default: stdout)")
+    arg_parser.add_argument("-f", "--format", choices=sorted(EXPORT_FORMATS),
+                            help="Output format (default: inferred from --output, else json)")
+    arg_parser.add_argument("--dialect", default="bigquery", help="sqlglot dialect (default: bigquery)")
+    arg_parser.add_argument("--discovery", action="store_true",
+                            help="Include ghost nodes for external tables and CTE nodes")
+    arg_parser.add_argument("--subfolder", action="append", dest="subfolders", metavar="PATH",
+                            help="Only parse this subfolder (relative path, repeatable)")
+    arg_parser.add_argument("--workers", type=int, default=0,
+                            help="Parser processes (default: 0 = one per CPU core, 1 = serial)")
+    arg_parser.add_argument("--no-cache", action="store_true", help="Do not read or write the parse cache")
+    arg_parser.add_argument("--compact", action="store_true", help="Omit SQL and CTE bodies from node details")
+    arg_parser.add_argument("--timings", action="store_true",
+                            help="Print per-phase timings and the slowest files to stderr")
+    add_parse_timeout_argument(arg_parser)
+    return arg_parser
+
+
+def run_export(argv):
+    args = build_export_parser().parse_args(argv)
+
+    from .parser import parse_sql_files, build_graph, compact_nodes
+    from .resolver import TableResolver
+    from .export import export_graph, infer_format
+    from .timings import Timings
+
+    if not os.path.isdir(args.path):
+        print(f"Error: '{args.path}' is not a directory", file=sys.stderr)
+        return 2
+
+    started = time.perf_counter()
+    cache = None
+    if not args.no_cache:
+        from .cache import ParseCache
+        cache = ParseCache()
+
+    stats = {}
+    timings = Timings()
+    tables = parse_sql_files(args.path, allowed_subfolders=args.subfolders, dialect=args.dialect,
+                             cache=cache, stats=stats, workers=args.workers, timeout=args.parse_timeout,
+                             timings=timings)
+    with timings.phase("index"):
+        resolver = TableResolver.from_tables(tables, dialect=args.dialect)
+    nodes, edges = build_graph(tables, discovery_mode=args.discovery, resolver=resolver, timings=timings)
+    ambiguities = resolver.ambiguity_report(tables)
+    degraded = [{"id": node_id, "path": record["path"], "reason": record["degraded"]}
+                for node_id, record in tables.items() if "degraded" in record]
+    if args.compact:
+        nodes = compact_nodes(nodes)
+
+    fmt = args.format or infer_format(args.output)
+    metadata = {"path": os.path.abspath(args.path), "dialect": args.dialect,
+                "discovery": args.discovery, "subfolders": args.subfolders, "ambiguities": ambiguities,
+                "degraded": degraded}
+
+    with timings.phase("export"):
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                export_graph(nodes, edges, f, fmt=fmt, metadata=metadata)
+        else:
+            export_graph(nodes, edges, sys.stdout, fmt=fmt, metadata=metadata)
+
+    elapsed = time.perf_counter() - started
+    print(f"Exported {len(nodes)} nodes and {len(edges)} edges from {stats.get('files', 0)} files "
+          f"({stats.get('cache_hits', 0)} cached) as {fmt} in {elapsed:.2f}s", file=sys.stderr)
+    for item in degraded:
+        print(f"Warning: {item['path']} was scanned without full parsing ({item['reason']})", file=sys.stderr)
+    for item in ambiguities:
+        print(f"Warning: '{item['reference']}' is ambiguous ({', '.join(item['candidates'])}), "
+              f"using '{item['resolvedTo']}'", file=sys.stderr)
+    if args.timings:
+        print_timings(timings)
+    return 0
+
+
+def build_diff_parser():
+    arg_parser = argparse.ArgumentParser(prog="sql-dag-flow diff",
+                                         description="Compare the lineage of two revisions (git refs or directories) "
+                                                     "and list the changed nodes and edges and the downstream tables they impact.")
+    arg_parser.add_argument("base", help="Base revision: a git ref (branch, tag, commit) or a directory")
+    arg_parser.add_argument("head", nargs="?",
+                            help="Head revision: a git ref or a directory (default: the working tree of --path)")
+    arg_parser.add_argument("--path", default=".",
+                            help="Project directory inside the git repository (default: current directory)")
+    arg_parser.add_argument("-o", "--output", help="Output JSON file (default: stdout)")
+    arg_parser.add_argument("--dialect", default="bigquery", help="sqlglot dialect (default: bigquery)")
+    arg_parser.add_argument("--discovery", action="store_true",
+                            help="Include ghost nodes for external tables and CTE nodes")
+    arg_parser.add_argument("--subfolder", action="append", dest="subfolders", metavar="PATH",
+                            help="Only parse this subfolder (relative path, repeatable)")
+    arg_parser.add_argument("--workers", type=int, default=0,
+                            help="Parser processes (default: 0 = one per CPU core, 1 = serial)")
+    arg_parser.add_argument("--no-cache", action="store_true", help="Do not read or write the parse cache")
+    arg_parser.add_argument("--timings", action="store_true", help="Print per-phase timings to stderr")
+    add_parse_timeout_argument(arg_parser)
+    return arg_parser
+
+
+def run_diff(argv):
+    args = build_diff_parser().parse_args(argv)
+
+    import json
+    from .lineage_diff import diff_lineage, open_revision, DiffError
+    from .timings import Timings
+
+    if not os.path.isdir(args.path):
+        print(f"Error: '{args.path}' is not a directory", file=sys.stderr)
+        return 2
+
+    started = time.perf_counter()
+    cache = None
+    if not args.no_cache:
+        from .cache import ParseCache
+        cache = ParseCache()
+
+    timings = Timings()
+    try:
+        base = open_revision(args.base, args.path, args.subfolders)
+        head = open_revision(args.head, args.path, args.subfolders)
+        result = diff_lineage(base, head, dialect=args.dialect, discovery=args.discovery, cache=cache,
+                              workers=args.workers, timeout=args.parse_timeout, timings=timings)
+    except DiffError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+            f.write("\n")
+    else:
+        json.dump(result, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+
+    elapsed = time.perf_counter() - started
+    files, nodes = result["files"], result["nodes"]
+    print(f"{result['base']} -> {result['head']}: {result['stats']['changedFiles']} files changed, "
+          f"{len(nodes['added'])} nodes added, {len(nodes['removed'])} removed, {len(nodes['modified'])} modified, "
+          f"{len(result['impacted'])} downstream impacted ({result['stats']['parsed']} files parsed) "
+          f"in {elapsed:.2f}s", file=sys.stderr)
+    if args.timings:
+        print_timings(timings)
+    return 0
+
+
+def print_timings(timings):
+    print("Timings (ms):", file=sys.stderr)
+    for name, seconds in timings.phases.items():
+        print(f"  {name:<24} {seconds * 1000:10.1f}", file=sys.stderr)
+    slowest = timings.slowest()
+    if slowest:
+        print("Slowest files (ms):", file=sys.stderr)
+        for path, seconds in slowest:
+            print(f"  {seconds * 1000:10.1f}  {path}", file=sys.stderr)
+
+
+def run_serve(argv):
+    args = build_serve_parser().parse_args(argv)
+
+    from .main import serve
+    serve(path=args.path, workers=args.workers, watch=args.watch, watch_interval=args.watch_interval,
+          open_browser=not args.no_browser, parse_timeout=args.parse_timeout)
+    return 0
+
+
+def main(argv=None):
+    """Entry point of the `sql-dag-flow` command."""
+    if argv is None:
+        argv = sys.argv[1:]
+
+    # `sql-dag-flow [path] [options]` keeps starting the server, subcommands are opt-in
+    if argv and argv[0] in COMMANDS:
+        command, argv = argv[0], argv[1:]
+    else:
+        command = "serve"
+
+    if command == "export":
+        sys.exit(run_export(argv))
+    if command == "diff":
+        sys.exit(run_diff(argv))
+    sys.exit(run_serve(argv))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+from .graph_core import EDGE_STYLES, EDGE_CTE, EDGE_EXTERNAL
+
+CLUSTER_PREFIX = "cluster:"
+
+# Fewest ghost / CTE nodes of one group collapsed into a cluster node; smaller groups stay as they are
+CLUSTER_MIN_MEMBERS = 2
+
+
+def is_cluster(node_id):
+    return node_id.startswith(CLUSTER_PREFIX)
+
+
+def _group(node):
+    """(cluster id, layer, label) a discovery-mode node collapses into, or None for parsed tables."""
+    data = node["data"]
+    layer = data.get("layer")
+    if layer == "external":
+        details = data["details"]
+        name = f"{details.get('project', 'default')}.{details.get('dataset', 'default')}"
+        return f"{CLUSTER_PREFIX}external:{name}", layer, name
+    if layer == "cte":
+        # CTE ids are "cte:<file base>:<cte name>", one group per parent file
+        parent = node["id"].split(":")[1] if node["id"].count(":") >= 2 else node["id"]
+        return f"{CLUSTER_PREFIX}cte:{parent}", layer, f"{parent} CTEs"
+    return None
+
+
+class ClusteredGraph:
+    """
+    Discovery-mode graph with its ghost nodes collapsed per project.dataset and its CTE
+    nodes per parent file. Each cluster node stands for CLUSTER_MIN_MEMBERS or more
+    nodes and has one edge per distinct target, so the payload grows with the number
+    of datasets and files rather than with every unresolved reference.
+    Ghost and CTE nodes have no incoming edges, so clusters only have outgoing ones.
+    """
+
+    def __init__(self, nodes, edges, min_members=CLUSTER_MIN_MEMBERS):
+        groups = {} # cluster id -> (layer, label, [member node])
+        cluster_of = {}
+        for node in nodes:
+            group = _group(node)
+            if group is not None:
+                cluster_id, layer, label = group
+                groups.setdefault(cluster_id, (layer, label, []))[2].append(node)
+        self.members = {} # cluster id -> [member node]
+        for cluster_id, (_, _, members) in groups.items():
+            if len(members) >= min_members:
+                self.members[cluster_id] = members
+                for member in members:
+                    cluster_of[member["id"]] = cluster_id
+
+        self.nodes = []
+        seen = set()
+        for node in nodes:
+            cluster_id = cluster_of.get(node["id"])
+            if cluster_id is None:
+                self.nodes.append(node)
+            elif cluster_id not in seen:
+                seen.add(cluster_id)
+                layer, label, members = groups[cluster_id]
+                self.nodes.append(self._cluster_node(cluster_id, layer, label, members))
+
+        self.edges = []
+        self.member_edges = {} # cluster id -> [edge of its members]
+        cluster_edges = {} # (cluster id, target) -> cluster edge
+        for edge in edges:
+            cluster_id = cluster_of.get(edge["source"])
+            if cluster_id is None:
+                self.edges.append(edge)
+                continue
+            self.member_edges.setdefault(cluster_id, []).append(edge)
+            key = (cluster_id, edge["target"])
+            cluster_edge = cluster_edges.get(key)
+            if cluster_edge is None:
+                layer = groups[cluster_id][0]
+                cluster_edge = cluster_edges[key] = {
+                    "id": f"{cluster_id}-{edge['target']}",
+                    "source": cluster_id,
+                    "target": edge["target"],
+                    "animated": True,
+                    "style": EDGE_STYLES[EDGE_CTE if layer == "cte" else EDGE_EXTERNAL],
+                    "data": {"count": 0},
+                }
+                self.edges.append(cluster_edge)
+            cluster_edge["data"]["count"] += 1
+
+    @staticmethod
+    def _cluster_node(cluster_id, layer, label, members):
+        first = members[0]["data"]["details"]
+        details = {
+            "id": cluster_id,
+            "label": label,
+            "layer": layer,
+            "type": "cluster",
+            "project": first.get("project"),
+            "dataset": first.get("dataset"),
+            "path": first.get("path"),
+            "dependencies": [],
+            "content": f"-- {len(members)} {'CTEs' if layer == 'cte' else 'discovered tables'}, see /graph/cluster",
+        }
+        return {
+            "id": cluster_id,
+            "data": {
+                "label": f"{label} ({len(members)})",
+                "layer": layer,
+                "details": details,
+                "incomingCount": 0,
+                "nestedCount": 0,
+                "clusterSize": len(members),
+            },
+            "position": {"x": 0, "y": 0},
+            "type": "custom",
+        }
+
+    def layout(self, positions):
+        """Positions of the clustered graph from those of the full one: a cluster takes its first member's."""
+        clustered = {}
+        for node in self.nodes:
+            members = self.members.get(node["id"])
+            position = positions.get(members[0]["id"] if members else node["id"])
+            if position is not None:
+                clustered[node["id"]] = position
+        return clustered
+
+    def expand(self, cluster_id):
+        """(member nodes, member edges) of a cluster, or None if unknown."""
+        members = self.members.get(cluster_id)
+        if members is None:
+            return None
+        return members, self.member_edges.get(cluster_id, [])
@@ -0,0 +1,178 @@
+import os
+import json
+import gzip
+import threading
+
+# Saved diagram files. Streaming ones hold one JSON record per line (like `export --format
+# ndjson`): a header, every node, every edge, then the viewport; ".gz" ones are gzipped.
+NDJSON_EXTENSIONS = (".ndjson", ".ndjson.gz")
+DIAGRAM_EXTENSIONS = (".json",) + NDJSON_EXTENSIONS
+DIAGRAM_FORMAT = "sql-dag-flow"
+DIAGRAM_FORMAT_VERSION = 1
+EMPTY_VIEWPORT = {"x": 0, "y": 0, "zoom": 1}
+
+# Records serialised per chunk when streaming a diagram back as one JSON document
+CHUNK_RECORDS = 500
+
+# Node and edge records start with these exact bytes (see write_diagram), so they can be
+# turned back into plain node/edge JSON, or have their position read, without decoding them
+_NODE_PREFIX = '{"kind": "node", '
+_EDGE_PREFIX = '{"kind": "edge", '
+_ID_KEY = '"id": '
+_POSITION_KEY = ', "position": '
+
+_decoder = json.JSONDecoder()
+
+
+class DiagramFormatError(ValueError):
+    """Raised when a streaming diagram file has no valid header."""
+
+
+def is_ndjson(filename):
+    """Whether a diagram file name selects the streaming format."""
+    return filename.lower().endswith(NDJSON_EXTENSIONS)
+
+
+def _open(filepath, mode, compressed):
+    if compressed:
+        return gzip.open(filepath, mode + "t", encoding="utf-8")
+    return open(filepath, mode, encoding="utf-8")
+
+
+def write_diagram(filepath, nodes, edges, viewport=None, metadata=None):
+    """
+    Writes a diagram in the streaming format, record by record, gzipped if `filepath`
+    ends with ".gz". The file is replaced atomically once complete.
+    """
+    tmp_path = f"{filepath}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with _open(tmp_path, "w", filepath.lower().endswith(".gz")) as fp:
+            header = {"kind": "header", "format": DIAGRAM_FORMAT, "version": DIAGRAM_FORMAT_VERSION,
+                      "nodeCount": len(nodes), "edgeCount": len(edges), "metadata": metadata or {}}
+            fp.write(json.dumps(header) + "\n")
+            for node in nodes:
+                # id and position first, see read_positions
+                record = {"kind": "node", "id": node.get("id"), "position": node.get("position")}
+                record.update((key, value) for key, value in node.items() if key not in record)
+                fp.write(json.dumps(record) + "\n")
+            for edge in edges:
+                fp.write(json.dumps({"kind": "edge", **edge}) + "\n")
+            fp.write(json.dumps({"kind": "viewport", **(viewport or EMPTY_VIEWPORT)}) + "\n")
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _strip_kind(line, prefix):
+    """Plain JSON of a node/edge record line, without its "kind" key."""
+    if line.startswith(prefix):
+        return "{" + line[len(prefix):].rstrip()
+    record = json.loads(line)
+    record.pop("kind", None)
+    return json.dumps(record)
+
+
+def _position(line):
+    """{"id", "position"} JSON of a node record line, decoding only those two values."""
+    start = len(_NODE_PREFIX) + len(_ID_KEY)
+    if line.startswith(_NODE_PREFIX + _ID_KEY):
+        node_id, end = _decoder.raw_decode(line, start)
+        if line.startswith(_POSITION_KEY, end):
+            position, _ = _decoder.raw_decode(line, end + len(_POSITION_KEY))
+            return json.dumps({"id": node_id, "position": position})
+    record = json.loads(line)
+    return json.dumps({"id": record.get("id"), "position": record.get("position")})
+
+
+def iter_diagram_json(filepath, positions_only=False):
+    """
+    Reads a streaming diagram file and returns an iterator of JSON text chunks forming
+    the same document as a legacy diagram file: {metadata, nodes, edges, viewport}.
+    Records are passed through without being decoded, so memory stays flat however large
+    the diagram. With positions_only=True nodes only have `id` and `position` (no SQL
+    bodies) and edges are skipped.
+
+    The header is checked before returning: a missing or newer one raises
+    DiagramFormatError, an unreadable file OSError.
+    """
+    fp = _open(filepath, "r", filepath.lower().endswith(".gz"))
+    try:
+        line = fp.readline()
+        while line and not line.strip():
+            line = fp.readline()
+        try:
+            header = json.loads(line)
+        except ValueError:
+            header = None
+        if not isinstance(header, dict) or header.get("kind") != "header" or header.get("format") != DIAGRAM_FORMAT:
+            raise DiagramFormatError(f"{filepath} is not a {DIAGRAM_FORMAT} diagram")
+        if header.get("version", 0) > DIAGRAM_FORMAT_VERSION:
+            raise DiagramFormatError(f"{filepath} was written by a newer version (format {header['version']})")
+    except BaseException:
+        fp.close()
+        raise
+    return _iter_body(fp, header, positions_only)
+
+
+def _iter_body(fp, header, positions_only):
+    with fp:
+        yield '{"metadata": ' + json.dumps(header.get("metadata", {})) + ', "nodes": ['
+        section = "nodes"
+        viewport = EMPTY_VIEWPORT
+        batch = []
+        count = 0 # records written to the current array
+        for line in fp:
+            if line.startswith(_NODE_PREFIX) or line.startswith(_EDGE_PREFIX):
+                kind = "node" if line.startswith(_NODE_PREFIX) else "edge"
+            elif line.strip():
+                record = json.loads(line)
+                kind = record.get("kind")
+                if kind == "viewport":
+                    record.pop("kind")
+                    viewport = record
+                    continue
+            else:
+                continue
+
+            if kind == "edge" and section == "nodes":
+                if batch:
+                    yield ("," if count - len(batch) else "") + ",".join(batch)
+                    batch = []
+                yield '], "edges": ['
+                section = "edges"
+                count = 0
+            if kind == "node" and section == "nodes":
+                batch.append(_position(line) if positions_only else _strip_kind(line, _NODE_PREFIX))
+            elif kind == "edge" and not positions_only:
+                batch.append(_strip_kind(line, _EDGE_PREFIX))
+            else:
+                continue # Nodes after the edges, or unknown records from a newer writer
+            count += 1
+            if len(batch) >= CHUNK_RECORDS:
+                yield ("," if count - len(batch) else "") + ",".join(batch)
+                batch = []
+
+        if batch:
+            yield ("," if count - len(batch) else "") + ",".join(batch)
+        if section == "nodes":
+            yield '], "edges": ['
+        yield '], "viewport": ' + json.dumps(viewport) + "}"
+
+
+def read_diagram(filepath, positions_only=False):
+    """
+    Reads a diagram file of any format into {nodes, edges, viewport, metadata}.
+    Legacy ".json" files are read whole; positions_only then trims them afterwards.
+    """
+    if is_ndjson(filepath):
+        return json.loads("".join(iter_diagram_json(filepath, positions_only)))
+    with open(filepath, "r") as f:
+        data = json.load(f)
+    if positions_only:
+        data["nodes"] = [{"id": node.get("id"), "position": node.get("position")} for node in data.get("nodes", [])]
+        data["edges"] = []
+    return data
@@ -0,0 +1,104 @@
+import json
+from xml.sax.saxutils import escape, quoteattr
+
+# Format name -> file extensions used to infer it from --output
+EXPORT_FORMATS = {
+    "json": (".json",),
+    "ndjson": (".ndjson", ".jsonl"),
+    "graphml": (".graphml",),
+    "dot": (".dot", ".gv"),
+}
+
+# Node attributes written to the attribute-based formats (GraphML, DOT)
+NODE_ATTRIBUTES = ("label", "layer", "type", "project", "dataset", "path", "incomingCount", "nestedCount")
+
+
+def infer_format(output_path, default="json"):
+    """Guesses the export format from a file name, falling back to `default`."""
+    if output_path:
+        lower = output_path.lower()
+        for fmt, extensions in EXPORT_FORMATS.items():
+            if lower.endswith(extensions):
+                return fmt
+    return default
+
+
+def node_attributes(node):
+    """Flat attribute dict of a React Flow node, for GraphML and DOT."""
+    data = node["data"]
+    details = data.get("details", {})
+    attributes = {}
+    for name in NODE_ATTRIBUTES:
+        value = data.get(name, details.get(name))
+        if value is not None:
+            attributes[name] = value
+    return attributes
+
+
+def write_json(nodes, edges, fp, metadata=None):
+    json.dump({"nodes": nodes, "edges": edges, "metadata": metadata or {}}, fp)
+    fp.write("\n")
+
+
+def write_ndjson(nodes, edges, fp, metadata=None):
+    """One JSON record per line: a header, then every node, then every edge."""
+    header = {"kind": "header", "format": "sql-dag-flow", "version": 1,
+              "nodeCount": len(nodes), "edgeCount": len(edges), "metadata": metadata or {}}
+    fp.write(json.dumps(header) + "\n")
+    for node in nodes:
+        fp.write(json.dumps({"kind": "node", **node}) + "\n")
+    for edge in edges:
+        fp.write(json.dumps({"kind": "edge", **edge}) + "\n")
+
+
+def write_graphml(nodes, edges, fp, metadata=None):
+    fp.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+    fp.write('<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n')
+    for name in NODE_ATTRIBUTES:
+        attr_type = "int" if name.endswith("Count") else "string"
+        fp.write(f'  <key id="{name}" for="node" attr.name="{name}" attr.type="{attr_type}"/>\n')
+    fp.write('  <graph id="lineage" edgedefault="directed">\n')
+    for node in nodes:
+        fp.write(f'    <node id={quoteattr(node["id"])}>\n')
+        for name, value in node_attributes(node).items():
+            fp.write(f'      <data key="{name}">{escape(str(value))}</data>\n')
+        fp.write('    </node>\n')
+    # Edge ids repeat when a table is referenced more than once (e.g. as `t` and `ds.t`), and
+    # GraphML ids must be unique: the running index, after the last dash, makes them so
+    for index, edge in enumerate(edges):
+        edge_id = f"{edge['id']}-{index}"
+        fp.write(f'    <edge id={quoteattr(edge_id)} source={quoteattr(edge["source"])} '
+                 f'target={quoteattr(edge["target"])}/>\n')
+    fp.write('  </graph>\n')
+    fp.write('</graphml>\n')
+
+
+def _dot_quote(value):
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+
+
+def write_dot(nodes, edges, fp, metadata=None):
+    fp.write("digraph lineage {\n")
+    fp.write("  rankdir=LR;\n")
+    fp.write("  node [shape=box];\n")
+    for node in nodes:
+        attributes = ", ".join(f"{name}={_dot_quote(value)}" for name, value in node_attributes(node).items())
+        fp.write(f"  {_dot_quote(node['id'])} [{attributes}];\n")
+    for edge in edges:
+        fp.write(f"  {_dot_quote(edge['source'])} -> {_dot_quote(edge['target'])};\n")
+    fp.write("}\n")
+
+
+WRITERS = {
+    "json": write_json,
+    "ndjson": write_ndjson,
+    "graphml": write_graphml,
+    "dot": write_dot,
+}
+
+
+def export_graph(nodes, edges, fp, fmt="json", metadata=None):
+    """Writes a built graph to a text file object in one of EXPORT_FORMATS."""
+    if fmt not in WRITERS:
+        raise ValueError(f"Unknown export format '{fmt}', expected one of: {', '.join(WRITERS)}")
+    WRITERS[fmt](nodes, edges, fp, metadata=metadata)
@@ -0,0 +1,289 @@
+from array import array
+
+try:
+    _popcount = int.bit_count # Python 3.10+
+except AttributeError:
+    def _popcount(value):
+        return bin(value).count("1")
+
+# Edge kinds and their React Flow styles. Rendered edges share these dicts: treat them as read-only.
+EDGE_TABLE = 0
+EDGE_CTE = 1
+EDGE_EXTERNAL = 2
+EDGE_STYLES = (
+    {"stroke": "#b1b1b7"},
+    {"stroke": "#E91E63", "strokeDasharray": "2,2"}, # Pink dashed for CTEs
+    {"stroke": "#ff9f1c", "strokeDasharray": "5,5"}, # Discovered dependencies
+)
+
+
+def csr(node_count, heads, tails):
+    """
+    Compressed sparse row adjacency of the edges heads[i] -> tails[i]: the neighbours of
+    node n are targets[offsets[n]:offsets[n + 1]], in edge order.
+    """
+    offsets = array("i", bytes(4 * (node_count + 1)))
+    for head in heads:
+        offsets[head + 1] += 1
+    for n in range(node_count):
+        offsets[n + 1] += offsets[n]
+    targets = array("i", bytes(4 * len(heads)))
+    fill = offsets[:-1]
+    for head, tail in zip(heads, tails):
+        targets[fill[head]] = tail
+        fill[head] += 1
+    return offsets, targets
+
+
+def strongly_connected_components(offsets, targets):
+    """
+    Iterative Tarjan's algorithm over a CSR adjacency (see csr()).
+    Returns (component_of, components) where components are listed in reverse
+    topological order (a component comes after every component it points to).
+    """
+    node_count = len(offsets) - 1
+    index_of = [-1] * node_count
+    lowlink = [0] * node_count
+    on_stack = [False] * node_count
+    component_of = [-1] * node_count
+    components = []
+    stack = []
+    counter = 0
+
+    for root in range(node_count):
+        if index_of[root] != -1:
+            continue
+        # Each frame is (node, position of its next successor in `targets`)
+        work = [(root, offsets[root])]
+        index_of[root] = lowlink[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = True
+
+        while work:
+            node, pos = work[-1]
+            if pos < offsets[node + 1]:
+                work[-1] = (node, pos + 1)
+                child = targets[pos]
+                if index_of[child] == -1:
+                    index_of[child] = lowlink[child] = counter
+                    counter += 1
+                    stack.append(child)
+                    on_stack[child] = True
+                    work.append((child, offsets[child]))
+                elif on_stack[child] and index_of[child] < lowlink[node]:
+                    lowlink[node] = index_of[child]
+                continue
+
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                if lowlink[node] < lowlink[parent]:
+                    lowlink[parent] = lowlink[node]
+
+            if lowlink[node] == index_of[node]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack[member] = False
+                    component_of[member] = len(components)
+                    component.append(member)
+                    if member == node:
+                        break
+                components.append(component)
+
+    return component_of, components
+
+
+def ancestor_counts(offsets, targets):
+    """
+    Number of ancestors of every node of a CSR adjacency, as a list indexed by node.
+
+    Cycles are condensed into strongly connected components, then ancestor sets are
+    propagated in topological order as integer bitsets. Each component's set is
+    released as soon as it has been pushed to its successors, so memory follows the
+    width of the graph rather than its size.
+    """
+    component_of, components = strongly_connected_components(offsets, targets)
+
+    counts = [0] * (len(offsets) - 1)
+    pending = [0] * len(components) # ancestor bits inherited from predecessor components
+
+    # Tarjan emits sinks first, so walk the components backwards for topological order
+    for comp_id in range(len(components) - 1, -1, -1):
+        members = components[comp_id]
+        reach = pending[comp_id]
+        pending[comp_id] = 0
+        for member in members:
+            reach |= 1 << member
+
+        # Members of a cycle reach each other; nobody counts itself
+        count = _popcount(reach) - 1
+        for member in members:
+            counts[member] = count
+
+        pushed = set()
+        for member in members:
+            for pos in range(offsets[member], offsets[member + 1]):
+                child_comp = component_of[targets[pos]]
+                if child_comp != comp_id and child_comp not in pushed:
+                    pushed.add(child_comp)
+                    pending[child_comp] |= reach
+
+    return counts
+
+
+def count_ancestors(edge_pairs):
+    """
+    Number of ancestors (nodes with a path to it, excluding itself) of every node
+    that appears in `edge_pairs` (iterable of (source, target)).
+    Equivalent to len(nx.ancestors(G, n)) for every n, see ancestor_counts.
+    """
+    index = {}
+    heads = array("i")
+    tails = array("i")
+    for source, target in edge_pairs:
+        for name in (source, target):
+            if name not in index:
+                index[name] = len(index)
+        heads.append(index[source])
+        tails.append(index[target])
+
+    counts = ancestor_counts(*csr(len(index), heads, tails))
+    return {name: counts[i] for name, i in index.items()}
+
+
+def render_node(node_id, details, incoming, nested):
+    """A node in the React Flow format."""
+    return {
+        "id": node_id,
+        "data": {
+            "label": details["label"],
+            "layer": details["layer"],
+            "details": details,
+            "incomingCount": incoming,
+            "nestedCount": nested
+        },
+        "position": {"x": 0, "y": 0},
+        "type": "custom",
+    }
+
+
+def render_edge(source_id, target_id, kind):
+    """An edge in the React Flow format."""
+    return {
+        "id": f"{source_id}-{target_id}",
+        "source": source_id,
+        "target": target_id,
+        "animated": True,
+        "style": EDGE_STYLES[kind]
+    }
+
+
+class NodeRecord:
+    """A node of the graph core: its parsed details (shared, never copied) and counts."""
+
+    __slots__ = ("details", "incoming", "nested")
+
+    def __init__(self, details):
+        self.details = details
+        self.incoming = 0
+        self.nested = 0
+
+
+class GraphCore:
+    """
+    Compact graph built by build_graph_core.
+
+    Node ids are interned to consecutive integers (in insertion order), edges are kept
+    as parallel integer arrays (source, target, kind) and adjacency as CSR arrays.
+    The React Flow JSON served to the UI is only produced by render(); networkx is an
+    optional export (to_networkx) and is never needed to build or query the graph.
+    """
+
+    def __init__(self):
+        self.ids = [] # int -> node id
+        self.index = {} # node id -> int
+        self.records = [] # int -> NodeRecord
+        self.sources = array("i")
+        self.targets = array("i")
+        self.kinds = array("b")
+        self._downstream = None # CSR (offsets, targets), built on first use
+        self._upstream = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add_node(self, node_id, details):
+        """Interns `node_id`; re-adding an id replaces its details but keeps its position."""
+        position = self.index.get(node_id)
+        if position is None:
+            position = self.index[node_id] = len(self.ids)
+            self.ids.append(node_id)
+            self.records.append(NodeRecord(details))
+        else:
+            self.records[position].details = details
+        return position
+
+    def intern(self, node_id):
+        """Integer of a node id that has already been added."""
+        return self.index[node_id]
+
+    def add_edge(self, source, target, kind=EDGE_TABLE):
+        """Edge between two interned nodes. Duplicates are kept, like repeated references."""
+        self.sources.append(source)
+        self.targets.append(target)
+        self.kinds.append(kind)
+        self.records[target].incoming += 1
+        self._downstream = self._upstream = None
+
+    def downstream(self):
+        if self._downstream is None:
+            self._downstream = csr(len(self.ids), self.sources, self.targets)
+        return self._downstream
+
+    def upstream(self):
+        if self._upstream is None:
+            self._upstream = csr(len(self.ids), self.targets, self.sources)
+        return self._upstream
+
+    def successors(self, position):
+        offsets, targets = self.downstream()
+        return targets[offsets[position]:offsets[position + 1]]
+
+    def predecessors(self, position):
+        offsets, sources = self.upstream()
+        return sources[offsets[position]:offsets[position + 1]]
+
+    def compute_nested_counts(self):
+        """Stores the number of ancestors of every node in its record's `nested`."""
+        for record, count in zip(self.records, ancestor_counts(*self.downstream())):
+            record.nested = count
+
+    def render_nodes(self):
+        return [render_node(node_id, record.details, record.incoming, record.nested)
+                for node_id, record in zip(self.ids, self.records)]
+
+    def render_edges(self):
+        ids = self.ids
+        return [render_edge(ids[source], ids[target], kind)
+                for source, target, kind in zip(self.sources, self.targets, self.kinds)]
+
+    def render(self):
+        """(nodes, edges) in the React Flow format."""
+        return self.render_nodes(), self.render_edges()
+
+    def to_networkx(self):
+        """nx.DiGraph of the graph, with node details as attributes. Requires networkx."""
+        try:
+            import networkx as nx
+        except ImportError:
+            raise ImportError("to_networkx() requires networkx: pip install sql-dag-flow[networkx]") from None
+
+        graph = nx.DiGraph()
+        for node_id, record in zip(self.ids, self.records):
+            graph.add_node(node_id, label=record.details["label"], layer=record.details["layer"],
+                           details=record.details)
+        ids = self.ids
+        graph.add_edges_from((ids[source], ids[target]) for source, target in zip(self.sources, self.targets))
+        return graph
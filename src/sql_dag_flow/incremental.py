@@ -0,0 +1,302 @@
+from array import array
+from collections import deque
+from .parser import dependency_links, virtual_node_details
+from .graph_core import csr, ancestor_counts, render_node, render_edge, EDGE_TABLE
+
+
+class IncrementalGraph:
+    """
+    Per-node view of a built graph (the output of build_graph) that is patched in place as
+    files change, instead of resolving and rendering the whole project again.
+
+    A change only re-resolves the changed tables and the tables referencing their names
+    (a new table may capture a reference that resolved elsewhere or to a ghost node), and
+    only recounts nestedCount below the nodes whose incoming edges changed. The result
+    matches a full build of the same files, except that new nodes and edges are listed last.
+
+    Created from a full build; `file_records`, `tables` and `resolver` are the project's
+    own and are updated by apply(). `walk` returns the project's .sql files in walk order
+    (see scanner.iter_sql_files): when two files define the same table id the later one
+    wins, so new files are ranked by their position in the walk, as in a full build.
+    """
+
+    def __init__(self, file_records, tables, nodes, edges, resolver, discovery_mode, walk=None):
+        self.file_records = file_records
+        self.tables = tables
+        self.resolver = resolver
+        self.discovery_mode = discovery_mode
+        self.walk = walk
+
+        self.order = {path: seq for seq, path in enumerate(file_records)} # path -> walk position
+        self._next_seq = len(self.order)
+        self.owners = {} # table id -> paths of the files defining it (the last one in walk order wins)
+        for path, records in file_records.items():
+            for node_id in records:
+                self.owners.setdefault(node_id, set()).add(path)
+
+        self.nodes = {node["id"]: node for node in nodes}
+        self.nested = {node["id"]: node["data"]["nestedCount"] for node in nodes}
+        self.edges = {} # table id -> edges pointing to it, in dependency order
+        self.children = {} # node id -> {table id: edges from the node to the table}
+        for edge in edges:
+            self.edges.setdefault(edge["target"], []).append(edge)
+            self._link(edge["source"], edge["target"], 1)
+
+        self.virtual = {} # ghost / CTE node id -> (details, edges leaving it)
+        for node_id, node in self.nodes.items():
+            if node_id not in tables:
+                self.virtual[node_id] = [node["data"]["details"], sum(self.children.get(node_id, {}).values())]
+
+        self.referrers = {} # last part of a reference (normalized) -> tables with such a dependency
+        self.ambiguous = {} # table id -> {reference: candidates} of its ambiguous dependencies
+        for source_id, record in tables.items():
+            self._refer(source_id, record, True)
+            self._collect_ambiguities(source_id, record)
+
+    def _link(self, source_id, target_id, count):
+        targets = self.children.setdefault(source_id, {})
+        targets[target_id] = targets.get(target_id, 0) + count
+        if not targets[target_id]:
+            del targets[target_id]
+            if not targets:
+                del self.children[source_id]
+
+    def _key(self, reference):
+        return self.resolver.normalize(reference.split(".")[-1])
+
+    def _names(self, node_id, record):
+        """Keys of `referrers` whose references a table may resolve (see TableResolver._invalidate)."""
+        return {self.resolver.normalize(record.get("label") or node_id),
+                self.resolver.normalize(node_id).split(".")[-1]}
+
+    def _refer(self, source_id, record, add):
+        for dep in record["dependencies"]:
+            key = self._key(dep)
+            if add:
+                self.referrers.setdefault(key, set()).add(source_id)
+            else:
+                sources = self.referrers.get(key)
+                if sources is not None:
+                    sources.discard(source_id)
+                    if not sources:
+                        del self.referrers[key]
+
+    def _collect_ambiguities(self, source_id, record):
+        ambiguous = {}
+        for dep in record["dependencies"]:
+            candidates = [c for c in self.resolver.candidates(dep) if c != source_id]
+            if len(candidates) > 1:
+                ambiguous[dep] = candidates
+        if ambiguous:
+            self.ambiguous[source_id] = ambiguous
+        else:
+            self.ambiguous.pop(source_id, None)
+
+    def ambiguity_report(self):
+        """Same items as TableResolver.ambiguity_report(tables)."""
+        report = {}
+        for source_id, references in self.ambiguous.items():
+            for reference, candidates in references.items():
+                item = report.setdefault(reference, {"reference": reference, "candidates": candidates,
+                                                     "resolvedTo": candidates[0], "referencedBy": []})
+                item["referencedBy"].append(source_id)
+        return list(report.values())
+
+    def _winner(self, node_id):
+        paths = self.owners.get(node_id)
+        if not paths:
+            return None
+        return self.file_records[max(paths, key=self.order.__getitem__)][node_id]
+
+    def _reorder(self):
+        """
+        Ranks files by their walk position again, keeping `file_records` in walk order.
+        Returns the table ids defined by several files, whose winner may have changed.
+        """
+        ranks = {path: seq for seq, path in enumerate(self.walk())}
+        ordered = sorted(self.file_records.items(), key=lambda item: ranks.get(item[0], len(ranks)))
+        self.file_records.clear()
+        self.file_records.update(ordered)
+        self.order = {path: seq for seq, (path, _) in enumerate(ordered)}
+        self._next_seq = len(self.order)
+        return {node_id for node_id, paths in self.owners.items() if len(paths) > 1}
+
+    def apply(self, file_changes):
+        """
+        Applies {path: records, or None for a deleted file} and patches the graph.
+        Returns (delta, changed) where delta has the shape of diff_graph and `changed`
+        maps the table ids whose record changed to the new record (None if removed).
+        """
+        candidates = set()
+        new_files = False
+        for path, records in file_changes.items():
+            old = self.file_records.pop(path, None) if records is None else self.file_records.get(path)
+            if old is not None:
+                for node_id in old:
+                    self.owners[node_id].discard(path)
+                    candidates.add(node_id)
+            if records is None:
+                self.order.pop(path, None)
+                continue
+            if path not in self.order:
+                new_files = True
+                self.order[path] = self._next_seq
+                self._next_seq += 1
+            self.file_records[path] = records
+            for node_id in records:
+                self.owners.setdefault(node_id, set()).add(path)
+                candidates.add(node_id)
+        if new_files and self.walk is not None:
+            candidates |= self._reorder()
+
+        changed = {}
+        for node_id in candidates:
+            record = self._winner(node_id)
+            if not self.owners.get(node_id):
+                self.owners.pop(node_id, None)
+            if self.tables.get(node_id) is not record:
+                changed[node_id] = record
+        if not changed:
+            return None, changed
+
+        # 1. Swap the records, collecting the names whose references may resolve differently now
+        names = set()
+        for node_id, record in changed.items():
+            old = self.tables.get(node_id)
+            if old is not None:
+                names |= self._names(node_id, old)
+                self._refer(node_id, old, False)
+                self.resolver.remove(node_id)
+            if record is None:
+                self.tables.pop(node_id, None)
+            else:
+                self.tables[node_id] = record
+                self.resolver.add(node_id, record)
+                self._refer(node_id, record, True)
+                names |= self._names(node_id, record)
+        sources = set(changed)
+        for name in names:
+            sources.update(self.referrers.get(name, ()))
+
+        # 2. Re-resolve those tables and swap their incoming edges
+        edges_added, edges_removed = [], []
+        seeds = set() # tables whose incoming edges changed
+        touched = set(changed) # nodes to render again
+        replaced = {source_id: self.edges.pop(source_id, []) for source_id in sources}
+        for source_id, old_edges in replaced.items():
+            # Release the old edges first, while `virtual` still holds the nodes they came from
+            for edge in old_edges:
+                self._link(edge["source"], source_id, -1)
+                entry = self.virtual.get(edge["source"])
+                if entry is not None:
+                    entry[1] -= 1
+                    touched.add(edge["source"])
+        for source_id, old_edges in replaced.items():
+            record = self.tables.get(source_id)
+            new_edges = []
+            if record is not None:
+                resolved = [(dep, self.resolver.resolve(dep, source_id)) for dep in record["dependencies"]]
+                self._collect_ambiguities(source_id, record)
+                for node_id, kind in dependency_links(source_id, resolved, self.discovery_mode):
+                    if kind != EDGE_TABLE and node_id not in self.tables:
+                        entry = self.virtual.get(node_id)
+                        if entry is None:
+                            entry = self.virtual[node_id] = [None, 0]
+                        entry[0] = virtual_node_details(node_id, kind, record)
+                        entry[1] += 1
+                        touched.add(node_id)
+                    new_edges.append(render_edge(node_id, source_id, kind))
+                if new_edges:
+                    self.edges[source_id] = new_edges
+            else:
+                self.ambiguous.pop(source_id, None)
+
+            for edge in new_edges:
+                self._link(edge["source"], source_id, 1)
+
+            if [edge["id"] for edge in old_edges] != [edge["id"] for edge in new_edges]:
+                seeds.add(source_id)
+                old_ids = {edge["id"] for edge in old_edges}
+                new_ids = {edge["id"] for edge in new_edges}
+                seen = set()
+                for edge in new_edges:
+                    if edge["id"] not in old_ids and edge["id"] not in seen:
+                        seen.add(edge["id"])
+                        edges_added.append(edge)
+                edges_removed.extend(edge_id for edge_id in dict.fromkeys(edge["id"] for edge in old_edges)
+                                     if edge_id not in new_ids)
+        for node_id in [node_id for node_id in touched if node_id in self.virtual]:
+            if self.virtual[node_id][1] <= 0 or node_id in self.tables:
+                del self.virtual[node_id]
+
+        # 3. Recount ancestors below the changed edges, then render the affected nodes
+        touched |= self._recount(seeds | {node_id for node_id in changed
+                                          if node_id in self.tables and node_id not in self.nested})
+        added, updated, removed = [], [], []
+        for node_id in touched:
+            old = self.nodes.get(node_id)
+            if node_id in self.tables:
+                details = self.tables[node_id]
+            elif node_id in self.virtual:
+                details = self.virtual[node_id][0]
+            else:
+                if old is not None:
+                    del self.nodes[node_id]
+                    self.nested.pop(node_id, None)
+                    removed.append(node_id)
+                continue
+            node = render_node(node_id, details, len(self.edges.get(node_id, ())), self.nested.get(node_id, 0))
+            if old is None:
+                added.append(node)
+            elif old != node:
+                updated.append(node)
+            else:
+                continue
+            self.nodes[node_id] = node
+
+        delta = {
+            "nodes": {"added": added, "updated": updated, "removed": removed},
+            "edges": {"added": edges_added, "removed": edges_removed},
+        }
+        return delta, changed
+
+    def _recount(self, seeds):
+        """
+        Updates `nested` for `seeds` and every node below them: their ancestor counts are
+        recomputed over their upstream closure only. Returns the recounted node ids.
+        """
+        below = set(seeds)
+        queue = deque(seeds)
+        while queue:
+            for child in self.children.get(queue.popleft(), ()):
+                if child not in below:
+                    below.add(child)
+                    queue.append(child)
+        if not below:
+            return below
+
+        # Ancestors of these nodes only have ancestors among themselves
+        scope = set(below)
+        queue = deque(below)
+        while queue:
+            for edge in self.edges.get(queue.popleft(), ()):
+                if edge["source"] not in scope:
+                    scope.add(edge["source"])
+                    queue.append(edge["source"])
+
+        index = {node_id: i for i, node_id in enumerate(scope)}
+        heads, tails = array("i"), array("i")
+        for node_id in scope:
+            for edge in self.edges.get(node_id, ()):
+                heads.append(index[edge["source"]])
+                tails.append(index[node_id])
+        counts = ancestor_counts(*csr(len(index), heads, tails))
+        for node_id in below:
+            self.nested[node_id] = counts[index[node_id]]
+        return below
+
+    def node_list(self):
+        return list(self.nodes.values())
+
+    def edge_list(self):
+        return [edge for edges in self.edges.values() for edge in edges]
@@ -0,0 +1,157 @@
+from .graph_core import csr, strongly_connected_components
+
+# Node box and gaps, matching the client-side ELK layout (left to right)
+NODE_WIDTH = 250
+NODE_HEIGHT = 100
+RANK_SPACING = NODE_WIDTH + 100 # x distance between consecutive ranks
+NODE_SPACING = NODE_HEIGHT + 80 # y distance between nodes of a rank
+
+# Within a rank, nodes are grouped by medallion layer in this order (other layers last)
+LAYER_ORDER = ("external", "bronze", "silver", "gold", "cte")
+
+# Barycenter passes (one down + one up each) of a full layout
+SWEEPS = 4
+
+# Above this share of changed nodes an incremental update falls back to a full layout
+MAX_DIRTY_SHARE = 0.5
+
+
+def _band(node):
+    layer = node["data"].get("layer")
+    return LAYER_ORDER.index(layer) if layer in LAYER_ORDER else len(LAYER_ORDER)
+
+
+def longest_path_ranks(offsets, targets):
+    """
+    Rank of every node of a CSR adjacency: the length of the longest path reaching it.
+    Cycles are condensed first, so all members of a cycle share a rank. Sources are then
+    pulled right, next to their first consumer, so that external tables and CTEs sit
+    beside the tables reading them instead of piling up in the first rank.
+    """
+    component_of, components = strongly_connected_components(offsets, targets)
+    component_rank = [0] * len(components)
+    # Tarjan emits sinks first, so walk the components backwards for topological order
+    for comp_id in range(len(components) - 1, -1, -1):
+        rank = component_rank[comp_id] + 1
+        for member in components[comp_id]:
+            for pos in range(offsets[member], offsets[member + 1]):
+                child_comp = component_of[targets[pos]]
+                if child_comp != comp_id and component_rank[child_comp] < rank:
+                    component_rank[child_comp] = rank
+    ranks = [component_rank[component_of[n]] for n in range(len(offsets) - 1)]
+
+    has_predecessor = [False] * len(ranks)
+    for target in targets:
+        has_predecessor[target] = True
+    for n in range(len(ranks)):
+        if not has_predecessor[n] and offsets[n] < offsets[n + 1]:
+            ranks[n] = min(ranks[targets[pos]] for pos in range(offsets[n], offsets[n + 1])) - 1
+    return ranks
+
+
+def _centered(members):
+    """{member: y} for an ordered rank, centered on y = 0."""
+    middle = (len(members) - 1) / 2
+    return {member: (i - middle) * NODE_SPACING for i, member in enumerate(members)}
+
+
+class LayeredLayout:
+    """
+    Server-side layered (Sugiyama-style) layout of a built graph.
+
+    Ranks come from longest-path layering, left to right. Nodes of a rank are grouped by
+    medallion layer (bronze above silver above gold) and ordered within their group by
+    barycenter sweeps to reduce edge crossings.
+
+    The last layout is kept so that update() only re-orders the ranks touched by a
+    change: ranks whose members and their connections are unchanged keep their positions,
+    which keeps the picture stable while files are edited in watch mode.
+    """
+
+    def __init__(self):
+        self._ranks = {} # node id -> rank of the last layout
+        self._y = {} # node id -> y of the last layout
+        self._signatures = {} # node id -> hash of its neighbours in the last layout
+
+    def update(self, nodes, edges):
+        """Positions {node id: [x, y]} of the graph, re-using the last layout where possible."""
+        ids = [node["id"] for node in nodes]
+        index = {node_id: i for i, node_id in enumerate(ids)}
+        heads = []
+        tails = []
+        for edge in edges:
+            source, target = index.get(edge["source"]), index.get(edge["target"])
+            if source is not None and target is not None and source != target:
+                heads.append(source)
+                tails.append(target)
+        down_offsets, down_targets = csr(len(ids), heads, tails)
+        up_offsets, up_sources = csr(len(ids), tails, heads)
+
+        ranks = longest_path_ranks(down_offsets, down_targets)
+        bands = [_band(node) for node in nodes]
+        neighbours = [
+            [*up_sources[up_offsets[n]:up_offsets[n + 1]], *down_targets[down_offsets[n]:down_offsets[n + 1]]]
+            for n in range(len(ids))
+        ]
+        signatures = [hash(tuple(sorted(ids[m] for m in neighbours[n]))) for n in range(len(ids))]
+
+        dirty = [n for n in range(len(ids))
+                 if self._ranks.get(ids[n]) != ranks[n] or self._signatures.get(ids[n]) != signatures[n]]
+        removed = [node_id for node_id in self._ranks if node_id not in index]
+
+        if not self._ranks or len(dirty) > MAX_DIRTY_SHARE * max(len(ids), 1):
+            y = self._full(ranks, bands, neighbours)
+        else:
+            y = self._incremental(ids, ranks, bands, neighbours, dirty, removed)
+
+        self._ranks = {node_id: ranks[n] for n, node_id in enumerate(ids)}
+        self._y = {node_id: y[n] for n, node_id in enumerate(ids)}
+        self._signatures = {node_id: signatures[n] for n, node_id in enumerate(ids)}
+        return {node_id: [ranks[n] * RANK_SPACING, y[n]] for n, node_id in enumerate(ids)}
+
+    def _full(self, ranks, bands, neighbours):
+        by_rank = {}
+        for n, rank in enumerate(ranks):
+            by_rank.setdefault(rank, []).append(n)
+        order = {rank: sorted(members, key=lambda n: bands[n]) for rank, members in by_rank.items()}
+        y = [0.0] * len(ranks)
+        for rank_members in order.values():
+            for n, value in _centered(rank_members).items():
+                y[n] = value
+
+        sorted_ranks = sorted(order)
+        for sweep in range(2 * SWEEPS):
+            # Even sweeps go left to right (ordering by predecessors), odd ones right to left
+            for rank in (sorted_ranks if sweep % 2 == 0 else reversed(sorted_ranks)):
+                def barycenter(n):
+                    sides = [y[m] for m in neighbours[n] if (ranks[m] < rank if sweep % 2 == 0 else ranks[m] > rank)]
+                    return sum(sides) / len(sides) if sides else y[n]
+                members = sorted(order[rank], key=lambda n: (bands[n], barycenter(n), y[n]))
+                order[rank] = members
+                for n, value in _centered(members).items():
+                    y[n] = value
+        return y
+
+    def _incremental(self, ids, ranks, bands, neighbours, dirty, removed):
+        dirty_set = set(dirty)
+        dirty_ranks = {ranks[n] for n in dirty}
+        dirty_ranks.update(self._ranks[ids[n]] for n in dirty if ids[n] in self._ranks)
+        dirty_ranks.update(self._ranks[node_id] for node_id in removed)
+
+        y = [self._y.get(node_id, 0.0) for node_id in ids]
+        by_rank = {}
+        for n, rank in enumerate(ranks):
+            if rank in dirty_ranks:
+                by_rank.setdefault(rank, []).append(n)
+
+        for rank in sorted(by_rank):
+            def key(n):
+                if n not in dirty_set:
+                    return (bands[n], y[n])
+                # Changed nodes are slotted in next to the nodes they connect to
+                placed = [y[m] for m in neighbours[n] if m not in dirty_set or ranks[m] < rank]
+                return (bands[n], sum(placed) / len(placed) if placed else float("inf"))
+            members = sorted(by_rank[rank], key=key)
+            for n, value in _centered(members).items():
+                y[n] = value
+        return y
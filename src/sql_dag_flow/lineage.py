@@ -0,0 +1,246 @@
+from collections import OrderedDict
+import sqlglot
+from sqlglot import exp
+from sqlglot.errors import SqlglotError
+from sqlglot.lineage import lineage as sqlglot_lineage
+from sqlglot.optimizer.qualify import qualify
+from .cache import content_hash
+from .parser import _target_table, _qualified_name
+
+# Column lineage results kept in memory, most recently used last
+MAX_CACHED_LINEAGE = 512
+
+# sqlglot schemas need every table at the same depth (catalog.db.table); references
+# written with fewer parts get these placeholders
+_NO_CATALOG = "_catalog"
+_NO_DB = "_db"
+
+
+def _statement_for(record, dialect):
+    """
+    The statement of a node's file that writes the node's table, or the last query of
+    the file if it writes nothing (SELECT-only files are named after the file).
+    """
+    statements = [s for s in sqlglot.parse(record["content"], read=dialect) if s is not None]
+    last_query = None
+    for statement in statements:
+        for node in statement.walk():
+            target = _target_table(node)
+            if target is not None and target.name == record["label"] and \
+                    (not target.db or target.db == record["dataset"]):
+                return node
+        if isinstance(statement, exp.Query):
+            last_query = statement
+    return last_query
+
+
+def _split_statement(statement):
+    """(query, declared column names) of a CREATE/INSERT/SELECT statement."""
+    if isinstance(statement, exp.Query):
+        return statement, None
+    if isinstance(statement, exp.Merge):
+        return None, None # MERGE writes column by column, no single projection to trace
+
+    declared = None
+    if isinstance(statement.this, exp.Schema):
+        declared = [column.name for column in statement.this.expressions
+                    if isinstance(column, (exp.ColumnDef, exp.Identifier, exp.Column))]
+    query = statement.expression
+    return (query if isinstance(query, exp.Query) else None), declared
+
+
+def _uniform_tables(query):
+    """
+    Gives every table reference of `query` (CTE references excepted) a catalog and db
+    so that it matches a 3-level schema. Returns {(catalog, db, name): written name}.
+    """
+    cte_names = {cte.alias_or_name for cte in query.find_all(exp.CTE)}
+    written = {}
+    for table in query.find_all(exp.Table):
+        if not table.name or (not table.db and table.name in cte_names):
+            continue
+        name = _qualified_name(table)
+        if not table.db:
+            table.set("db", exp.to_identifier(_NO_DB))
+        if not table.catalog:
+            table.set("catalog", exp.to_identifier(_NO_CATALOG))
+        written[(table.catalog, table.db, table.name)] = name
+    return written
+
+
+class ColumnLineage:
+    """
+    On-demand column-level lineage for nodes of a built graph.
+
+    Nothing is computed while parsing: the first request for a node parses its SQL again,
+    qualifies it with sqlglot and traces every output column back to upstream table
+    columns. Star expansion uses a catalog of upstream columns derived from their own
+    parsed CREATE statements (column definitions or projections), itself built lazily.
+
+    Results are memoised in an LRU keyed by the node's file hash and the upstream
+    columns it was resolved against, so they survive graph rebuilds while still
+    refreshing when the node or the tables it reads from change. A first-level LRU keyed
+    by the content hashes of the node and of every table upstream of it answers repeat
+    requests without parsing anything.
+    """
+
+    def __init__(self, dialect="bigquery", max_entries=MAX_CACHED_LINEAGE):
+        self.dialect = dialect
+        self.max_entries = max_entries
+        self._results = OrderedDict() # (node id, dialect, hash, upstream schema) -> result
+        self._by_content = OrderedDict() # (node id, dialect, hash, upstream hashes) -> result
+        self._hashes = {} # node id -> (content, content hash) of the last hashed record
+        self._columns = {} # node id -> output columns (None if unknown), reset with reset_catalog()
+
+    def reset_catalog(self):
+        """Forgets the derived column catalog; call when the graph changes."""
+        self._columns = {}
+
+    def table_columns(self, node_id, tables, resolver, _visiting=None):
+        """Output column names of a parsed table, or None if they cannot be derived."""
+        if node_id in self._columns:
+            return self._columns[node_id]
+        record = tables.get(node_id)
+        if record is None or "error" in record or not record.get("content"):
+            return None
+
+        visiting = _visiting if _visiting is not None else set()
+        if node_id in visiting:
+            return None # Cycle: give up on star expansion through it
+        visiting.add(node_id)
+
+        columns = None
+        try:
+            statement = _statement_for(record, self.dialect)
+            query, declared = _split_statement(statement) if statement is not None else (None, None)
+            if declared:
+                columns = declared
+            elif query is not None:
+                query = query.copy()
+                if query.is_star or any(select.is_star for select in query.selects):
+                    schema, _ = self._schema(node_id, query, tables, resolver, visiting)
+                    query = qualify(query, schema=schema, dialect=self.dialect,
+                                    validate_qualify_columns=False, identify=False)
+                columns = [name for name in query.named_selects if name != "*"] or None
+        except SqlglotError as e:
+            print(f"Error deriving columns of {node_id}: {e}")
+
+        visiting.discard(node_id)
+        self._columns[node_id] = columns
+        return columns
+
+    def _schema(self, node_id, query, tables, resolver, visiting=None):
+        """
+        3-level sqlglot schema of the tables read by `query` whose columns are known.
+        Rewrites the query's table references in place, see _uniform_tables.
+        Returns (schema, {(catalog, db, name): (written name, node id or None)}).
+        """
+        schema = {}
+        sources = {}
+        for key, written in _uniform_tables(query).items():
+            target_id = resolver.resolve(written, node_id) if resolver is not None else None
+            if target_id == node_id:
+                target_id = None
+            sources[key] = (written, target_id)
+            columns = self.table_columns(target_id, tables, resolver, visiting) if target_id else None
+            if columns:
+                catalog, db, name = key
+                schema.setdefault(catalog, {}).setdefault(db, {})[name] = {c: "UNKNOWN" for c in columns}
+        return schema, sources
+
+    def _hash(self, node_id, record):
+        content = record.get("content", "")
+        cached = self._hashes.get(node_id)
+        if cached is None or cached[0] is not content:
+            cached = self._hashes[node_id] = (content, content_hash(content))
+        return cached[1]
+
+    def _upstream_hashes(self, node_id, tables, resolver):
+        """Sorted (node id, content hash) of the tables upstream of a node: what its lineage derives from."""
+        hashes = []
+        seen = {node_id}
+        stack = [node_id]
+        while stack:
+            record = tables.get(stack.pop())
+            if record is None or resolver is None:
+                continue
+            for dep in record["dependencies"]:
+                target_id = resolver.resolve(dep, record["id"])
+                if target_id is not None and target_id not in seen and target_id in tables:
+                    seen.add(target_id)
+                    stack.append(target_id)
+                    hashes.append((target_id, self._hash(target_id, tables[target_id])))
+        return tuple(sorted(hashes))
+
+    def _remember(self, results, key, result):
+        results[key] = result
+        if len(results) > self.max_entries:
+            results.popitem(last=False)
+
+    def node_lineage(self, node_id, tables, resolver=None):
+        """
+        Column lineage of one node: {"id", "columns": [{"column", "sources": [{"node",
+        "table", "column"}]}]}, plus "error" when the node's SQL cannot be traced.
+        Returns None if the node is unknown.
+        """
+        record = tables.get(node_id)
+        if record is None:
+            return None
+        result = {"id": node_id, "columns": []}
+        if "error" in record or not record.get("content"):
+            result["error"] = record.get("error", "No SQL content")
+            return result
+
+        # Same SQL and same upstream SQL: same lineage, checked before parsing anything
+        content_key = (node_id, self.dialect, self._hash(node_id, record),
+                       self._upstream_hashes(node_id, tables, resolver))
+        if content_key in self._by_content:
+            self._by_content.move_to_end(content_key)
+            return self._by_content[content_key]
+
+        try:
+            statement = _statement_for(record, self.dialect)
+            query, declared = _split_statement(statement) if statement is not None else (None, None)
+            if query is None and declared:
+                # CREATE TABLE t (a INT, ...): a source table, its columns have no upstream
+                result["columns"] = [{"column": name, "sources": []} for name in declared]
+                return result
+            if query is None:
+                result["error"] = "No query to trace (only SELECT, CREATE ... AS SELECT and INSERT ... SELECT are supported)"
+                return result
+
+            query = query.copy()
+            schema, sources = self._schema(node_id, query, tables, resolver)
+            key = (node_id, self.dialect, content_key[2],
+                   repr(sorted((k, repr(v)) for k, v in schema.items())))
+            if key in self._results:
+                self._results.move_to_end(key)
+                self._remember(self._by_content, content_key, self._results[key])
+                return self._results[key]
+
+            traced = sqlglot_lineage(None, query, schema=schema, dialect=self.dialect, copy=False)
+        except SqlglotError as e:
+            result["error"] = str(e)
+            return result
+
+        names = list(traced)
+        for position, name in enumerate(names):
+            column_sources = []
+            seen = set()
+            for node in traced[name].walk():
+                if node.downstream or not isinstance(node.source, exp.Table):
+                    continue
+                table = node.source
+                written, target_id = sources.get((table.catalog, table.db, table.name), (table.name, None))
+                column = node.name.split(".")[-1]
+                if (written, column) in seen:
+                    continue
+                seen.add((written, column))
+                column_sources.append({"node": target_id, "table": written, "column": column})
+            # INSERT INTO t (a, b) SELECT ...: positions map to the declared columns
+            output_name = declared[position] if declared and position < len(declared) else name
+            result["columns"].append({"column": output_name, "sources": column_sources})
+
+        self._remember(self._results, key, result)
+        self._remember(self._by_content, content_key, result)
+        return result
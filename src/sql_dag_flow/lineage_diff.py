@@ -0,0 +1,256 @@
+import os
+import hashlib
+import subprocess
+from collections import deque
+from .parser import parse_files, build_graph_core
+from .scanner import iter_sql_files, is_ignored_path
+from .timings import phase
+
+
+class DiffError(Exception):
+    """Raised when a revision cannot be read (unknown ref, missing directory, no git)."""
+
+
+def blob_hash(data):
+    """Git blob id of file content (bytes), so directories and git trees compare alike."""
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+def _in_subfolders(rel_path, subfolders):
+    """Exact-folder filter of parse_sql_files, for relative '/'-separated paths."""
+    if subfolders is None:
+        return True
+    return rel_path.rpartition("/")[0] in subfolders
+
+
+class DirectoryRevision:
+    """The .sql files of a directory, as parse_sql_files would see them."""
+
+    def __init__(self, directory, subfolders=None):
+        if not os.path.isdir(directory):
+            raise DiffError(f"'{directory}' is not a directory")
+        self.directory = directory
+        self.subfolders = subfolders
+        self.label = os.path.abspath(directory)
+
+    def files(self):
+        """{relative path: file path}, in walk order."""
+        files = {}
+        for filepath in iter_sql_files(self.directory, self.subfolders):
+            files[os.path.relpath(filepath, self.directory).replace(os.sep, "/")] = filepath
+        return files
+
+    def hashes(self, files):
+        hashes = {}
+        for rel, filepath in files.items():
+            try:
+                with open(filepath, "rb") as f:
+                    hashes[rel] = blob_hash(f.read())
+            except OSError:
+                pass # Deleted while scanning
+        return hashes
+
+    def contents(self, files, rels):
+        return None # parse_files reads them from disk
+
+
+class GitRevision:
+    """
+    The .sql files of a git revision, read with the local git CLI. Paths are those of the
+    working tree (`directory` may be a subfolder of the repository), so parse results
+    cached for unchanged working tree files are reused.
+    """
+
+    def __init__(self, directory, ref, subfolders=None):
+        self.directory = directory
+        self.ref = ref
+        self.subfolders = subfolders
+        if ref.startswith("-"):
+            raise DiffError(f"'{ref}' is not a git revision") # Would be read as a git option
+        try:
+            self.commit = self._git("rev-parse", "--verify", "--quiet", f"{ref}^{{commit}}").decode().strip()
+        except DiffError as e:
+            raise DiffError(f"'{ref}' is neither a directory nor a git revision of {directory} ({e})")
+        self.label = f"{ref} ({self.commit[:12]})"
+        self._blobs = {}
+
+    def _git(self, *args, input=None):
+        try:
+            result = subprocess.run(["git", "-C", self.directory, *args], input=input,
+                                    stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except FileNotFoundError:
+            raise DiffError("git is not installed")
+        if result.returncode != 0:
+            message = result.stderr.decode("utf-8", "replace").strip()
+            raise DiffError(f"git {args[0]} failed for '{self.ref}'" + (f": {message}" if message else ""))
+        return result.stdout
+
+    def files(self):
+        """{relative path: working tree path}, in tree order."""
+        files = {}
+        # Without --full-tree, ls-tree lists the subtree of `directory` with relative paths
+        for entry in self._git("ls-tree", "-r", "-z", self.commit).split(b"\0"):
+            if not entry:
+                continue
+            info, _, rel = entry.partition(b"\t")
+            _, kind, blob = info.split(b" ")
+            rel = rel.decode("utf-8", "surrogateescape")
+            if kind != b"blob" or not rel.endswith(".sql"):
+                continue
+            if is_ignored_path(rel) or not _in_subfolders(rel, self.subfolders):
+                continue
+            files[rel] = os.path.join(self.directory, *rel.split("/"))
+            self._blobs[rel] = blob.decode()
+        return files
+
+    def hashes(self, files):
+        return {rel: self._blobs[rel] for rel in files}
+
+    def contents(self, files, rels):
+        """{working tree path: SQL text} of the given files, read in one `git cat-file` call."""
+        if not rels:
+            return {}
+        output = self._git("cat-file", "--batch", input="".join(self._blobs[rel] + "\n" for rel in rels).encode())
+        contents = {}
+        position = 0
+        for rel in rels:
+            header_end = output.index(b"\n", position)
+            size = int(output[position:header_end].split(b" ")[2])
+            data = output[header_end + 1:header_end + 1 + size]
+            contents[files[rel]] = data.decode("utf-8", "replace")
+            position = header_end + 1 + size + 1
+        return contents
+
+
+def is_within(path, roots):
+    """Whether `path` is one of `roots` or inside one of them (symlinks resolved)."""
+    path = os.path.realpath(path)
+    for root in roots:
+        root = os.path.realpath(root)
+        if path == root or path.startswith(root.rstrip(os.sep) + os.sep):
+            return True
+    return False
+
+
+def open_revision(spec, directory, subfolders=None, allowed_roots=None):
+    """
+    A DirectoryRevision if `spec` is a directory, else a GitRevision of `directory`.
+    With `allowed_roots`, only directories inside one of them are read as such; any other
+    spec is taken as a git ref (the HTTP API passes the registered project roots).
+    """
+    if spec is None:
+        return DirectoryRevision(directory, subfolders)
+    if os.path.isdir(spec) and (allowed_roots is None or is_within(spec, allowed_roots)):
+        return DirectoryRevision(spec, subfolders)
+    return GitRevision(directory, spec, subfolders)
+
+
+def _parse(revision, files, rels, dialect, cache, workers, timeout, stats):
+    """{relative path: records} of some files of a revision."""
+    parse_stats = {}
+    paths = [files[rel] for rel in rels]
+    parsed = parse_files(paths, dialect=dialect, cache=cache, stats=parse_stats, workers=workers,
+                         timeout=timeout, contents=revision.contents(files, rels))
+    stats["parsed"] += parse_stats.get("cache_misses", 0)
+    stats["cache_hits"] += parse_stats.get("cache_hits", 0)
+    return {rel: records for rel, (_, records) in zip(rels, parsed)}
+
+
+def _downstream(core, seeds):
+    """Ids of every node reachable from `seeds` (ids of `core`), the seeds excluded."""
+    queue = deque(core.index[node_id] for node_id in seeds if node_id in core.index)
+    reached = set(queue)
+    while queue:
+        for successor in core.successors(queue.popleft()):
+            if successor not in reached:
+                reached.add(successor)
+                queue.append(successor)
+    return {core.ids[position] for position in reached} - set(seeds)
+
+
+def _edge_pairs(core):
+    return {(core.ids[source], core.ids[target]) for source, target in zip(core.sources, core.targets)}
+
+
+def _same_node(base_details, head_details):
+    if base_details is head_details:
+        return True
+    # Paths differ between two directories even for identical files
+    return ({k: v for k, v in base_details.items() if k != "path"} ==
+            {k: v for k, v in head_details.items() if k != "path"})
+
+
+def diff_lineage(base, head, dialect="bigquery", discovery=False, cache=None, workers=None, timeout=None,
+                 timings=None):
+    """
+    Lineage difference between two revisions (DirectoryRevision or GitRevision).
+
+    Files are compared by git blob id; files that are identical on both sides are parsed
+    once (usually from the parse cache) and only the differing ones are parsed per side.
+    Returns changed files, added/removed/modified nodes, added/removed edges and
+    `impacted`: nodes downstream of a change that did not change themselves.
+    """
+    stats = {"parsed": 0, "cache_hits": 0}
+    with phase(timings, "walk"):
+        base_files = base.files()
+        head_files = head.files()
+    with phase(timings, "compare"):
+        base_hashes = base.hashes(base_files)
+        head_hashes = head.hashes(head_files)
+        base_files = {rel: path for rel, path in base_files.items() if rel in base_hashes}
+        head_files = {rel: path for rel, path in head_files.items() if rel in head_hashes}
+        shared = [rel for rel in head_files if base_hashes.get(rel) == head_hashes[rel]]
+        shared_set = set(shared)
+        base_only = [rel for rel in base_files if rel not in shared_set]
+        head_only = [rel for rel in head_files if rel not in shared_set]
+
+    with phase(timings, "parse"):
+        records = _parse(head, head_files, shared + head_only, dialect, cache, workers, timeout, stats)
+        base_records = _parse(base, base_files, base_only, dialect, cache, workers, timeout, stats)
+        base_records.update((rel, records[rel]) for rel in shared)
+
+    with phase(timings, "graph"):
+        cores = []
+        for files, side in ((base_files, base_records), (head_files, records)):
+            # Merged in each revision's own order so id collisions resolve as in a full build
+            tables = {}
+            for rel in files:
+                tables.update(side[rel])
+            cores.append(build_graph_core(tables, discovery_mode=discovery, dialect=dialect))
+        base_core, head_core = cores
+
+    with phase(timings, "diff"):
+        added = [node_id for node_id in head_core.ids if node_id not in base_core.index]
+        removed = [node_id for node_id in base_core.ids if node_id not in head_core.index]
+        modified = [node_id for node_id in head_core.ids if node_id in base_core.index and not _same_node(
+            base_core.records[base_core.index[node_id]].details, head_core.records[head_core.index[node_id]].details)]
+        base_edges = _edge_pairs(base_core)
+        head_edges = _edge_pairs(head_core)
+        added_edges = sorted(head_edges - base_edges)
+        removed_edges = sorted(base_edges - head_edges)
+
+        # A node whose inputs changed (e.g. a reference now resolving to a new table) counts as changed
+        changed = set(added) | set(modified) | {target for _, target in added_edges + removed_edges}
+        impacted = _downstream(head_core, changed | set(removed))
+        impacted |= {node_id for node_id in _downstream(base_core, removed) if node_id in head_core.index}
+        impacted -= changed
+
+    files = {
+        "added": sorted(rel for rel in head_only if rel not in base_files),
+        "removed": sorted(rel for rel in base_only if rel not in head_files),
+        "modified": sorted(rel for rel in head_only if rel in base_files),
+    }
+    stats["files"] = len(head_files)
+    stats["changedFiles"] = sum(len(paths) for paths in files.values())
+    return {
+        "base": base.label,
+        "head": head.label,
+        "files": files,
+        "nodes": {"added": sorted(added), "removed": sorted(removed), "modified": sorted(modified)},
+        "edges": {
+            "added": [{"source": source, "target": target} for source, target in added_edges],
+            "removed": [{"source": source, "target": target} for source, target in removed_edges],
+        },
+        "impacted": sorted(impacted),
+        "stats": stats,
+    }
@@ -1,16 +1,31 @@
-from fastapi import FastAPI, HTTPException, Body
+from fastapi import FastAPI, HTTPException, Body, Request, Query
+from typing import List
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse, Response, PlainTextResponse
 import uvicorn
 import os
-import sys
 import json
+import asyncio
+import hashlib
+import uuid
 import webbrowser
 import threading
 import time
-from .parser import parse_sql_files, build_graph
+from starlette.concurrency import run_in_threadpool
+from .parser import compact_nodes, resolve_workers, DEFAULT_PARSE_TIMEOUT, ParseCancelled
+from .streaming import json_stream_response, iter_json, etag_matches, encoded_etag, not_modified
+from .subgraph import DIRECTIONS
+from .analytics import with_analytics, HOTSPOTS
+from .search import DEFAULT_LIMIT, MAX_LIMIT
+from .clusters import is_cluster
+from .timings import Timings, Metrics, timed_iter, SLOWEST_FILES
+from .builds import BuildCoordinator, BuildQueueFull, ClientDisconnected
+from .registry import ProjectRegistry
+from .scanner import list_folders
+from .lineage_diff import diff_lineage, open_revision, DiffError
+from .diagram import is_ndjson, write_diagram, read_diagram, iter_diagram_json, DIAGRAM_EXTENSIONS
 
 app = FastAPI()
 
@@ -29,22 +44,474 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 STATIC_DIR = os.path.join(BASE_DIR, "static")
 
 # Global state
-CURRENT_DIRECTORY = os.getcwd() # Default, updated by start()
+CURRENT_DIRECTORY = os.getcwd() # Default project, updated by start() and /config/path
 DIAGRAM_FILE = "sql_diagram.json"
+METRICS = Metrics() # Cumulative build timings, exposed at /metrics
+BUILDS = BuildCoordinator() # Runs graph builds off the event loop, one per fingerprint at a time
+PARSE_WORKERS = 1 # Parser processes per request, updated by start() (0 = one per CPU core)
+PARSE_TIMEOUT = DEFAULT_PARSE_TIMEOUT # Seconds per file before falling back to the fast path (0 = no limit)
+WATCH_MODE = False # Track file changes and push graph deltas, enabled by start(--watch)
+WATCH_INTERVAL = 1.0
 
-@app.get("/graph")
-def get_graph(dialect: str = "bigquery", discovery: bool = False):
-    """Parses SQL files in the current directory and returns graph data."""
-    if not os.path.exists(CURRENT_DIRECTORY):
+# Registered project roots with their graphs, parse caches and watchers, configured by serve()
+REGISTRY = ProjectRegistry(parse_timeout=PARSE_TIMEOUT, metrics=METRICS)
+SERVER_INSTANCE = uuid.uuid4().hex[:8] # Makes version-based ETags unique to this process
+
+def get_project(project_id=None):
+    """
+    Returns the ProjectState of a registered project, or of CURRENT_DIRECTORY when no id
+    is given. Raises a 404 for unknown ids.
+    """
+    if project_id is None:
+        project_id = REGISTRY.register(CURRENT_DIRECTORY)
+    project = REGISTRY.get(project_id)
+    if project is None:
+        raise HTTPException(status_code=404, detail=f"Unknown project '{project_id}', see /projects")
+    return project
+
+def request_workers(workers):
+    """
+    Parser processes for a client-supplied `workers` value: PARSE_WORKERS when not given,
+    otherwise clamped to the CPU count so a request cannot fork an arbitrary number.
+    """
+    if workers is None:
+        return PARSE_WORKERS
+    try:
+        workers = resolve_workers(workers)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="workers must be an integer")
+    return min(workers, os.cpu_count() or 1)
+
+def build_job(project, dialect, discovery, subfolders, workers, fingerprint):
+    """
+    The BUILDS job of a full build: function(cancelled) returning ((nodes, edges, view),
+    stats, timings), see ProjectState.build for `view`.
+    """
+    def build(cancelled):
+        build_stats = {}
+        build_timings = Timings()
+        view = {}
+        result = project.build(dialect=dialect, discovery=discovery, subfolders=subfolders,
+                               workers=workers, stats=build_stats,
+                               fingerprint=fingerprint, timings=build_timings, cancelled=cancelled, view=view)
+        return (*result, view), build_stats, build_timings
+    return build
+
+def start_build(project, fingerprint, job):
+    """
+    Starts (or joins) the BUILDS job of a project's graph, see BuildCoordinator.start;
+    a full queue answers 503. Full and progressive builds of the same fingerprint share
+    a key, so either kind of request can wait for the other.
+    """
+    # Without a fingerprint nothing identifies the build, so it is never shared
+    key = (project.directory, fingerprint or uuid.uuid4().hex)
+    try:
+        return BUILDS.start(key, job)
+    except BuildQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+
+async def run_build(request, project, dialect, discovery, subfolders, workers, fingerprint):
+    """
+    Builds a project's graph in the BUILDS pool. Returns (((nodes, edges, view), stats,
+    timings), shared), see build_job; a full queue answers 503. Raises ClientDisconnected
+    or ParseCancelled when the client went away.
+    """
+    build, shared = start_build(project, fingerprint,
+                                build_job(project, dialect, discovery, subfolders, workers, fingerprint))
+    return await BUILDS.wait(build, request.is_disconnected), shared
+
+async def ensure_built(request, project, dialect, discovery):
+    """
+    For endpoints served from the last built graph (full or filtered): builds the whole
+    project through run_build unless the last build used this dialect and discovery mode.
+    Returns False if the client went away meanwhile.
+    """
+    if project.config is not None and project.config[:2] == (dialect, discovery):
+        return True
+    if not os.path.exists(project.directory):
+        raise HTTPException(status_code=404, detail="Directory not found")
+    try:
+        fingerprint = await run_in_threadpool(project.compute_fingerprint, dialect, discovery)
+    except OSError:
+        fingerprint = None
+    try:
+        await run_build(request, project, dialect, discovery, None, PARSE_WORKERS, fingerprint)
+    except (ClientDisconnected, ParseCancelled):
+        return False
+    return True
+
+async def graph_response(request, dialect, discovery, subfolders=None, workers=None, compact=False,
+                         include_timings=False, layout=False, analytics=False, cluster=False, project_id=None):
+    """
+    Builds (or reuses) the graph of a project (default: the current one) and streams it as
+    compressed JSON.
+
+    The ETag is a fingerprint of the selected files' content hashes and the build options,
+    so a client refreshing an unchanged project gets a 304 without anything being parsed.
+    In watch mode the in-memory graph is always current and the ETag tracks its version.
+    With compact=True node details omit SQL/CTE bodies, see /node/sql.
+    With include_timings=True the response has a `timings` block (per-phase durations
+    and slowest files of this request) and is never answered with a 304.
+    With layout=True it has a `layout` block of server-computed positions {id: [x, y]}.
+    With analytics=True node data carries the per-node fields of /graph/analytics
+    (descendantCount, chainDepth, chainHeight, fanIn, fanOut, inCycle).
+    With cluster=True discovery-mode ghost nodes are collapsed per project.dataset and CTE
+    nodes per parent file into cluster nodes (data.clusterSize), see /graph/cluster.
+
+    Builds run in the BUILDS pool: concurrent requests for the same fingerprint share one
+    build, a build nobody waits for anymore is cancelled, and a full queue answers 503.
+    """
+    workers = request_workers(workers)
+    # Opening a cold project may write another one's graph to disk
+    project = await run_in_threadpool(get_project, project_id)
+    if not os.path.exists(project.directory):
         return {"nodes": [], "edges": [], "error": "Directory not found"}
-        
-    tables = parse_sql_files(CURRENT_DIRECTORY, dialect=dialect)
-    nodes, edges = build_graph(tables, discovery_mode=discovery)
-    return {"nodes": nodes, "edges": edges}
+    variant = ("-compact" if compact else "") + ("-layout" if layout else "") + ("-analytics" if analytics else "")
+    variant += "-cluster" if cluster else ""
+    timings = Timings()
+
+    if WATCH_MODE and project.is_current(dialect, discovery, subfolders):
+        # The watcher keeps the in-memory graph up to date, no need to touch the disk
+        etag = encoded_etag(request, f'"watch-{SERVER_INSTANCE}-{project.version}{variant}"')
+        if etag_matches(request, etag) and not include_timings:
+            return not_modified(etag)
+        nodes, edges, view = project.current_graph()
+        stats = {"files": len(project.file_records), "watching": True}
+    else:
+        try:
+            with timings.phase("fingerprint"):
+                fingerprint = await run_in_threadpool(project.compute_fingerprint, dialect, discovery, subfolders)
+        except OSError:
+            fingerprint = None # A file vanished mid-walk; serve a fresh build without ETag
+        METRICS.add_phase("fingerprint", timings.phases["fingerprint"])
+        # Payloads carry project.version, which restarts with the process
+        etag = encoded_etag(request, f'"{SERVER_INSTANCE}-{fingerprint}{variant}"') if fingerprint else None
+        if etag and etag_matches(request, etag) and not include_timings:
+            return not_modified(etag)
+
+        try:
+            ((nodes, edges, view), stats, build_timings), shared = await run_build(request, project, dialect, discovery,
+                                                                            subfolders, workers, fingerprint)
+        except (ClientDisconnected, ParseCancelled):
+            return Response(status_code=499) # Client Closed Request; nobody reads it
+        if shared:
+            stats = {**stats, "shared": True}
+        else:
+            for name, seconds in build_timings.phases.items():
+                timings.add(name, seconds)
+            timings.files.update(build_timings.files)
+
+    def finish():
+        # Derived views come from the graph this request got, even if a concurrent build
+        # with other options has replaced the project's graph since
+        positions, graph_analytics, clustered = project.graph_view(
+            nodes, edges, layout=layout, analytics=analytics, cluster=cluster, timings=timings)
+        graph_nodes, graph_edges = nodes, edges
+        if cluster:
+            graph_nodes, graph_edges = clustered.nodes, clustered.edges
+        compacted = graph_nodes
+        if compact:
+            with timings.phase("compact"):
+                compacted = compact_nodes(graph_nodes)
+        if analytics:
+            compacted = with_analytics(compacted, graph_analytics["nodes"])
+        payload = {"nodes": compacted, "edges": graph_edges, "stats": stats, "version": view["version"],
+                   "ambiguities": view["ambiguities"], "degraded": view["degraded"],
+                   "project": project.project_id}
+        if layout:
+            payload["layout"] = clustered.layout(positions) if cluster else positions
+        return payload
+
+    payload = await run_in_threadpool(finish)
+    if include_timings:
+        # Serialisation happens while streaming, after this block is written; see /metrics
+        payload["timings"] = timings.as_dict()
+        etag = None
+    chunks = timed_iter(iter_json(payload), lambda seconds: METRICS.add_phase("serialise", seconds))
+    return json_stream_response(request, chunks, etag=etag)
+
+@app.get("/graph")
+async def get_graph(request: Request, dialect: str = "bigquery", discovery: bool = False, workers: int = None,
+                    compact: bool = False, timings: bool = False, layout: bool = False, analytics: bool = False,
+                    cluster: bool = False, project: str = None):
+    """Parses SQL files in the current directory (or a registered project) and returns graph data."""
+    return await graph_response(request, dialect, discovery, workers=workers, compact=compact,
+                                include_timings=timings, layout=layout, analytics=analytics, cluster=cluster,
+                                project_id=project)
+
+@app.get("/node/sql")
+def get_node_sql(request: Request, id: str, project: str = None, dialect: str = None):
+    """
+    Returns the SQL content and CTE bodies of one node. Nodes outside the last built
+    graph (or before any build) are read from their file, parsed with `dialect`.
+    Supports conditional requests: the ETag is a hash of the returned bodies.
+    """
+    details = get_project(project).node_details(id, dialect)
+    if details is None:
+        raise HTTPException(status_code=404, detail="Node not found")
+
+    body = {"id": id, "content": details.get("content", ""), "ctes": details.get("ctes", {})}
+    payload = json.dumps(body)
+    etag = '"' + hashlib.sha1(payload.encode("utf-8")).hexdigest() + '"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"} # Cacheable, but always revalidated
+
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=payload, media_type="application/json", headers=headers)
+
+@app.get("/node/lineage")
+def get_node_lineage(id: str, project: str = None):
+    """
+    Column-level lineage of one node of the last built graph: for every output column,
+    the upstream table columns it is derived from. Computed on first request and cached.
+    """
+    lineage = get_project(project).column_lineage(id)
+    if lineage is None:
+        raise HTTPException(status_code=404, detail="Node not found, refresh the graph")
+    return lineage
+
+@app.get("/graph/subgraph")
+async def get_subgraph(request: Request, id: str, direction: str = "both", depth: int = None,
+                       include_virtual: bool = True, dialect: str = "bigquery", discovery: bool = False,
+                       compact: bool = False, project: str = None):
+    """
+    Returns only the upstream and/or downstream lineage of one node, optionally limited to
+    `depth` hops and without ghost/CTE nodes. Served from the last built graph (full or
+    filtered); a graph is built first if there is none for this dialect/discovery mode.
+    """
+    if direction not in DIRECTIONS:
+        raise HTTPException(status_code=400, detail=f"direction must be one of: {', '.join(DIRECTIONS)}")
+    if depth is not None and depth < 0:
+        raise HTTPException(status_code=400, detail="depth must be >= 0")
+
+    project = await run_in_threadpool(get_project, project)
+    if not await ensure_built(request, project, dialect, discovery):
+        return Response(status_code=499)
+
+    # Results only change with the graph, so the graph version identifies them
+    version = project.version
+    etag = encoded_etag(request, f'"subgraph-{SERVER_INSTANCE}-{version}{"-compact" if compact else ""}"')
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    result = await run_in_threadpool(project.subgraph, id, direction, depth, include_virtual)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Node not found, refresh the graph")
+
+    nodes, edges = result
+    if compact:
+        nodes = compact_nodes(nodes)
+    payload = {"nodes": nodes, "edges": edges, "root": id, "direction": direction, "depth": depth,
+               "version": version}
+    return json_stream_response(request, iter_json(payload), etag=etag)
+
+@app.get("/graph/cluster")
+async def expand_cluster(request: Request, id: str, dialect: str = "bigquery", discovery: bool = True,
+                         compact: bool = False, layout: bool = False, project: str = None):
+    """
+    Returns the member nodes of one cluster node of a clustered graph (see /graph?cluster=true)
+    with their edges, which replace the cluster node and its edges on the canvas. Served
+    from the last built graph; a graph is built first if there is none for this
+    dialect/discovery mode.
+    """
+    if not is_cluster(id):
+        raise HTTPException(status_code=400, detail="id must be the id of a cluster node")
+    project = await run_in_threadpool(get_project, project)
+    if not await ensure_built(request, project, dialect, discovery):
+        return Response(status_code=499)
+
+    version = project.version
+    variant = ("-compact" if compact else "") + ("-layout" if layout else "")
+    etag = encoded_etag(request, f'"cluster-{SERVER_INSTANCE}-{version}{variant}"')
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    result = await run_in_threadpool(lambda: project.clustered().expand(id))
+    if result is None:
+        raise HTTPException(status_code=404, detail="Cluster not found, refresh the graph")
+    nodes, edges = result
+    payload = {"cluster": id, "nodes": compact_nodes(nodes) if compact else nodes, "edges": edges,
+               "version": version}
+    if layout:
+        positions = await run_in_threadpool(project.layout)
+        payload["layout"] = {node["id"]: positions[node["id"]] for node in nodes if node["id"] in positions}
+    return json_stream_response(request, iter_json(payload), etag=etag)
+
+@app.get("/graph/analytics")
+async def get_graph_analytics(request: Request, dialect: str = "bigquery", discovery: bool = False,
+                              limit: int = Query(10, ge=1, le=HOTSPOTS), nodes: bool = False,
+                              project: str = None):
+    """
+    Returns whole-graph analytics: summary, longest dependency chain (critical path),
+    fan-in / fan-out / blast radius hotspots (top `limit`), cycles and orphan nodes; with
+    nodes=true also the per-node metrics. Computed once per graph from the last built
+    graph (a graph is built first if there is none for this dialect/discovery mode).
+    """
+    project = await run_in_threadpool(get_project, project)
+    if not await ensure_built(request, project, dialect, discovery):
+        return Response(status_code=499)
+
+    version = project.version
+    etag = encoded_etag(request, f'"analytics-{SERVER_INSTANCE}-{version}-{limit}{"-nodes" if nodes else ""}"')
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    result = await run_in_threadpool(project.analytics)
+    payload = {
+        "summary": result["summary"],
+        "longestChain": result["longestChain"],
+        "hotspots": {name: ranking[:limit] for name, ranking in result["hotspots"].items()},
+        "cycles": result["cycles"],
+        "orphans": result["orphans"],
+        "version": version,
+    }
+    if nodes:
+        payload["nodes"] = result["nodes"]
+    return json_stream_response(request, iter_json(payload), etag=etag)
+
+@app.get("/search")
+async def search_graph(request: Request, q: str, offset: int = Query(0, ge=0),
+                       limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT), dialect: str = "bigquery",
+                       discovery: bool = False, project: str = None):
+    """
+    Searches table names, CTE names, file names and SQL content of the last built graph
+    (a graph is built first if there is none for this dialect/discovery mode). Every term
+    must match a whole identifier or, from 3 characters, part of one; results are ranked,
+    paginated with offset/limit and carry a SQL snippet with highlight offsets.
+    """
+    project = await run_in_threadpool(get_project, project)
+    if not await ensure_built(request, project, dialect, discovery):
+        return Response(status_code=499)
+
+    result = await run_in_threadpool(project.search, q, offset, limit)
+    return {"query": q, "offset": offset, "limit": limit, "version": project.version, **result}
+
+@app.get("/graph/progressive")
+async def get_progressive_graph(request: Request, dialect: str = "bigquery", discovery: bool = False,
+                                subfolders: List[str] = Query(None), layout: bool = False, project: str = None):
+    """
+    Server-Sent Events stream of a two-phase build: a `skeleton` graph from cached parse
+    results and a regex scan of the other files, then `refine` deltas as those files are
+    fully parsed, then `done`. Lets the UI paint before a long parse completes.
+    """
+    state = await run_in_threadpool(get_project, project)
+    if not os.path.exists(state.directory):
+        raise HTTPException(status_code=404, detail="Directory not found")
+    try:
+        fingerprint = await run_in_threadpool(state.compute_fingerprint, dialect, discovery, subfolders)
+    except OSError:
+        fingerprint = None
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+    fallback = build_job(state, dialect, discovery, subfolders, PARSE_WORKERS, fingerprint)
+
+    def build(cancelled):
+        progressive = state.build_progressive(dialect=dialect, discovery=discovery, subfolders=subfolders,
+                                              workers=PARSE_WORKERS, layout=layout, cancelled=cancelled,
+                                              fingerprint=fingerprint)
+        while True:
+            try:
+                event = next(progressive)
+            except StopIteration as stop:
+                if stop.value is not None:
+                    return stop.value
+                break
+            loop.call_soon_threadsafe(events.put_nowait, event)
+        if cancelled.is_set():
+            raise ParseCancelled()
+        return fallback(cancelled) # Superseded by another build: finish like /graph would
+
+    # Runs in BUILDS like /graph: single-flight per fingerprint, bounded, cancelled once nobody listens
+    job, _ = start_build(state, fingerprint, build)
+
+    async def stream():
+        # Events only come from a build this request started; one it joined (or that was
+        # superseded) ends with its whole graph as the skeleton
+        result = asyncio.ensure_future(BUILDS.wait(job, request.is_disconnected))
+        finished = False
+        try:
+            while True:
+                event = asyncio.ensure_future(events.get())
+                await asyncio.wait({event, result}, return_when=asyncio.FIRST_COMPLETED)
+                if not event.done():
+                    event.cancel()
+                    break
+                name, payload = event.result()
+                finished = name == "done"
+                yield f"event: {name}\ndata: {json.dumps(payload)}\n\n"
+            while not events.empty():
+                name, payload = events.get_nowait()
+                finished = name == "done"
+                yield f"event: {name}\ndata: {json.dumps(payload)}\n\n"
+            if finished or result.exception() is not None:
+                return
+            (nodes, edges, view), stats, build_timings = result.result()
+            skeleton = {"nodes": compact_nodes(nodes), "edges": edges, "version": view["version"],
+                        "stats": {"files": stats.get("files"), "pending": 0, "shared": True}}
+            if layout:
+                skeleton["layout"], _, _ = await run_in_threadpool(state.graph_view, nodes, edges, layout=True)
+            yield f"event: skeleton\ndata: {json.dumps(skeleton)}\n\n"
+            done = {**view, "timings": build_timings.as_dict()}
+            yield f"event: done\ndata: {json.dumps(done)}\n\n"
+        finally:
+            result.cancel() # Stops parsing at the next file if the client went away
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/graph/diff")
+def get_graph_diff(base: str, head: str = None, dialect: str = "bigquery", discovery: bool = False,
+                   project: str = None):
+    """
+    Lineage diff between two revisions of a project: `base` and `head` are git refs of the
+    project's repository or directories inside a registered project (any other path is
+    taken as a git ref); `head` defaults to the project directory itself.
+    Returns changed files, added/removed/modified nodes and edges, and the downstream
+    nodes impacted by the change. Only files that differ are parsed per revision.
+    """
+    state = get_project(project)
+    try:
+        roots = REGISTRY.directories()
+        base_revision = open_revision(base, state.directory, allowed_roots=roots)
+        head_revision = open_revision(head, state.directory, allowed_roots=roots)
+        return diff_lineage(base_revision, head_revision, dialect=dialect, discovery=discovery,
+                            cache=state.cache, workers=PARSE_WORKERS, timeout=PARSE_TIMEOUT)
+    except DiffError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/graph/events")
+async def graph_events(request: Request, project: str = None):
+    """
+    Server-Sent Events stream of graph deltas produced by watch mode, for one project
+    (default: the current one, following /config/path changes).
+    """
+    if project is not None and REGISTRY.directory(project) is None:
+        raise HTTPException(status_code=404, detail=f"Unknown project '{project}', see /projects")
+    events = REGISTRY.events
+    subscriber = events.subscribe()
+    _, queue = subscriber
+
+    async def stream():
+        try:
+            yield f"event: hello\ndata: {json.dumps({'watching': WATCH_MODE})}\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n" # Keeps proxies from closing idle connections
+                    continue
+                if event.get("project") != (project or REGISTRY.register(CURRENT_DIRECTORY)):
+                    continue
+                yield f"event: {event.get('type', 'message')}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            events.unsubscribe(subscriber)
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @app.post("/config/path")
 def set_path(path_data: dict = Body(...)):
-    """Updates the directory to scan."""
+    """Updates the directory to scan, registering it as a project."""
     global CURRENT_DIRECTORY
     path = path_data.get("path")
     # Basic validation
@@ -52,54 +519,96 @@ def set_path(path_data: dict = Body(...)):
         raise HTTPException(status_code=400, detail="Directory does not exist")
     
     
-    CURRENT_DIRECTORY = path
-    return {"message": "Path updated", "path": CURRENT_DIRECTORY}
+    CURRENT_DIRECTORY = os.path.abspath(path)
+    return {"message": "Path updated", "path": CURRENT_DIRECTORY, "project": REGISTRY.register(CURRENT_DIRECTORY)}
 
 @app.post("/scan/folders")
 def scan_folders(path_data: dict = Body(...)):
-    """Scans a directory and returns all subfolders (recursive, relative paths)."""
+    """
+    Returns all subfolders of a directory (recursive, relative paths), skipping ignored
+    ones (see scanner.DEFAULT_IGNORES, .gitignore and .sqldagflowignore). The listing is
+    cached and shared with graph builds, so re-opening the picker only stats folders.
+    """
     path = path_data.get("path")
     if not path or not os.path.exists(path):
          raise HTTPException(status_code=400, detail="Directory does not exist")
     
     try:
-        subfolders = []
-        # Walk the directory tree
-        for root, dirs, files in os.walk(path):
-            # Skip hidden folders
-            dirs[:] = [d for d in dirs if not d.startswith('.')]
-            
-            for d in dirs:
-                # Create relative path from the root path
-                full_path = os.path.join(root, d)
-                rel_path = os.path.relpath(full_path, path)
-                # Normalize separators to forward slashes for consistency
-                rel_path = rel_path.replace(os.sep, '/')
-                subfolders.append(rel_path)
-                
-        # Sort for better UX
-        subfolders.sort()
-        return {"folders": subfolders}
+        return {"folders": list_folders(path)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/graph/filtered")
-def get_filtered_graph(data: dict = Body(...)):
+async def get_filtered_graph(request: Request, data: dict = Body(...)):
     """Parses SQL files with subfolder filtering."""
-    if not os.path.exists(CURRENT_DIRECTORY):
-        return {"nodes": [], "edges": [], "error": "Directory not found"}
-    
     subfolders = data.get("subfolders") # List of strings or None
     dialect = data.get("dialect", "bigquery")
     discovery = data.get("discovery", False)
+    workers = data.get("workers")
+    compact = data.get("compact", False)
+    include_timings = data.get("timings", False)
+    layout = data.get("layout", False)
+    analytics = data.get("analytics", False)
+    cluster = data.get("cluster", False)
+    project = data.get("project")
     
-    tables = parse_sql_files(CURRENT_DIRECTORY, allowed_subfolders=subfolders, dialect=dialect)
-    nodes, edges = build_graph(tables, discovery_mode=discovery)
-    return {"nodes": nodes, "edges": edges}
+    return await graph_response(request, dialect, discovery, subfolders=subfolders, workers=workers,
+                                compact=compact, include_timings=include_timings, layout=layout,
+                                analytics=analytics, cluster=cluster, project_id=project)
 
 @app.get("/config/path")
 def get_path():
-    return {"path": CURRENT_DIRECTORY}
+    return {"path": CURRENT_DIRECTORY, "project": REGISTRY.register(CURRENT_DIRECTORY)}
+
+@app.get("/projects")
+def list_projects():
+    """Registered project roots, most recently used first, and the current one."""
+    return {"projects": REGISTRY.projects(), "current": REGISTRY.register(CURRENT_DIRECTORY)}
+
+@app.post("/projects")
+def add_project(path_data: dict = Body(...)):
+    """Registers a project root without switching to it; returns its id."""
+    path = path_data.get("path")
+    if not path or not os.path.isdir(path):
+        raise HTTPException(status_code=400, detail="Directory does not exist")
+    return {"id": REGISTRY.register(path), "path": os.path.abspath(path)}
+
+@app.delete("/projects/{project_id}")
+def remove_project(project_id: str):
+    """Forgets a project: its in-memory graph, watcher and on-disk snapshot."""
+    if not REGISTRY.unregister(project_id):
+        raise HTTPException(status_code=404, detail=f"Unknown project '{project_id}'")
+    return {"message": "Project removed"}
+
+@app.get("/metrics")
+def get_metrics():
+    """Cumulative graph build timings and counters in the Prometheus text format."""
+    METRICS.set_gauge("pending_builds", BUILDS.pending())
+    METRICS.set_gauge("active_projects", sum(1 for p in REGISTRY.projects() if p["active"]))
+    return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/metrics/slowest")
+def get_slowest_files(limit: int = SLOWEST_FILES):
+    """Files with the longest last parse time since the server started."""
+    return {"files": [{"path": path, "ms": round(seconds * 1000, 3)}
+                      for path, seconds in METRICS.slowest_files(limit)]}
+
+def project_cache(project_id):
+    cache = REGISTRY.cache(project_id or REGISTRY.register(CURRENT_DIRECTORY))
+    if cache is None:
+        raise HTTPException(status_code=404, detail=f"Unknown project '{project_id}', see /projects")
+    return cache
+
+@app.get("/cache/stats")
+def get_cache_stats(project: str = None):
+    """Returns the cumulative hit/miss counters of a project's parse cache."""
+    return project_cache(project).stats()
+
+@app.delete("/cache")
+def clear_cache(project: str = None):
+    """Drops every cached parse result of a project, forcing a full re-parse on the next refresh."""
+    project_cache(project).clear()
+    return {"message": "Cache cleared"}
 
 class SaveRequest(BaseModel):
     nodes: list
@@ -118,6 +627,12 @@ def save_graph(request: SaveRequest):
         
         filepath = os.path.join(path, request.filename)
         
+        if is_ndjson(request.filename):
+            # Streaming format (.ndjson / .ndjson.gz), written record by record
+            write_diagram(filepath, request.nodes, request.edges, viewport=request.viewport,
+                          metadata=request.metadata)
+            return {"message": f"Graph saved successfully to {filepath}"}
+
         data = {
             "nodes": request.nodes,
             "edges": request.edges,
@@ -131,7 +646,12 @@ def save_graph(request: SaveRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/load")
-def load_graph(path: str = ".", filename: str = "sql_diagram.json"):
+def load_graph(request: Request, path: str = ".", filename: str = "sql_diagram.json", positions_only: bool = False):
+    """
+    Loads a saved diagram. Streaming files (.ndjson / .ndjson.gz) are streamed back
+    without being decoded; with positions_only=True nodes only carry `id` and `position`
+    (no SQL bodies) and edges are left out, e.g. to restore a layout onto a fresh graph.
+    """
     try:
         if not os.path.isabs(path):
              path = os.path.abspath(path)
@@ -141,9 +661,9 @@ def load_graph(path: str = ".", filename: str = "sql_diagram.json"):
         if not os.path.exists(filepath):
             return {"nodes": [], "edges": [], "viewport": {"x": 0, "y": 0, "zoom": 1}, "metadata": {}}
         
-        with open(filepath, "r") as f:
-            data = json.load(f)
-        return data
+        if is_ndjson(filename):
+            return json_stream_response(request, iter_diagram_json(filepath, positions_only=positions_only))
+        return read_diagram(filepath, positions_only=positions_only)
     except Exception as e:
         print(f"Error loading graph: {e}")
         return {"nodes": [], "edges": [], "viewport": {"x": 0, "y": 0, "zoom": 1}, "metadata": {}}
@@ -157,7 +677,7 @@ def list_config_files(path: str = "."):
         if not os.path.exists(path):
             return {"files": []}
 
-        files = [f for f in os.listdir(path) if f.endswith(".json") and os.path.isfile(os.path.join(path, f))]
+        files = [f for f in os.listdir(path) if f.lower().endswith(DIAGRAM_EXTENSIONS) and os.path.isfile(os.path.join(path, f))]
         return {"files": files}
     except Exception as e:
         print(f"Error listing config files: {e}")
@@ -166,6 +686,7 @@ def list_config_files(path: str = "."):
 class CreateFileRequest(BaseModel):
     path: str
     content: str
+    project: str = None # Registered project id, default: the current directory
 
 @app.post("/files/create")
 def create_file(request: CreateFileRequest):
@@ -175,7 +696,12 @@ def create_file(request: CreateFileRequest):
         if ".." in request.path:
              raise HTTPException(status_code=400, detail="Invalid path")
 
-        full_path = os.path.join(CURRENT_DIRECTORY, request.path)
+        root = CURRENT_DIRECTORY
+        if request.project is not None:
+            root = REGISTRY.directory(request.project)
+            if root is None:
+                raise HTTPException(status_code=404, detail=f"Unknown project '{request.project}'")
+        full_path = os.path.join(root, request.path)
         
         # Create directories if they don't exist
         os.makedirs(os.path.dirname(full_path), exist_ok=True)
@@ -211,31 +737,47 @@ if os.path.exists(STATIC_DIR):
         response.headers["Expires"] = "0"
         return response
 
-def start():
-    """Entry point for the CLI tool."""
-    global CURRENT_DIRECTORY
-    
-    # CLI Argument Parsing
-    if len(sys.argv) > 1:
-        path_arg = sys.argv[1]
-        if os.path.exists(path_arg):
-            CURRENT_DIRECTORY = os.path.abspath(path_arg)
+def serve(path=None, workers=1, watch=False, watch_interval=1.0, open_browser=True,
+          parse_timeout=DEFAULT_PARSE_TIMEOUT):
+    """Starts the web server on http://localhost:8000 for the given project directory."""
+    global CURRENT_DIRECTORY, PARSE_WORKERS, PARSE_TIMEOUT, WATCH_MODE, WATCH_INTERVAL
+
+    PARSE_WORKERS = workers
+    PARSE_TIMEOUT = parse_timeout
+    WATCH_MODE = watch
+    WATCH_INTERVAL = watch_interval
+    REGISTRY.parse_timeout = parse_timeout
+    REGISTRY.watch = watch
+    REGISTRY.watch_interval = watch_interval
+
+    if path:
+        if os.path.exists(path):
+            CURRENT_DIRECTORY = os.path.abspath(path)
             print(f"Setting project path from CLI: {CURRENT_DIRECTORY}")
         else:
-            print(f"Warning: Path '{path_arg}' does not exist. Using defaults.")
+            print(f"Warning: Path '{path}' does not exist. Using defaults.")
     else:
         CURRENT_DIRECTORY = os.getcwd()
         print(f"Using current directory: {CURRENT_DIRECTORY}")
 
-    def open_browser():
+    def launch_browser():
         time.sleep(1.5)
         webbrowser.open("http://localhost:8000")
 
-    threading.Thread(target=open_browser, daemon=True).start()
+    if open_browser:
+        threading.Thread(target=launch_browser, daemon=True).start()
     
     # Run uvicorn programmatically
     # Note: When running programmatically, reload=True is not supported easily without other hacks
-    uvicorn.run(app, host="127.0.0.1", port=8000)
+    try:
+        uvicorn.run(app, host="127.0.0.1", port=8000)
+    finally:
+        REGISTRY.stop()
+
+def start():
+    """Entry point for the CLI tool (kept for compatibility, see cli.main)."""
+    from .cli import main as cli_main
+    cli_main()
 
 if __name__ == "__main__":
     start()
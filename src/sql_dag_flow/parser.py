@@ -1,401 +1,766 @@
 import os
 import sqlglot
 from sqlglot import exp
-import networkx as nx
-
-import os
-import sqlglot
-from sqlglot import exp
-import networkx as nx
 import re
+import time
+from .resolver import TableResolver
+from .timings import phase
+from .scanner import iter_sql_files
+from .graph_core import GraphCore, EDGE_TABLE, EDGE_CTE, EDGE_EXTERNAL
+
+
+# CREATE kinds whose target becomes a node of the graph (skips SCHEMA, FUNCTION, INDEX...)
+_TARGET_CREATE_KINDS = ("TABLE", "VIEW")
+
+
+def _target_table(node):
+    """The table written by a CREATE/INSERT/MERGE expression, or None."""
+    if isinstance(node, exp.Create):
+        if node.kind not in _TARGET_CREATE_KINDS:
+            return None
+    elif not isinstance(node, (exp.Insert, exp.Merge)):
+        return None
+
+    # sqlglot represents the target as an exp.Table or, with a column list, an exp.Schema
+    target = node.this
+    if isinstance(target, exp.Schema):
+        target = target.this
+    return target if isinstance(target, exp.Table) else None
+
 
-def parse_sql_files(directory, allowed_subfolders=None, dialect="bigquery"):
+def _qualified_name(table):
+    """project.dataset.table, dataset.table or table depending on what is specified."""
+    name = table.name
+    if table.db:
+        name = f"{table.db}.{name}"
+        if table.catalog:
+            name = f"{table.catalog}.{name}"
+    return name
+
+
+def _scan_statement(statement):
     """
-    Recursively scans a directory for .sql files and parses them.
-    Returns a dictionary mapping table names to their dependencies and metadata.
+    Collects everything lineage needs from a statement in a single traversal.
+    Returns (targets, ctes, tables): the tables written as (exp.Table, node_type, created)
+    tuples, the CTE expressions and the referenced exp.Table nodes (targets excluded).
     """
-    tables = {}
-    
-    for root, dirs, files in os.walk(directory):
-        # Filter subfolders if allowed_subfolders is specified
-        if allowed_subfolders is not None:
-             # allowed_subfolders contains relative paths like "sub1", "sub1/nested"
-             # We must prune 'dirs' so we only traverse relevant paths.
-             
-             rel_root = os.path.relpath(root, directory).replace(os.sep, '/')
-             if rel_root == ".": rel_root = ""
-             
-             allowed_dirs = []
-             for d in dirs:
-                 rel_d = f"{rel_root}/{d}" if rel_root else d
-                 # Keep 'd' if:
-                 # 1. rel_d is exactly one of the allowed paths
-                 # 2. rel_d is a parent of an allowed path (e.g. 'sub1' parent of 'sub1/nested')
-                 # 3. rel_d is inside an allowed path (e.g. 'sub1/nested' inside 'sub1' which is allowed)
-                 
-                 is_allowed = False
-                 for allowed in allowed_subfolders:
-                     if rel_d == allowed:
-                         is_allowed = True
-                         break
-                     if allowed.startswith(rel_d + '/'): # rel_d is parent
-                         is_allowed = True
-                         break
-                     if rel_d.startswith(allowed + '/'): # rel_d is child
-                         is_allowed = True
-                         break
-                 
-                 if is_allowed:
-                     allowed_dirs.append(d)
-             
-             dirs[:] = allowed_dirs
-
-        # Check if the current directory is valid for file parsing
-        # We only parse files if we are IN a selected folder or a SUBFOLDER of a selected folder.
-        # We do NOT parse files if we are just traversing a PARENT folder to get to a selected one.
-        should_parse_files = True
-        if allowed_subfolders is not None:
-            should_parse_files = False
-            rel_root_check = os.path.relpath(root, directory).replace(os.sep, '/')
-            if rel_root_check == ".": rel_root_check = ""
-            
-            # 1. Decide if we should parse files in THIS folder
-            if rel_root_check in allowed_subfolders:
-                should_parse_files = True
-            
-            # 2. Prune 'dirs' to only traverse towards allowed folders
-            allowed_dirs = []
-            for d in dirs:
-                rel_d = f"{rel_root_check}/{d}" if rel_root_check else d
-                
-                # Keep 'd' if:
-                # A. It is explicitly in the allowed list (so we can go there and parse)
-                # B. It is an ANCESTOR of something in the allowed list (so we can reach the allowed child)
-                
-                is_traversal_allowed = False
-                if rel_d in allowed_subfolders:
-                    is_traversal_allowed = True
-                else:
-                    # Check if it's an ancestor
-                    for allowed in allowed_subfolders:
-                        if allowed.startswith(rel_d + '/'):
-                            is_traversal_allowed = True
-                            break
-                            
-                if is_traversal_allowed:
-                    allowed_dirs.append(d)
-            
-            dirs[:] = allowed_dirs
-        
-        if not should_parse_files:
+    targets = []
+    ctes = []
+    tables = []
+    for node in statement.walk():
+        if isinstance(node, exp.Table):
+            tables.append(node)
+        elif isinstance(node, exp.CTE):
+            ctes.append(node)
+        elif isinstance(node, (exp.Create, exp.Insert, exp.Merge)):
+            target = _target_table(node)
+            if target is not None:
+                is_create = isinstance(node, exp.Create)
+                node_type = "view" if is_create and node.kind == "VIEW" else "table"
+                targets.append((target, node_type, is_create))
+
+    # Walk order is breadth-first so targets may be seen after their Table node; filter at the end
+    target_ids = {id(target) for target, _, _ in targets}
+    tables = [table for table in tables if id(table) not in target_ids]
+    return targets, ctes, tables
+
+
+def _detect_layer(filepath):
+    """Layer detection based on folder structure first, then filename."""
+    lower_path = filepath.lower()
+    if "bronze" in lower_path or "bronce" in lower_path:
+        return "bronze"
+    if "silver" in lower_path:
+        return "silver"
+    if "gold" in lower_path:
+        return "gold"
+    return "other"
+
+
+def _group_statements(scanned, filename_base):
+    """
+    Groups the (targets, refs) of every statement of a file by written table.
+    Returns node dicts for _build_records, in order of appearance.
+    """
+    script_refs = [] # References from statements that don't write a table (DECLARE, SELECT...)
+    targets = {} # qualified name -> {"table", "type", "refs"}, in order of appearance
+
+    for stmt_targets, refs in scanned:
+        if not stmt_targets:
+            script_refs.extend(refs)
             continue
 
-        for file in files:
-            if file.endswith(".sql"):
-                filepath = os.path.join(root, file)
-                # Heuristic for table name: filename without extension
-                filename_base = os.path.splitext(file)[0]
-                
-                # Layer detection based on folder structure first, then filename
-                lower_path = filepath.lower()
-                layer = "other"
-                if "bronze" in lower_path or "bronce" in lower_path:
-                    layer = "bronze"
-                elif "silver" in lower_path:
-                    layer = "silver"
-                elif "gold" in lower_path:
-                    layer = "gold"
-                
-                with open(filepath, "r", encoding="utf-8") as f:
-                    sql_content = f.read()
-                
+        for table, node_type, is_create in stmt_targets:
+            target = targets.setdefault(_qualified_name(table),
+                                        {"table": table, "type": node_type, "refs": []})
+            if is_create:
+                # CREATE decides the node type even if an INSERT into it came first
+                target["type"] = node_type
+        # References of the statement feed the table it writes
+        targets[_qualified_name(stmt_targets[0][0])]["refs"].extend(refs)
+
+    nodes = []
+    for target in targets.values():
+        nodes.append({
+            "label": target["table"].name,
+            "project": target["table"].catalog or "default",
+            "dataset": target["table"].db or "default",
+            "type": target["type"],
+            "refs": target["refs"] + script_refs,
+        })
+    if not nodes:
+        # No CREATE/INSERT/MERGE: this might just be a SELECT, treat the filename as the target
+        nodes.append({"label": filename_base, "project": "default", "dataset": "default",
+                      "type": "table", "refs": script_refs})
+    return nodes
+
+
+def _build_records(filepath, sql_content, nodes, defined_ctes):
+    """
+    Turns the tables written by a file into graph records.
+    `nodes` are dicts with label, project, dataset, type and refs (exp.Table references).
+    """
+    filename_base = os.path.splitext(os.path.basename(filepath))[0]
+    layer = _detect_layer(filepath)
+
+    for node in nodes:
+        # Fallback: Extract from filename (project.dataset.table.sql)
+        if len(nodes) == 1 and node["project"] == "default" and node["dataset"] == "default":
+            parts = filename_base.split('.')
+            if len(parts) == 3:
+                node["project"], node["dataset"], node["label"] = parts
+            elif len(parts) == 2:
+                node["dataset"], node["label"] = parts
+
+        # Fallback: capture parent folder as dataset if it's not the layer name
+        # e.g. /project/dataset/table.sql
+        if node["project"] == "default" and node["dataset"] == "default":
+            path_parts = os.path.normpath(filepath).split(os.sep)
+            parent_dir = path_parts[-2] if len(path_parts) > 1 else ""
+            if parent_dir.lower() not in ["bronze", "bronce", "silver", "gold", "other"]:
+                node["dataset"] = parent_dir
+
+    # The node named like the file (or the first one) keeps the filename as id,
+    # other tables written by the same script get a file-scoped id
+    primary = next((n for n in nodes if n["label"] == filename_base), nodes[0])
+
+    records = {}
+    for node in nodes:
+        target_table_name = node["label"]
+        # Ordered set (dict keys) so results are identical across processes
+        dependencies = {}
+        for table in node["refs"]:
+            dep_name = table.name
+
+            # Avoid self-reference if it matches the target
+            if dep_name == target_table_name:
+                continue
+
+            # Internal CTE references
+            if dep_name in defined_ctes:
+                # Add strictly as a CTE dependency so we can visualize it if desired
+                dependencies[f"cte:{filename_base}:{dep_name}"] = None
+                continue
+
+            # Construct full name if available to match lookup
+            # (fuzzy matches are handled in build_graph)
+            dependencies[_qualified_name(table)] = None
+
+        if node is primary:
+            node_id = filename_base
+        else:
+            qualified = f"{node['dataset']}.{target_table_name}" if node["dataset"] != "default" else target_table_name
+            node_id = f"{filename_base}:{qualified}"
+
+        records[node_id] = {
+            # Use filename_base as unique ID for the graph to avoid ambiguity
+            # Visual label can be the actual table name
+            "id": node_id,
+            "label": target_table_name,
+            "layer": layer,
+            "type": node["type"],
+            "project": node["project"],
+            "dataset": node["dataset"],
+            "path": filepath,
+            "dependencies": list(dependencies),
+            "content": sql_content,
+            "ctes": defined_ctes
+        }
+
+    return records
+
+
+def parse_sql_file(filepath, dialect="bigquery", sql_content=None, durations=None):
+    """
+    Parses a single .sql file and extracts its table records.
+    Returns a dictionary mapping table ids to their metadata.
+
+    Files may contain several statements (DECLARE, CREATE, INSERT, MERGE...). Every
+    distinct table written by the script becomes its own node; a file that writes
+    nothing (e.g. a plain SELECT) becomes a single node named after the file.
+    If a `durations` dict is given, the seconds spent in sqlglot ("sqlglot") and in
+    extracting the records ("extract") are stored in it.
+    """
+    # Heuristic for table name: filename without extension
+    filename_base = os.path.splitext(os.path.basename(filepath))[0]
+    layer = _detect_layer(filepath)
+
+    if sql_content is None:
+        with open(filepath, "r", encoding="utf-8") as f:
+            sql_content = f.read()
+
+    started = time.perf_counter()
+    parsed_at = None
+    try:
+        # Parse with the chosen dialect to support CREATE OR REPLACE TABLE/VIEW, scripting, etc.
+        statements = [s for s in sqlglot.parse(sql_content, read=dialect) if s is not None]
+        parsed_at = time.perf_counter()
+
+        defined_ctes = {}
+        scanned = []
+        for statement in statements:
+            stmt_targets, ctes, refs = _scan_statement(statement)
+
+            # Identify CTEs defined in the query to exclude them from dependencies
+            for cte in ctes:
+                if cte.alias_or_name:
+                    # Full "name AS ( ... )" expression for context
+                    defined_ctes[cte.alias_or_name] = cte.sql(dialect=dialect, pretty=True)
+            scanned.append((stmt_targets, refs))
+
+        nodes = _group_statements(scanned, filename_base)
+        records = _build_records(filepath, sql_content, nodes, defined_ctes)
+    except Exception as e:
+        print(f"Error parsing {filepath}: {e}")
+        records = {filename_base: {
+            "id": filename_base,
+            "label": filename_base,
+            "layer": layer,
+            "type": "unknown",
+            "project": "n/a",
+            "dataset": "n/a",
+            "path": filepath,
+            "dependencies": [],
+            "error": str(e),
+            "content": sql_content
+        }}
+
+    if durations is not None:
+        finished = time.perf_counter()
+        durations["sqlglot"] = (parsed_at or finished) - started
+        durations["extract"] = finished - parsed_at if parsed_at else 0.0
+    return records
+
+
+# Files larger than this are not given to sqlglot at all (see fast_parse_sql_file). sqlglot
+# takes about 3.5 s/MB on generated INSERT ... VALUES files, and parses in-process by default
+MAX_PARSE_BYTES = 1024 * 1024
+
+# Default time budget in seconds for parsing one file in an isolated worker (see parse_files).
+# Off: forking the workers costs more than a hung parse risks on most projects; opt in with --parse-timeout
+DEFAULT_PARSE_TIMEOUT = 0
+
+# Longest wait for isolated workers before checking whether the parse was cancelled
+CANCEL_CHECK_INTERVAL = 0.5
+
+
+class ParseCancelled(Exception):
+    """Raised by parse_files when its `cancelled` event is set."""
+
+
+# Fast path patterns. Comments and string literals are blanked out first so that
+# keywords inside them (and huge VALUES lists) cost nothing.
+_NOISE_RE = re.compile(r"--[^\n]*|/\*.*?\*/|'(?:[^'\\]|\\.)*'", re.DOTALL)
+_FROM_FUNCTION_RE = re.compile(r"\b(?:EXTRACT|TRIM|SUBSTRING|POSITION|OVERLAY)\s*\([^()]*\)", re.IGNORECASE)
+_IDENT = r"(?:`[^`]+`|\"[^\"]+\"|\[[^\]]+\]|[A-Za-z_][\w$-]*)"
+_NAME = rf"({_IDENT}(?:\s*\.\s*{_IDENT}){{0,2}})(?![\w$-])(?!\s*\.)"
+_CREATE_RE = re.compile(
+    r"\bCREATE\s+(?:OR\s+REPLACE\s+)?(?:(?:GLOBAL|LOCAL)\s+)?(?:TEMP(?:ORARY)?\s+)?"
+    rf"(?:MATERIALIZED\s+)?(?:EXTERNAL\s+)?(TABLE|VIEW)\s+(?:IF\s+NOT\s+EXISTS\s+)?{_NAME}",
+    re.IGNORECASE)
+_WRITE_RE = re.compile(rf"\b(?:INSERT\s+(?:OVERWRITE\s+)?(?:INTO\s+)?(?:TABLE\s+)?|MERGE\s+(?:INTO\s+)?){_NAME}",
+                       re.IGNORECASE)
+_REF_RE = re.compile(rf"\b(?:FROM|JOIN|USING)\s+{_NAME}(?!\s*\()", re.IGNORECASE) # not UNNEST(...)
+_CTE_RE = re.compile(rf"(?:\bWITH|,)\s*(?:RECURSIVE\s+)?({_IDENT})\s+AS\s*\(", re.IGNORECASE)
+
+
+def _table_from_name(name):
+    """exp.Table for a dotted name as written in SQL, without invoking the parser."""
+    parts = [part.strip().strip('`"[]') for part in re.split(r"\s*\.\s*", name.replace("`", "").strip())]
+    parts = [part for part in parts if part][-3:]
+    parts = [None] * (3 - len(parts)) + parts
+    return exp.table_(parts[2], db=parts[1], catalog=parts[0])
+
+
+def fast_parse_sql_file(filepath, sql_content, reason="size"):
+    """
+    Tokenizer-free fallback for files too big or too slow for sqlglot.
+    Extracts CREATE/INSERT/MERGE targets and FROM/JOIN/USING references with regular
+    expressions, statement by statement, and returns records shaped like those of
+    parse_sql_file, marked with "degraded": reason. CTE bodies are not extracted.
+    """
+    filename_base = os.path.splitext(os.path.basename(filepath))[0]
+    text = _NOISE_RE.sub("''", sql_content)
+    text = _FROM_FUNCTION_RE.sub("", text)
+
+    cte_names = {_table_from_name(m.group(1)).name for m in _CTE_RE.finditer(text)}
+    scanned = []
+    for statement in text.split(";"):
+        stmt_targets = []
+        for match in _CREATE_RE.finditer(statement):
+            node_type = "view" if match.group(1).upper() == "VIEW" else "table"
+            stmt_targets.append((_table_from_name(match.group(2)), node_type, True))
+        for match in _WRITE_RE.finditer(statement):
+            stmt_targets.append((_table_from_name(match.group(1)), "table", False))
+
+        target_names = {_qualified_name(table) for table, _, _ in stmt_targets}
+        refs = []
+        for match in _REF_RE.finditer(statement):
+            table = _table_from_name(match.group(1))
+            if _qualified_name(table) not in target_names:
+                refs.append(table)
+        scanned.append((stmt_targets, refs))
+
+    defined_ctes = {name: f"-- CTE: {name} (body not extracted, {reason})" for name in cte_names}
+    nodes = _group_statements(scanned, filename_base)
+    records = _build_records(filepath, sql_content, nodes, defined_ctes)
+    for record in records.values():
+        record["degraded"] = reason
+    return records
+
+
+def _parse_job(job):
+    """Process pool entry point: (filepath, dialect, sql_content) -> (records, durations)."""
+    filepath, dialect, sql_content = job
+    durations = {}
+    records = parse_sql_file(filepath, dialect=dialect, sql_content=sql_content, durations=durations)
+    return records, durations
+
+
+def _fast_parse_job(filepath, sql_content, reason):
+    """fast_parse_sql_file with the same (records, durations) result as _parse_job."""
+    started = time.perf_counter()
+    records = fast_parse_sql_file(filepath, sql_content, reason=reason)
+    return records, {"fast_path": time.perf_counter() - started}
+
+
+def _parse_parallel(jobs, workers, chunksize=None, cancelled=None):
+    """
+    Parses jobs across a process pool. Results are returned in submission order.
+    Returns None if a pool cannot be used so the caller can fall back to serial parsing.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    from concurrent.futures.process import BrokenProcessPool
+
+    if chunksize is None:
+        # A few chunks per worker keeps every core busy without per-file IPC overhead
+        chunksize = max(1, len(jobs) // (workers * 4))
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = []
+            for result in executor.map(_parse_job, jobs, chunksize=chunksize):
+                if cancelled is not None and cancelled.is_set():
+                    try:
+                        executor.shutdown(wait=False, cancel_futures=True) # Drop the chunks not started yet
+                    except TypeError:
+                        pass # Python < 3.9: queued chunks still run before the pool exits
+                    raise ParseCancelled()
+                results.append(result)
+            return results
+    except (OSError, BrokenProcessPool, NotImplementedError) as e:
+        print(f"Parallel parsing unavailable ({e}), falling back to serial parsing")
+        return None
+
+
+def resolve_workers(workers):
+    """Normalises a worker count: None/1 = serial, 0 or negative = one per CPU core."""
+    if workers is None:
+        return 1
+    workers = int(workers)
+    if workers <= 0:
+        return os.cpu_count() or 1
+    return workers
+
+
+def _isolated_worker(conn):
+    """Worker process loop of _parse_isolated: receives jobs, sends back records."""
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+        conn.send(_parse_job(job))
+
+
+def _parse_isolated(jobs, workers, timeout, cancelled=None):
+    """
+    Parses jobs in dedicated worker processes, one file at a time per worker, so that a
+    parse running longer than `timeout` seconds (or crashing its process) can be killed.
+    Such files fall back to fast_parse_sql_file. Results are returned in job order.
+    Returns None if worker processes cannot be started.
+    """
+    import multiprocessing
+    from collections import deque
+    from multiprocessing.connection import wait
+
+    context = multiprocessing.get_context()
+
+    def start_worker():
+        parent_conn, child_conn = context.Pipe()
+        process = context.Process(target=_isolated_worker, args=(child_conn,), daemon=True)
+        process.start()
+        child_conn.close()
+        return process, parent_conn
+
+    def degrade(index, reason, message):
+        filepath, _, sql_content = jobs[index]
+        print(f"Parsing {filepath} {message}, falling back to the fast path")
+        records, durations = _fast_parse_job(filepath, sql_content, reason)
+        durations[reason] = time.monotonic() - started_at[index] # Time lost before giving up
+        results[index] = records, durations
+
+    results = [None] * len(jobs)
+    started_at = [None] * len(jobs)
+    queue = deque(range(len(jobs)))
+    idle = []
+    busy = {} # connection -> (worker, job index, start time)
+    try:
+        for _ in range(min(workers, len(jobs))):
+            idle.append(start_worker())
+    except OSError as e:
+        print(f"Isolated parsing unavailable ({e}), falling back to in-process parsing")
+        for process, conn in idle:
+            process.kill()
+        return None
+
+    try:
+        while queue or busy:
+            if cancelled is not None and cancelled.is_set():
+                for worker, _, _ in busy.values():
+                    worker[0].kill() # Stuck mid-parse, the shutdown below would wait for it
+                raise ParseCancelled()
+            while idle and queue:
+                worker = idle.pop()
+                index = queue.popleft()
+                worker[1].send(jobs[index])
+                started_at[index] = time.monotonic()
+                busy[worker[1]] = (worker, index, started_at[index])
+
+            deadline = min(started for _, _, started in busy.values()) + timeout
+            # Wake up regularly to notice cancellation even while a slow file is parsing
+            wait_for = min(max(0.0, deadline - time.monotonic()), CANCEL_CHECK_INTERVAL)
+            for conn in wait(list(busy), timeout=wait_for):
+                worker, index, _ = busy.pop(conn)
                 try:
-                    # Parse with BigQuery dialect to support CREATE OR REPLACE TABLE/VIEW
-                    parsed = sqlglot.parse_one(sql_content, read=dialect)
-                    
-                    # Detect Node Type (Table or View)
-                    node_type = "table" # default
-                    if isinstance(parsed, exp.Create):
-                        if parsed.kind == "VIEW":
-                            node_type = "view"
-                    
-                    # Attempt to extract Project and Dataset from the CREATE statement
-                    # pattern: project.dataset.table or dataset.table
-                    # We look for the creation target
-                    target_table_name = filename_base
-                    project = "default"
-                    dataset = "default"
-                    
-                    create_node = parsed.find(exp.Create)
-                    if create_node and create_node.this:
-                        # sqlglot represents the target as an exp.Table or exp.Schema
-                        target_exp = create_node.this
-                        if isinstance(target_exp, exp.Table):
-                            target_table_name = target_exp.name
-                            dataset = target_exp.db or "default"
-                            project = target_exp.catalog or "default"
-
-                    # Fallback: Extract from filename (project.dataset.table.sql)
-                    if project == "default" and dataset == "default":
-                        parts = filename_base.split('.')
-                        if len(parts) == 3:
-                            project, dataset, target_table_name = parts
-                        elif len(parts) == 2:
-                            dataset, target_table_name = parts
-                    
-                    # Fallback: Extract from directory structure if straightforward
-                    # e.g. /project/dataset/table.sql
-                    if project == "default" and dataset == "default":
-                         path_parts = os.path.normpath(filepath).split(os.sep)
-                         # Simple heuristic: parent dir is dataset, grandparent is project? 
-                         # This is risky without strict structure, so maybe just stick to filename for now.
-                         # Or just capture parent folder as dataset if it's not the layer name
-                         parent_dir = path_parts[-2] if len(path_parts) > 1 else ""
-                         if parent_dir.lower() not in ["bronze", "bronce", "silver", "gold", "other"] and dataset == "default":
-                             dataset = parent_dir
-                    
-                    dependencies = set()
-                    
-                    # 1. Identify CTEs defined in the query to exclude them from dependencies
-                    defined_ctes = {}
-                    for cte in parsed.find_all(exp.CTE):
-                        if cte.alias_or_name:
-                            # Extract the full CTE definition as SQL string
-                            # We can use cte.sql() or just the inner query
-                            # User likely wants the full "name AS ( ... )" or just the inner query
-                            # Let's give the full CTE expression for context
-                            defined_ctes[cte.alias_or_name] = cte.sql(dialect=dialect, pretty=True)
-                    
-                    # Find all tables referenced in the query
-                    for table in parsed.find_all(exp.Table):
-                        dep_name = table.name
-                        # Construct full name if available to match lookup
-                        full_name = dep_name
-                        if table.db:
-                            full_name = f"{table.db}.{dep_name}"
-                            if table.catalog:
-                                full_name = f"{table.catalog}.{table.db}.{dep_name}"
-                        
-                        # Avoid self-reference if it matches the target
-                        if dep_name == target_table_name:
-                            continue
-                            
-                        # Internal CTE references
-                        if dep_name in defined_ctes:
-                            # Add strictly as a CTE dependency so we can visualize it if desired
-                            dependencies.add(f"cte:{filename_base}:{dep_name}")
-                            continue
-
-                        # If we haven't found a CREATE statement, this might just be a SELECT
-                        # and we treat the filename as the target.
-                        
-                        dependencies.add(full_name)
-                        # REMOVED: partial match addition to prevent double counting in visual metadata
-                        # matches are now handled in build_graph via fuzzy lookup
-                             
-                    tables[filename_base] = { 
-                        # Use filename_base as unique ID for the graph to avoid ambiguity
-                        # Visual label can be the actual table name
-                        "id": filename_base,
-                        "label": target_table_name,
-                        "layer": layer,
-                        "type": node_type,
-                        "project": project,
-                        "dataset": dataset,
-                        "path": filepath,
-                        "dependencies": list(dependencies),
-                        "content": sql_content,
-                        "ctes": defined_ctes
-                    }
-                except Exception as e:
-                    print(f"Error parsing {filepath}: {e}")
-                    tables[filename_base] = {
-                        "id": filename_base,
-                        "label": filename_base,
-                        "layer": layer,
-                        "type": "unknown",
-                        "project": "n/a",
-                        "dataset": "n/a",
-                        "path": filepath,
-                        "dependencies": [],
-                        "error": str(e),
-                        "content": sql_content
-                    }
-    
+                    results[index] = conn.recv()
+                    idle.append(worker)
+                except (EOFError, OSError):
+                    # The worker died (segfault, out of memory...), replace it
+                    worker[0].kill()
+                    degrade(index, "crash", "crashed the parser")
+                    if queue:
+                        idle.append(start_worker())
+
+            now = time.monotonic()
+            for conn, (worker, index, started) in list(busy.items()):
+                if now - started >= timeout:
+                    del busy[conn]
+                    worker[0].kill()
+                    worker[0].join()
+                    degrade(index, "timeout", f"exceeded the {timeout:g}s parse budget")
+                    if queue:
+                        idle.append(start_worker())
+    finally:
+        for process, conn in idle + [worker for worker, _, _ in busy.values()]:
+            try:
+                conn.send(None)
+            except OSError:
+                pass
+            process.join(timeout=1)
+            if process.is_alive():
+                process.kill()
+
+    return results
+
+
+def parse_files(filepaths, dialect="bigquery", cache=None, stats=None, workers=None, chunksize=None,
+                timeout=None, max_bytes=MAX_PARSE_BYTES, timings=None, cancelled=None, contents=None):
+    """
+    Parses the given .sql files and returns a list of (filepath, records) in input order.
+
+    If a ParseCache is given, files whose content hash is unchanged are served from it
+    instead of being re-parsed. Cache hit/miss counts are written to `stats` if provided.
+    With `workers` > 1, cache misses are parsed in a process pool; the result is
+    identical to the serial path (same tables, same order).
+
+    Files over `max_bytes` skip sqlglot and go through fast_parse_sql_file. With a
+    `timeout` (seconds), files are parsed in isolated worker processes and a parse that
+    runs over budget is killed and replaced by the fast path as well. Degraded records
+    are cached like any other, so a slow file is not retried until it changes.
+
+    If a Timings object is given, the duration of every phase and the parse time of
+    every parsed file are recorded in it.
+
+    `cancelled` is an optional threading.Event: once set, parsing stops at the next file
+    (or worker result) and ParseCancelled is raised. Nothing is written to the cache then.
+
+    `contents` optionally maps file paths to the SQL text to parse instead of the file on
+    disk (e.g. the blob of another git revision). Such entries are cached without the
+    file's mtime and size, so they are never mistaken for the file on disk.
+    """
+    workers = resolve_workers(workers)
+
+    with phase(timings, "walk"):
+        filepaths = list(filepaths)
+
+    # 1. Read every file and serve what we can from the cache
+    files = []  # [filepath, sql_content, records or None] in input order
+    read_seconds = cache_seconds = 0.0
+    for filepath in filepaths:
+        started = time.perf_counter()
+        from_disk = contents is None or filepath not in contents
+        if not from_disk:
+            sql_content = contents[filepath]
+        else:
+            with open(filepath, "r", encoding="utf-8") as f:
+                sql_content = f.read()
+        read_at = time.perf_counter()
+
+        records = None
+        if cache is not None:
+            if from_disk:
+                # Unchanged mtime and size: served without hashing the file
+                records = cache.lookup(filepath, dialect, sql_content)
+            if records is None:
+                records = cache.get(filepath, dialect, sql_content, track_stat=from_disk)
+        cache_seconds += time.perf_counter() - read_at
+        read_seconds += read_at - started
+        files.append([filepath, sql_content, records])
+    if timings is not None:
+        timings.add("read", read_seconds)
+        timings.add("cache_lookup", cache_seconds)
+
+    # 2. Parse the misses, fanning out across processes when requested
+    pending = [entry for entry in files if entry[2] is None]
+    parse_started = time.perf_counter()
+    oversized = []
+    for entry in pending:
+        if max_bytes is not None and len(entry[1]) > max_bytes:
+            print(f"Skipping full parse of {entry[0]} ({len(entry[1])} bytes), using the fast path")
+            result = _fast_parse_job(entry[0], entry[1], "size")
+            entry[2] = result[0]
+            oversized.append((entry, result))
+    to_parse = [entry for entry in pending if entry[2] is None]
+    jobs = [(filepath, dialect, sql_content) for filepath, sql_content, _ in to_parse]
+
+    results = None
+    if timeout and jobs:
+        results = _parse_isolated(jobs, min(workers, len(jobs)), timeout, cancelled)
+    elif workers > 1 and len(jobs) > 1:
+        results = _parse_parallel(jobs, min(workers, len(jobs)), chunksize, cancelled)
+    if results is None:
+        results = []
+        for job in jobs:
+            if cancelled is not None and cancelled.is_set():
+                raise ParseCancelled()
+            results.append(_parse_job(job))
+
+    for entry, (records, _) in zip(to_parse, results):
+        entry[2] = records
+
+    if timings is not None:
+        timings.add("parse", time.perf_counter() - parse_started)
+        for entry, (_, durations) in oversized + list(zip(to_parse, results)):
+            for name, seconds in durations.items():
+                timings.add(f"parse.{name}", seconds)
+            timings.add_file(entry[0], sum(durations.values()))
+
+    with phase(timings, "cache_store"):
+        for entry in pending:
+            if cache is not None:
+                cache.put(entry[0], dialect, entry[1], entry[2],
+                          track_stat=contents is None or entry[0] not in contents)
+
+        if cache is not None:
+            cache.save()
+
+    if stats is not None:
+        stats["files"] = len(files)
+        stats["cache_hits"] = len(files) - len(pending)
+        stats["cache_misses"] = len(pending)
+        stats["workers"] = workers
+        stats["degraded"] = sum(1 for _, _, records in files
+                                if any("degraded" in record for record in records.values()))
+
+    return [(filepath, records) for filepath, _, records in files]
+
+
+def parse_sql_files(directory, allowed_subfolders=None, dialect="bigquery", cache=None, stats=None,
+                    workers=None, chunksize=None, timeout=None, max_bytes=MAX_PARSE_BYTES, timings=None):
+    """
+    Recursively scans a directory for .sql files and parses them.
+    Returns a dictionary mapping table names to their dependencies and metadata.
+    See parse_files for the cache, stats, workers, timeout, max_bytes and timings options.
+    """
+    parsed = parse_files(iter_sql_files(directory, allowed_subfolders), dialect=dialect,
+                         cache=cache, stats=stats, workers=workers, chunksize=chunksize,
+                         timeout=timeout, max_bytes=max_bytes, timings=timings)
+
+    # Merge in walk order so later files win on id collisions, as before
+    tables = {}
+    for _, records in parsed:
+        tables.update(records)
     return tables
 
 
-def build_graph(tables, discovery_mode=False):
+def is_path_allowed(directory, filepath, allowed_subfolders=None):
+    """Whether parse_sql_files would pick up `filepath` under the given subfolder filter."""
+    if not filepath.endswith(".sql"):
+        return False
+    if allowed_subfolders is None:
+        return True
+    rel_dir = os.path.relpath(os.path.dirname(filepath), directory).replace(os.sep, '/')
+    if rel_dir == ".": rel_dir = ""
+    return rel_dir in allowed_subfolders
+
+
+# Node detail fields needed to draw the graph. SQL and CTE bodies can be fetched per node.
+STRUCTURAL_FIELDS = ("id", "label", "layer", "type", "project", "dataset", "path", "dependencies", "error")
+
+
+def compact_nodes(nodes):
     """
-    Constructs nodes and edges for React Flow.
+    Returns a copy of React Flow nodes whose details only keep STRUCTURAL_FIELDS,
+    dropping the full SQL (`content`) and CTE bodies that dominate the payload size.
+    """
+    compacted = []
+    for node in nodes:
+        data = node["data"]
+        details = {k: v for k, v in data["details"].items() if k in STRUCTURAL_FIELDS}
+        compacted.append({**node, "data": {**data, "details": details}})
+    return compacted
+
+
+def dependency_links(source_id, resolved_deps, discovery_mode=False):
+    """
+    (node id, edge kind) of every edge pointing to a table, from its resolved dependencies
+    [(dependency, target id or None)]. In discovery mode, unresolved CTE references and
+    external tables link to a ghost node whose id is the dependency itself (see
+    virtual_node_details); otherwise they are dropped, as are self references.
+    """
+    for dep, target_id in resolved_deps:
+        if target_id and target_id != source_id:
+            yield target_id, EDGE_TABLE
+        elif discovery_mode:
+            # 1. Handle CTEs
+            if dep.startswith("cte:"):
+                # Format: cte:filename_base:cte_name
+                if len(dep.split(":")) >= 3:
+                    # CTE ID is the dependency string itself to be unique per file
+                    yield dep, EDGE_CTE
+                continue
+
+            # 2. Handle missing external nodes
+            if not target_id:
+                # Use the full dependency name as the ID
+                yield dep, EDGE_EXTERNAL
+
+
+def virtual_node_details(node_id, kind, data):
+    """Details of the CTE (EDGE_CTE) or ghost (EDGE_EXTERNAL) node `node_id`, linked from table `data`."""
+    if kind == EDGE_CTE:
+        # Reconstruct in case name had colons (unlikely but safe)
+        cte_name = ":".join(node_id.split(":")[2:])
+
+        # Retrieve SQL content if available
+        cte_content = f"-- CTE: {cte_name}"
+        if "ctes" in data and cte_name in data["ctes"]:
+            cte_content = data["ctes"][cte_name]
+
+        return {
+            "id": node_id,
+            "label": cte_name,
+            "layer": "cte",  # Special layer for CTEs
+            "type": "cte",   # Special type for CTEs
+            "project": "internal",
+            "dataset": "cte",
+            "path": "internal",
+            "dependencies": [],
+            "content": cte_content
+        }
+
+    # Attempt to parse project/dataset from the dependency string
+    parts = node_id.split('.')
+    ghost_project = "default"
+    ghost_dataset = "default"
+    ghost_table = node_id
+
+    if len(parts) == 3:
+        ghost_project, ghost_dataset, ghost_table = parts
+    elif len(parts) == 2:
+        ghost_dataset, ghost_table = parts
+
+    return {
+        "id": node_id,
+        "label": ghost_table,
+        "layer": "external", # Special layer for discovered nodes
+        "type": "table",
+        "project": ghost_project,
+        "dataset": ghost_dataset,
+        "path": "discovered",
+        "dependencies": [],
+        "content": "-- Discovered dependency"
+    }
+
+
+def build_graph_core(tables, discovery_mode=False, resolver=None, dialect=None, timings=None):
+    """
+    Resolves dependencies and builds the GraphCore of the project.
     If discovery_mode is True, creates 'ghost' nodes for dependencies 
     that are not found in the parsed tables.
+    Dependencies are resolved with a TableResolver; pass one that is kept up to date
+    with `tables` to reuse its index (and read its ambiguities afterwards).
+    Phase durations are recorded in `timings` if given.
     """
-    nodes = []
-    edges = []
-    
-    # Create a lookup map: identifier -> node_id
-    lookup = {}
-    
+    with phase(timings, "resolve"):
+        if resolver is None:
+            resolver = TableResolver.from_tables(tables, dialect=dialect)
+        resolved = resolver.resolve_all(tables)
+    edges_started = time.perf_counter()
+
+    core = GraphCore()
     for node_id, data in tables.items():
-        lookup[node_id] = node_id
-        if "label" in data:
-            lookup[data["label"]] = node_id
-            
-        project = data.get("project", "default")
-        dataset = data.get("dataset", "default")
-        table = data.get("label", "")
-        
-        if table:
-             if dataset != "default":
-                 lookup[f"{dataset}.{table}"] = node_id
-                 if project != "default":
-                     lookup[f"{project}.{dataset}.{table}"] = node_id
-    
-    # Track incoming edges for accurate dependency counting
-    incoming_edges_count = {node_id: 0 for node_id in tables}
-    
-    # Track missing dependencies if in discovery mode
-    missing_nodes = {}
-
-    # Create edges first (conceptually) to count dependencies
+        core.add_node(node_id, data)
+
+    # Ghost and CTE nodes are interned after the parsed tables, in order of discovery
+    missing_nodes = set()
+
     for source_id, data in tables.items():
-        for dep in data["dependencies"]:
-            target_id = lookup.get(dep)
-            
-            # Fuzzy lookup: if exact match fails, try splitting by dot and matching last part (table name)
-            if not target_id and "." in dep:
-                short_name = dep.split(".")[-1]
-                target_id = lookup.get(short_name)
-
-            if target_id and target_id != source_id:
-                edges.append({
-                    "id": f"{target_id}-{source_id}",
-                    "source": target_id,
-                    "target": source_id,
-                    "animated": True,
-                    "style": {"stroke": "#b1b1b7"}
-                })
-                incoming_edges_count[source_id] = incoming_edges_count.get(source_id, 0) + 1
-            else:
-                 # Discovery Mode: Handle missing dependencies OR CTEs
-                 if discovery_mode:
-                     
-                     # 1. Handle CTEs
-                     if dep.startswith("cte:"):
-                         # Format: cte:filename_base:cte_name
-                         parts = dep.split(":")
-                         if len(parts) >= 3:
-                             # Reconstruct in case name had colons (unlikely but safe)
-                             cte_name = ":".join(parts[2:])
-                             
-                             # CTE ID is the dependency string itself to be unique per file
-                             cte_id = dep
-                             
-                             if cte_id not in missing_nodes:
-                                 # Retrieve SQL content if available
-                                 cte_content = f"-- CTE: {cte_name}"
-                                 if source_id in tables and "ctes" in tables[source_id]:
-                                     if cte_name in tables[source_id]["ctes"]:
-                                         cte_content = tables[source_id]["ctes"][cte_name]
-
-                                 missing_nodes[cte_id] = {
-                                     "id": cte_id,
-                                     "label": cte_name,
-                                     "layer": "cte",  # Special layer for CTEs
-                                     "type": "cte",   # Special type for CTEs
-                                     "project": "internal",
-                                     "dataset": "cte",
-                                     "path": "internal",
-                                     "dependencies": [],
-                                     "content": cte_content
-                                 }
-                                 
-                             # Edge from CTE to Table
-                             edges.append({
-                                "id": f"{cte_id}-{source_id}",
-                                "source": cte_id,
-                                "target": source_id,
-                                "animated": True,
-                                "style": {"stroke": "#E91E63", "strokeDasharray": "2,2"} # Pink dashed for CTEs
-                             })
-                             # CTEs generally don't have incoming edges in this parser implementation yet
-                             # but we count for the target
-                             incoming_edges_count[source_id] = incoming_edges_count.get(source_id, 0) + 1
-                         continue
-
-                     # 2. Handle missing external nodes
-                     if not target_id:
-                         # Create a unique ID for the missing node
-                         # Use the full dependency name as the ID
-                         ghost_id = dep
-                         
-                         if ghost_id not in missing_nodes:
-                             # Attempt to parse project/dataset from the dependency string
-                             parts = ghost_id.split('.')
-                             ghost_project = "default"
-                             ghost_dataset = "default"
-                             ghost_table = ghost_id
-                             
-                             if len(parts) == 3:
-                                 ghost_project, ghost_dataset, ghost_table = parts
-                             elif len(parts) == 2:
-                                 ghost_dataset, ghost_table = parts
-                             
-                             missing_nodes[ghost_id] = {
-                                 "id": ghost_id,
-                                 "label": ghost_table,
-                                 "layer": "external", # Special layer for discovered nodes
-                                 "type": "table",
-                                 "project": ghost_project,
-                                 "dataset": ghost_dataset,
-                                 "path": "discovered",
-                                 "dependencies": [],
-                                 "content": "-- Discovered dependency"
-                             }
-                             
-                         # Add edge from ghost node to current node
-                         edges.append({
-                            "id": f"{ghost_id}-{source_id}",
-                            "source": ghost_id,
-                            "target": source_id,
-                            "animated": True,
-                            "style": {"stroke": "#ff9f1c", "strokeDasharray": "5,5"} # Distinct style
-                         })
-                         
-                         incoming_edges_count[source_id] = incoming_edges_count.get(source_id, 0) + 1
-
-
-    # Merge missing nodes into the main tables list for node creation
-    # We don't add them to 'tables' input to avoid side effects, just iterate for node creation
-    all_nodes_data = {**tables, **missing_nodes}
-    
-    # Recalculate G for all nodes including ghosts
-    G = nx.DiGraph()
-    for edge in edges:
-        G.add_edge(edge["source"], edge["target"])
-
-    for table_name, data in all_nodes_data.items():
-        # Calculate nested dependencies (all ancestors in the dependency graph)
-        nested_count = 0
-        if G.has_node(table_name):
-            try:
-                # ancestors() returns all nodes u such that there is a path from u to table_name
-                nested_count = len(nx.ancestors(G, table_name))
-            except Exception:
-                pass # distinct graph parts or cycles? cycles shouldn't exist in DAG but safety first
+        position = core.intern(source_id)
+        for node_id, kind in dependency_links(source_id, resolved[source_id], discovery_mode):
+            if kind != EDGE_TABLE and node_id not in missing_nodes:
+                missing_nodes.add(node_id)
+                core.add_node(node_id, virtual_node_details(node_id, kind, data))
+            core.add_edge(core.intern(node_id), position, kind)
 
-        nodes.append({
-            "id": table_name,
-            "data": {
-                "label": data["label"], 
-                "layer": data["layer"],
-                "details": data,
-                "incomingCount": incoming_edges_count.get(table_name, 0),
-                "nestedCount": nested_count
-            },
-            "position": {"x": 0, "y": 0}, 
-            "type": "custom", 
-        })
+    if timings is not None:
+        timings.add("edges", time.perf_counter() - edges_started)
+
+    # Nested dependencies (all ancestors in the dependency graph) for all nodes including ghosts
+    with phase(timings, "ancestors"):
+        core.compute_nested_counts()
+    return core
 
-    return nodes, edges
+
+def build_graph(tables, discovery_mode=False, resolver=None, dialect=None, timings=None):
+    """
+    Constructs nodes and edges for React Flow.
+    Same arguments as build_graph_core; the graph is rendered to JSON-ready dicts here.
+    """
+    core = build_graph_core(tables, discovery_mode=discovery_mode, resolver=resolver, dialect=dialect,
+                            timings=timings)
+    with phase(timings, "nodes"):
+        return core.render()
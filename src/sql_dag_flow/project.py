@@ -0,0 +1,687 @@
+import os
+import json
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from .parser import (parse_files, fast_parse_sql_file, build_graph, compact_nodes, is_path_allowed,
+                     virtual_node_details, ParseCancelled)
+from .graph_core import EDGE_CTE
+from .scanner import iter_sql_files
+from .cache import content_hash
+from .resolver import TableResolver
+from .subgraph import GraphIndex
+from .lineage import ColumnLineage
+from .layout import LayeredLayout
+from .analytics import graph_analytics
+from .search import SearchIndex, snippet, DEFAULT_LIMIT
+from .clusters import ClusteredGraph
+from .incremental import IncrementalGraph
+from .timings import Timings, phase
+
+# Bump when the graph JSON produced for the same inputs changes, to invalidate client ETags
+GRAPH_FORMAT_VERSION = 1
+
+# Server-side layouts kept per project, keyed by graph fingerprint, most recently used last
+MAX_CACHED_LAYOUTS = 8
+# Analytics passes kept per project, keyed by graph fingerprint, most recently used last
+MAX_CACHED_ANALYTICS = 8
+
+# Refinement deltas sent by a progressive build (the graph is re-assembled after each one)
+REFINE_STEPS = 8
+# Fewest files parsed between two refinements
+REFINE_MIN_BATCH = 32
+
+
+def diff_graph(old_nodes, old_edges, new_nodes, new_edges):
+    """Computes the node/edge delta that turns the old graph into the new one."""
+    old_nodes_by_id = {n["id"]: n for n in old_nodes}
+    new_nodes_by_id = {n["id"]: n for n in new_nodes}
+    old_edges_by_id = {e["id"]: e for e in old_edges}
+    new_edges_by_id = {e["id"]: e for e in new_edges}
+
+    return {
+        "nodes": {
+            "added": [n for node_id, n in new_nodes_by_id.items() if node_id not in old_nodes_by_id],
+            "updated": [n for node_id, n in new_nodes_by_id.items()
+                        if node_id in old_nodes_by_id and old_nodes_by_id[node_id] != n],
+            "removed": [node_id for node_id in old_nodes_by_id if node_id not in new_nodes_by_id],
+        },
+        "edges": {
+            "added": [e for edge_id, e in new_edges_by_id.items() if edge_id not in old_edges_by_id],
+            "removed": [edge_id for edge_id in old_edges_by_id if edge_id not in new_edges_by_id],
+        },
+    }
+
+
+def is_empty_delta(delta):
+    return not any(delta["nodes"].values()) and not any(delta["edges"].values())
+
+
+class EventBroker:
+    """Fans out events from worker threads to asyncio subscribers (SSE connections)."""
+
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self):
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue())
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, event):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, event)
+            except RuntimeError:
+                self.unsubscribe((loop, queue)) # Event loop already closed
+
+
+class ProjectState:
+    """
+    In-memory graph of one project directory.
+
+    Keeps the parsed records of every file so that, when files change, only those
+    files are re-parsed. The graph is then re-assembled from the records and the
+    difference is published to subscribers as a delta.
+    """
+
+    def __init__(self, directory, cache=None, parse_timeout=None, metrics=None, project_id=None):
+        self.directory = directory
+        self.project_id = project_id # Registry id, added to published deltas
+        self.cache = cache
+        self.parse_timeout = parse_timeout # Per-file parse budget in seconds, see parse_files
+        self.metrics = metrics # Optional timings.Metrics receiving the timings of every build
+        self.config = None # (dialect, discovery, subfolders) of the current graph
+        self.file_records = {} # filepath -> {table_id: record}, in walk order
+        self.tables = {}
+        self.nodes = []
+        self.edges = []
+        self.details = {} # node id -> full details (SQL content, CTEs) for lazy fetching
+        self.resolver = None # TableResolver kept in sync with `tables` across incremental rebuilds
+        self.ambiguities = [] # references matching several tables equally well
+        self.degraded = [] # files that took the fast path (too big or too slow to parse)
+        self._index = None # GraphIndex of the current graph, built on the first subgraph query
+        self._lineage = None # ColumnLineage, created on the first column lineage request
+        self._search = None # SearchIndex of `tables`, built on the first search and then kept in sync
+        self._layout = None # LayeredLayout, created on the first layout request
+        self._positions = None # positions of the current graph, see layout()
+        self._layouts = OrderedDict() # fingerprint -> positions
+        self._analytics = None # graph_analytics of the current graph, see analytics()
+        self._clustered = None # ClusteredGraph of the current graph, see clustered()
+        self._incremental = None # IncrementalGraph patched by apply_changes, created on the first change
+        self._analytics_cache = OrderedDict() # fingerprint -> graph_analytics
+        self.fingerprint = None # fingerprint of the inputs the current graph was built from
+        self.version = 0
+        self.generation = 0 # bumped by every full build, so a progressive build notices it was superseded
+        self.events = EventBroker()
+        self._lock = threading.RLock()
+
+    def compute_fingerprint(self, dialect="bigquery", discovery=False, subfolders=None):
+        """
+        Fingerprint of everything the graph depends on: the path and content hash of
+        every selected file plus the build options. Unchanged files are not re-read
+        (see ParseCache.file_hash), so this costs one directory walk and a stat per file.
+        """
+        if subfolders is not None:
+            subfolders = tuple(subfolders)
+        digest = hashlib.sha1()
+        digest.update(json.dumps([GRAPH_FORMAT_VERSION, dialect, discovery, subfolders]).encode("utf-8"))
+        for filepath in iter_sql_files(self.directory, subfolders):
+            if self.cache is not None:
+                file_digest = self.cache.file_hash(filepath, dialect)
+            else:
+                with open(filepath, "r", encoding="utf-8") as f:
+                    file_digest = content_hash(f.read())
+            digest.update(f"{filepath}\0{file_digest}\n".encode("utf-8"))
+        return digest.hexdigest()
+
+    def build(self, dialect="bigquery", discovery=False, subfolders=None, workers=None, stats=None,
+              fingerprint=None, timings=None, cancelled=None, view=None):
+        """
+        Full parse + graph build. Returns (nodes, edges).
+        If `fingerprint` matches the one of the current graph, the graph is reused as is.
+        Phase durations are recorded in `timings` (a Timings) if given.
+        If the `cancelled` event gets set, ParseCancelled is raised and the current graph is kept.
+        If a `view` dict is given, it receives the version, ambiguities and degraded files of
+        the returned graph, read together with it (see graph_view).
+        """
+        if subfolders is not None:
+            subfolders = tuple(subfolders)
+        with self._lock:
+            if fingerprint is not None and fingerprint == self.fingerprint:
+                if stats is not None:
+                    stats["files"] = len(self.file_records)
+                    stats["reused"] = True
+                self._fill_view(view)
+                return self.nodes, self.edges
+
+        if timings is None:
+            timings = Timings()
+        if stats is None:
+            stats = {}
+        parsed = parse_files(iter_sql_files(self.directory, subfolders), dialect=dialect,
+                             cache=self.cache, stats=stats, workers=workers, timeout=self.parse_timeout,
+                             timings=timings, cancelled=cancelled)
+        if cancelled is not None and cancelled.is_set():
+            raise ParseCancelled()
+        with self._lock:
+            self.config = (dialect, discovery, subfolders)
+            self.file_records = dict(parsed)
+            self.resolver = TableResolver(dialect)
+            self.tables = {}
+            self._search = None # Rebuilt on the next search
+            self._assemble(timings)
+            self.fingerprint = fingerprint
+            self.version += 1
+            self.generation += 1
+            self._observe(timings, stats)
+            self._fill_view(view)
+            return self.nodes, self.edges
+
+    def _fill_view(self, view):
+        if view is not None:
+            view.update(version=self.version, ambiguities=self.ambiguities, degraded=self.degraded)
+
+    def current_graph(self):
+        """(nodes, edges, view) of the current graph, read together; see build for `view`."""
+        with self._lock:
+            view = {}
+            self._fill_view(view)
+            return self.nodes, self.edges, view
+
+    def graph_view(self, nodes, edges, layout=False, analytics=False, cluster=False, timings=None):
+        """
+        (positions, analytics, ClusteredGraph) of a graph returned by build, each None
+        unless requested. Served from the project's caches while (nodes, edges) is still
+        the current graph; if another build replaced it meanwhile they are computed for
+        the given graph, so a response never mixes two builds.
+        """
+        with self._lock:
+            if self.nodes is nodes and self.edges is edges:
+                positions = self.layout(timings) if layout else None
+                result = self.analytics(timings) if analytics else None
+                clustered = None
+                if cluster:
+                    with phase(timings, "cluster"):
+                        clustered = self.clustered()
+                return positions, result, clustered
+        positions = result = clustered = None
+        if layout:
+            with phase(timings, "layout"):
+                positions = LayeredLayout().update(nodes, edges)
+        if analytics:
+            with phase(timings, "analytics"):
+                result = graph_analytics(nodes, edges)
+        if cluster:
+            with phase(timings, "cluster"):
+                clustered = ClusteredGraph(nodes, edges)
+        return positions, result, clustered
+
+    def build_progressive(self, dialect="bigquery", discovery=False, subfolders=None, workers=None, layout=False,
+                          cancelled=None, fingerprint=None):
+        """
+        Two-phase build, as a generator of (event name, payload):
+
+        - "skeleton": the graph built from cached parse results plus a regex scan
+          (fast_parse_sql_file) of every other file, available long before a full parse;
+        - "refine": deltas (see diff_graph) as those files are parsed with sqlglot, in at
+          most REFINE_STEPS batches; `pending` counts the files still to parse;
+        - "done": once the graph equals the one build() would produce.
+
+        Stops early (without "done") if another build replaces the graph meanwhile. With
+        layout=True the skeleton has server-side positions and deltas place added nodes.
+        Once done the generator returns ((nodes, edges, view), stats, timings) like build
+        with a `view`; if it stops before that (cancelled, or closed by its consumer) the
+        partial graph is marked as unbuilt, so nothing else serves it.
+        """
+        if subfolders is not None:
+            subfolders = tuple(subfolders)
+        if fingerprint is None:
+            try:
+                fingerprint = self.compute_fingerprint(dialect, discovery, subfolders)
+            except OSError:
+                fingerprint = None
+
+        timings = Timings()
+        records_by_path = []
+        pending = [] # the files not served by the cache
+        with timings.phase("skeleton"):
+            for filepath in iter_sql_files(self.directory, subfolders):
+                try:
+                    with open(filepath, "r", encoding="utf-8") as f:
+                        sql_content = f.read()
+                except OSError:
+                    continue # Vanished mid-walk
+                records = None
+                if self.cache is not None:
+                    # Unchanged mtime and size: no need to hash the file (see parse_files)
+                    records = self.cache.lookup(filepath, dialect, sql_content)
+                    if records is None:
+                        records = self.cache.get(filepath, dialect, sql_content)
+                if records is None:
+                    records = fast_parse_sql_file(filepath, sql_content, reason="skeleton")
+                    pending.append(filepath)
+                records_by_path.append((filepath, records))
+
+        with self._lock:
+            self.config = (dialect, discovery, subfolders)
+            self.file_records = dict(records_by_path)
+            self.resolver = TableResolver(dialect)
+            self.tables = {}
+            self._search = None
+            self._assemble(timings)
+            self.fingerprint = None if pending else fingerprint
+            self.version += 1
+            self.generation += 1
+            generation = self.generation
+            skeleton = {"nodes": compact_nodes(self.nodes), "edges": self.edges, "version": self.version,
+                        "stats": {"files": len(records_by_path), "pending": len(pending)}}
+            if layout:
+                skeleton["layout"] = self.layout(timings)
+        finished = False
+        try:
+            yield "skeleton", skeleton
+
+            batch_size = max(REFINE_MIN_BATCH, -(-len(pending) // REFINE_STEPS))
+            for start in range(0, len(pending), batch_size):
+                batch = pending[start:start + batch_size]
+                stats = {}
+                try:
+                    # Read again rather than passed as `contents`, so the cache records their mtime
+                    # and size and the next skeleton needs no hashing
+                    parsed = parse_files(batch, dialect=dialect, cache=self.cache, stats=stats, workers=workers,
+                                         timeout=self.parse_timeout, timings=timings, cancelled=cancelled)
+                except ParseCancelled:
+                    return None
+                with self._lock:
+                    if self.generation != generation:
+                        return None # Superseded by another build
+                    old_nodes, old_edges = self.nodes, self.edges
+                    self.file_records.update(parsed)
+                    self._assemble(timings)
+                    done = start + batch_size >= len(pending)
+                    if done:
+                        self.fingerprint = fingerprint
+                    self.version += 1
+                    delta = diff_graph(old_nodes, old_edges, self.nodes, self.edges)
+                    delta["nodes"]["added"] = compact_nodes(delta["nodes"]["added"])
+                    delta["nodes"]["updated"] = compact_nodes(delta["nodes"]["updated"])
+                    if layout:
+                        positions = self.layout()
+                        delta["positions"] = {node["id"]: positions[node["id"]] for node in delta["nodes"]["added"]}
+                    delta["type"] = "refine"
+                    delta["version"] = self.version
+                    delta["pending"] = len(pending) - start - len(batch)
+                yield "refine", delta
+
+            stats = {"files": len(records_by_path), "cache_misses": len(pending)}
+            self._observe(timings, stats)
+            with self._lock:
+                if self.generation != generation:
+                    return None
+                view = {}
+                self._fill_view(view)
+                graph = self.nodes, self.edges, view
+            finished = True
+        finally:
+            if not finished:
+                with self._lock:
+                    if self.generation == generation:
+                        # Only the skeleton or part of the refinement: the next build starts over
+                        self.config = None
+                        self.fingerprint = None
+
+        yield "done", {**view, "timings": timings.as_dict()}
+        return graph, stats, timings
+
+    def save_snapshot(self, path):
+        """
+        Writes the parsed records of the current graph to `path` (atomically), so that
+        load_snapshot can restore the graph without parsing. Returns False if there is
+        no graph or its inputs can no longer be fingerprinted.
+        """
+        with self._lock:
+            if self.config is None:
+                return False
+            dialect, discovery, subfolders = self.config
+            fingerprint = self.fingerprint
+            if fingerprint is None:
+                try:
+                    fingerprint = self.compute_fingerprint(dialect, discovery, subfolders)
+                except OSError:
+                    return False
+            payload = json.dumps({
+                "version": GRAPH_FORMAT_VERSION,
+                "directory": self.directory,
+                "config": [dialect, discovery, list(subfolders) if subfolders is not None else None],
+                "fingerprint": fingerprint,
+                "graph_version": self.version,
+                "file_records": list(self.file_records.items()),
+            })
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+        return True
+
+    def load_snapshot(self, path):
+        """
+        Restores a graph written by save_snapshot if the project's files are unchanged
+        since (same fingerprint). Returns whether the graph was restored.
+        """
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if data.get("version") != GRAPH_FORMAT_VERSION or data.get("directory") != self.directory:
+            return False
+
+        dialect, discovery, subfolders = data["config"]
+        try:
+            if self.compute_fingerprint(dialect, discovery, subfolders) != data["fingerprint"]:
+                return False # Files changed while the graph was on disk; the next request rebuilds
+        except OSError:
+            return False
+
+        with self._lock:
+            self.config = (dialect, discovery, tuple(subfolders) if subfolders is not None else None)
+            self.file_records = dict(data["file_records"])
+            self.resolver = TableResolver(dialect)
+            self.tables = {}
+            self._search = None
+            self._assemble()
+            self.fingerprint = data["fingerprint"]
+            # Never reuse a version number: watch mode ETags are built from it
+            self.version = max(self.version, data.get("graph_version", 0)) + 1
+        return True
+
+    def is_current(self, dialect, discovery, subfolders):
+        if subfolders is not None:
+            subfolders = tuple(subfolders)
+        return self.config == (dialect, discovery, subfolders)
+
+    def _observe(self, timings, stats=None):
+        if self.metrics is not None:
+            self.metrics.observe(timings, stats)
+            self.metrics.set_gauge("graph_nodes", len(self.nodes))
+            self.metrics.set_gauge("graph_edges", len(self.edges))
+
+    def _assemble(self, timings=None):
+        tables = {}
+        with phase(timings, "index"):
+            for records in self.file_records.values():
+                tables.update(records)
+
+            # Only re-index records that changed; unchanged files keep the same record objects
+            old_tables = self.tables
+            for node_id, record in old_tables.items():
+                if tables.get(node_id) is not record:
+                    self.resolver.remove(node_id)
+            for node_id, record in tables.items():
+                if old_tables.get(node_id) is not record:
+                    self.resolver.add(node_id, record)
+            if self._search is not None:
+                self._search.sync(old_tables, tables)
+
+        self.tables = tables
+        self.nodes, self.edges = build_graph(tables, discovery_mode=self.config[1], resolver=self.resolver,
+                                             timings=timings)
+        self.ambiguities = self.resolver.ambiguity_report(tables)
+        self.degraded = [{"id": node_id, "path": record["path"], "reason": record["degraded"]}
+                         for node_id, record in tables.items() if "degraded" in record]
+        self.details = {node["id"]: node["data"]["details"] for node in self.nodes}
+        self._incremental = None
+        self._invalidate()
+
+    def _invalidate(self):
+        """Drops everything derived from the current nodes and edges."""
+        self._index = None
+        self._positions = None
+        self._analytics = None
+        self._clustered = None
+        if self._lineage is not None:
+            self._lineage.reset_catalog()
+
+    def node_details(self, node_id, dialect=None):
+        """
+        Full details (including SQL content and CTEs) of a node, or None if unknown.
+
+        Nodes of the current graph are answered from memory. Any other table or CTE node
+        (left out of a filtered build, built with another config, or requested before the
+        first build after a restart) is read from its file through the parse cache: table
+        ids start with their file name, CTE ids with the one of their table.
+        """
+        with self._lock:
+            details = self.details.get(node_id)
+            if details is not None:
+                return details
+            if dialect is None:
+                dialect = self.config[0] if self.config is not None else "bigquery"
+
+        if node_id.startswith("cte:"):
+            record = self._file_record(node_id.split(":")[1], dialect)
+            if record is None or ":".join(node_id.split(":")[2:]) not in record.get("ctes", {}):
+                return None
+            return virtual_node_details(node_id, EDGE_CTE, record)
+        return self._file_record(node_id, dialect)
+
+    def _file_record(self, node_id, dialect):
+        """Table record of `node_id` parsed from its file (the last one in walk order), or None."""
+        filename_base = node_id.split(":")[0]
+        record = None
+        for filepath in iter_sql_files(self.directory):
+            if os.path.splitext(os.path.basename(filepath))[0] != filename_base:
+                continue
+            try:
+                [(_, records)] = parse_files([filepath], dialect=dialect, cache=self.cache,
+                                             timeout=self.parse_timeout)
+            except OSError:
+                continue
+            record = records.get(node_id, record)
+        return record
+
+    def subgraph(self, node_id, direction="both", depth=None, include_virtual=True):
+        """
+        (nodes, edges) of the upstream and/or downstream closure of a node of the current
+        graph, or None if the node is unknown. See GraphIndex.subgraph.
+        """
+        with self._lock:
+            if self._index is None:
+                self._index = GraphIndex(self.nodes, self.edges)
+            return self._index.subgraph(node_id, direction, depth, include_virtual)
+
+    def layout(self, timings=None):
+        """
+        Server-side positions {node id: [x, y]} of the current graph, see LayeredLayout.
+        Cached by graph fingerprint; after incremental changes only the ranks touched
+        by the change are laid out again.
+        """
+        with self._lock:
+            if self._positions is not None:
+                return self._positions
+            with phase(timings, "layout"):
+                if self.fingerprint is not None and self.fingerprint in self._layouts:
+                    self._layouts.move_to_end(self.fingerprint)
+                    self._positions = self._layouts[self.fingerprint]
+                    return self._positions
+                if self._layout is None:
+                    self._layout = LayeredLayout()
+                self._positions = self._layout.update(self.nodes, self.edges)
+            if self.fingerprint is not None:
+                self._layouts[self.fingerprint] = self._positions
+                if len(self._layouts) > MAX_CACHED_LAYOUTS:
+                    self._layouts.popitem(last=False)
+            return self._positions
+
+    def clustered(self):
+        """ClusteredGraph of the current graph (ghost nodes per dataset, CTEs per file), built once per graph."""
+        with self._lock:
+            if self._clustered is None:
+                self._clustered = ClusteredGraph(self.nodes, self.edges)
+            return self._clustered
+
+    def search(self, query, offset=0, limit=DEFAULT_LIMIT):
+        """
+        Ranked page of the tables matching `query` (see SearchIndex.search) with a
+        highlighted SQL snippet each: {"total", "results": [{id, label, layer, path,
+        score, matches, snippet}]}.
+        """
+        with self._lock:
+            if self._search is None:
+                self._search = SearchIndex()
+                self._search.sync({}, self.tables)
+            total, page = self._search.search(query, offset, limit)
+            results = []
+            for node_id, score, tokens in page:
+                record = self.tables[node_id]
+                results.append({
+                    "id": node_id,
+                    "label": record.get("label", node_id),
+                    "layer": record.get("layer"),
+                    "path": record.get("path"),
+                    "score": round(score, 3),
+                    "matches": sorted(tokens),
+                    "snippet": snippet(record.get("content"), tokens),
+                })
+            return {"total": total, "results": results}
+
+    def analytics(self, timings=None):
+        """
+        graph_analytics of the current graph (blast radius, critical path, hotspots, cycles,
+        orphans). Computed once per graph and cached by graph fingerprint, like layout().
+        """
+        with self._lock:
+            if self._analytics is not None:
+                return self._analytics
+            with phase(timings, "analytics"):
+                if self.fingerprint is not None and self.fingerprint in self._analytics_cache:
+                    self._analytics_cache.move_to_end(self.fingerprint)
+                    self._analytics = self._analytics_cache[self.fingerprint]
+                    return self._analytics
+                self._analytics = graph_analytics(self.nodes, self.edges)
+            if self.fingerprint is not None:
+                self._analytics_cache[self.fingerprint] = self._analytics
+                if len(self._analytics_cache) > MAX_CACHED_ANALYTICS:
+                    self._analytics_cache.popitem(last=False)
+            return self._analytics
+
+    def column_lineage(self, node_id):
+        """Column lineage of a node of the current graph, or None if unknown. See ColumnLineage."""
+        with self._lock:
+            if self.config is None:
+                return None
+            dialect = self.config[0]
+            if self._lineage is None or self._lineage.dialect != dialect:
+                self._lineage = ColumnLineage(dialect)
+            return self._lineage.node_lineage(node_id, self.tables, self.resolver)
+
+    def apply_changes(self, changes):
+        """
+        Re-parses the files touched by `changes` and patches the graph: only the changed
+        tables, the tables referencing their names and the nodes below them are updated
+        (see IncrementalGraph). Publishes and returns the delta, or None if the graph did
+        not change.
+        """
+        with self._lock:
+            if self.config is None:
+                return None
+            dialect, discovery, subfolders = self.config
+
+            to_parse = []
+            file_changes = {} # path -> records, None for files that are gone
+            for change in changes:
+                event = change["event"]
+                if event in ("deleted", "renamed"):
+                    removed_path = change.get("src_path", change["path"])
+                    if removed_path in self.file_records:
+                        file_changes[removed_path] = None
+                if event in ("created", "modified", "renamed"):
+                    path = change["path"]
+                    if is_path_allowed(self.directory, path, subfolders) and os.path.exists(path):
+                        to_parse.append(path)
+                    elif path in self.file_records:
+                        file_changes[path] = None
+
+            timings = Timings()
+            stats = {}
+            try:
+                parsed = parse_files(to_parse, dialect=dialect, cache=self.cache, stats=stats,
+                                     timeout=self.parse_timeout, timings=timings)
+            except OSError as e:
+                # File vanished between the change notification and the read; next poll catches up
+                print(f"Error re-parsing changed files: {e}")
+                parsed = []
+            file_changes.update(parsed)
+
+            if not file_changes:
+                return None
+
+            if self._incremental is None:
+                with phase(timings, "index"):
+                    self._incremental = IncrementalGraph(self.file_records, self.tables, self.nodes, self.edges,
+                                                         self.resolver, discovery,
+                                                         walk=lambda: iter_sql_files(self.directory, subfolders))
+            with phase(timings, "patch"):
+                delta, changed = self._incremental.apply(file_changes)
+                self._patched(delta, changed)
+            self._observe(timings, stats)
+            if delta is None or is_empty_delta(delta):
+                return None
+
+            # Clients fetch SQL bodies lazily, keep deltas structural
+            delta["nodes"]["added"] = compact_nodes(delta["nodes"]["added"])
+            delta["nodes"]["updated"] = compact_nodes(delta["nodes"]["updated"])
+
+            self.fingerprint = None # Recomputed on the next full request
+            self.version += 1
+            if self._layout is not None:
+                # Clients showing server-side positions place new nodes with these
+                positions = self.layout()
+                delta["positions"] = {node["id"]: positions[node["id"]] for node in delta["nodes"]["added"]}
+            delta["type"] = "delta"
+            if self.project_id is not None:
+                delta["project"] = self.project_id
+            delta["version"] = self.version
+            delta["changes"] = changes
+
+        self.events.publish(delta)
+        return delta
+
+    def _patched(self, delta, changed):
+        """Brings the state derived from tables and nodes in line with an IncrementalGraph patch."""
+        if not changed:
+            return
+        for node_id, record in changed.items():
+            if self._search is not None:
+                self._search.remove(node_id)
+                if record is not None:
+                    self._search.add(node_id, record)
+        self.degraded = [item for item in self.degraded if item["id"] not in changed]
+        self.degraded.extend({"id": node_id, "path": record["path"], "reason": record["degraded"]}
+                             for node_id, record in changed.items() if record is not None and "degraded" in record)
+        self.ambiguities = self._incremental.ambiguity_report()
+        if delta is None or is_empty_delta(delta):
+            for node_id, record in changed.items():
+                if record is not None:
+                    self.details[node_id] = record
+            return
+
+        for node_id in delta["nodes"]["removed"]:
+            self.details.pop(node_id, None)
+        for node in delta["nodes"]["added"] + delta["nodes"]["updated"]:
+            self.details[node["id"]] = node["data"]["details"]
+        self.nodes = self._incremental.node_list()
+        self.edges = self._incremental.edge_list()
+        self._invalidate()
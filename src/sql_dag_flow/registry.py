@@ -0,0 +1,197 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from .cache import ParseCache, default_cache_dir
+from .project import ProjectState, EventBroker
+from .watcher import PollingWatcher
+
+# Projects whose graph is kept in memory, most recently used last; colder ones go to disk
+MAX_ACTIVE_PROJECTS = 3
+
+
+def project_id(directory):
+    """Stable id of a project root: a short hash of its absolute path."""
+    return hashlib.sha1(os.path.realpath(directory).encode("utf-8")).hexdigest()[:12]
+
+
+class ProjectRegistry:
+    """
+    The project roots known to the server, each with its own ProjectState, parse cache
+    and (in watch mode) file watcher.
+
+    At most `max_active` projects keep their graph in memory. When another one is opened,
+    the least recently used is evicted: its watcher is stopped and its parsed records are
+    written to `<cache root>/projects/<id>/graph.json`, from which the graph is restored
+    without parsing the next time the project is opened (if its files did not change).
+    Deltas of every watched project go through one EventBroker and carry the project id.
+    """
+
+    def __init__(self, cache_root=None, parse_timeout=None, metrics=None, watch=False, watch_interval=1.0,
+                 max_active=MAX_ACTIVE_PROJECTS):
+        self.cache_root = cache_root or default_cache_dir()
+        self.parse_timeout = parse_timeout
+        self.metrics = metrics
+        self.watch = watch
+        self.watch_interval = watch_interval
+        self.max_active = max_active
+        self.events = EventBroker()
+        self._directories = {} # id -> directory, every registered project
+        self._active = OrderedDict() # id -> ProjectState, most recently used last
+        self._watchers = {} # id -> PollingWatcher
+        self._loading = {} # id -> threading.Event set once the project is loaded (or evicted)
+        self._lock = threading.RLock()
+
+    def register(self, directory):
+        """Registers a project root (idempotent) and returns its id."""
+        directory = os.path.abspath(directory)
+        pid = project_id(directory)
+        with self._lock:
+            self._directories.setdefault(pid, directory)
+        return pid
+
+    def unregister(self, pid):
+        """Forgets a project, its in-memory graph and its snapshot. Returns False if unknown."""
+        with self._lock:
+            if pid not in self._directories:
+                return False
+            self._stop_watcher(pid)
+            self._active.pop(pid, None)
+            del self._directories[pid]
+        try:
+            os.remove(self._snapshot_path(pid))
+        except OSError:
+            pass
+        return True
+
+    def directory(self, pid):
+        return self._directories.get(pid)
+
+    def directories(self):
+        """Roots of every registered project."""
+        with self._lock:
+            return list(self._directories.values())
+
+    def _project_dir(self, pid):
+        return os.path.join(self.cache_root, "projects", pid)
+
+    def _snapshot_path(self, pid):
+        return os.path.join(self._project_dir(pid), "graph.json")
+
+    def cache(self, pid):
+        """
+        The parse cache of a registered project, or None if the id is unknown: the one of
+        the project in memory, else one read from disk (only projects in memory keep theirs).
+        """
+        with self._lock:
+            if pid not in self._directories:
+                return None
+            project = self._active.get(pid)
+            if project is not None:
+                return project.cache
+        return ParseCache(cache_dir=self._project_dir(pid))
+
+    def get(self, pid):
+        """
+        ProjectState of a registered project, or None if the id is unknown. Opening a
+        project that is not in memory restores it from its snapshot and may evict another.
+        Snapshot reads and writes and watcher start/stop happen outside the registry lock;
+        requests for a project being loaded or evicted wait for that to finish.
+        """
+        while True:
+            with self._lock:
+                project = self._active.get(pid)
+                if project is not None:
+                    self._active.move_to_end(pid)
+                    return project
+                directory = self._directories.get(pid)
+                if directory is None:
+                    return None
+                loading = self._loading.get(pid)
+                if loading is None:
+                    loading = self._loading[pid] = threading.Event()
+                    break
+            loading.wait()
+
+        try:
+            project = self._load(pid, directory)
+            stale_watcher = None
+            evicted = []
+            with self._lock:
+                if pid in self._directories:
+                    self._active[pid] = project
+                else:
+                    # Unregistered while loading
+                    stale_watcher = self._watchers.pop(pid, None)
+                    project = None
+                while len(self._active) > self.max_active:
+                    old_pid, old_project = self._active.popitem(last=False)
+                    # Reopening waits until its snapshot is written
+                    self._loading[old_pid] = threading.Event()
+                    evicted.append((old_pid, old_project, self._watchers.pop(old_pid, None)))
+        finally:
+            with self._lock:
+                self._loading.pop(pid, None)
+            loading.set()
+
+        if stale_watcher is not None:
+            stale_watcher.stop()
+        for old_pid, old_project, watcher in evicted:
+            try:
+                self._evict(old_pid, old_project, watcher)
+            finally:
+                with self._lock:
+                    event = self._loading.pop(old_pid)
+                event.set()
+        return project
+
+    def _load(self, pid, directory):
+        project = ProjectState(directory, cache=self.cache(pid), parse_timeout=self.parse_timeout,
+                               metrics=self.metrics, project_id=pid)
+        project.events = self.events
+        if project.load_snapshot(self._snapshot_path(pid)):
+            print(f"Restored graph of {directory} from disk")
+        if self.watch:
+            watcher = PollingWatcher(directory, project.apply_changes, interval=self.watch_interval)
+            watcher.start()
+            with self._lock:
+                self._watchers[pid] = watcher
+        return project
+
+    def _evict(self, pid, project, watcher):
+        if watcher is not None:
+            watcher.stop()
+        try:
+            if project.save_snapshot(self._snapshot_path(pid)):
+                print(f"Moved graph of {project.directory} to disk")
+            if project.cache is not None:
+                project.cache.save()
+        except OSError as e:
+            print(f"Error saving graph of {project.directory}: {e}")
+
+    def _stop_watcher(self, pid):
+        watcher = self._watchers.pop(pid, None)
+        if watcher is not None:
+            watcher.stop()
+
+    def projects(self):
+        """Summary of every registered project, most recently used first."""
+        with self._lock:
+            order = list(reversed(self._active)) + [pid for pid in self._directories if pid not in self._active]
+            summary = []
+            for pid in order:
+                project = self._active.get(pid)
+                summary.append({
+                    "id": pid,
+                    "path": self._directories[pid],
+                    "active": project is not None,
+                    "onDisk": os.path.exists(self._snapshot_path(pid)),
+                    "nodes": len(project.nodes) if project is not None else None,
+                })
+            return summary
+
+    def stop(self):
+        """Stops every watcher (server shutdown)."""
+        with self._lock:
+            for pid in list(self._watchers):
+                self._stop_watcher(pid)
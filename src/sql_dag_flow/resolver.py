@@ -0,0 +1,194 @@
+from sqlglot.dialects.dialect import Dialect, NormalizationStrategy
+
+# Qualifier values used by the parser when a project/dataset is unknown
+UNKNOWN_QUALIFIERS = ("default", "n/a", "", None)
+
+
+def identifier_normalizer(dialect=None):
+    """
+    Returns the function used to compare table identifiers in `dialect`.
+    BigQuery dataset and table names are case-sensitive (only columns are not), as are
+    those of case-sensitive dialects; everything else compares case-insensitively.
+    With no dialect, identifiers are compared exactly.
+    """
+    if dialect is None or dialect == "bigquery":
+        return str
+    try:
+        strategy = Dialect.get_or_raise(dialect).NORMALIZATION_STRATEGY
+    except ValueError:
+        return str
+    if strategy == NormalizationStrategy.CASE_SENSITIVE:
+        return str
+    return str.lower
+
+
+class TableResolver:
+    """
+    Index of parsed tables used to resolve dependency references to node ids.
+
+    A reference resolves, in order, to:
+    1. the node whose id is exactly the reference (e.g. the file name),
+    2. the nodes whose qualified name matches the reference exactly,
+    3. the nodes with the same table name whose known project/dataset don't contradict
+       the reference, preferring the ones matching more qualifiers.
+    Unlike a plain dict, several tables may share a name: if more than one candidate is
+    equally good the reference is reported in `ambiguities` and the lowest node id is
+    used, so the result does not depend on file walk order or on rebuild history.
+
+    Results are memoised per table name, and add()/remove() only invalidate the
+    references to the names they touch, so one resolver can serve incremental rebuilds.
+    """
+
+    def __init__(self, dialect=None):
+        self.normalize = identifier_normalizer(dialect)
+        self._entries = {} # node_id -> (catalog, db, name), normalized, None when unknown
+        self._by_id = {} # normalized node id -> [node_id], the first one added wins
+        self._by_qualified = {} # (catalog, db, name) or (db, name) -> [node_id]
+        self._by_name = {} # name -> [node_id] (suffix index)
+        self._memo = {} # name -> {reference: [candidates]}
+        self.ambiguities = {} # reference -> [candidates]
+
+    @classmethod
+    def from_tables(cls, tables, dialect=None):
+        resolver = cls(dialect)
+        for node_id, data in tables.items():
+            resolver.add(node_id, data)
+        return resolver
+
+    def _qualifier(self, value):
+        return None if value in UNKNOWN_QUALIFIERS else self.normalize(value)
+
+    def _keys(self, catalog, db, name):
+        keys = []
+        if db is not None:
+            keys.append((db, name))
+            if catalog is not None:
+                keys.append((catalog, db, name))
+        return keys
+
+    def add(self, node_id, data):
+        """Registers (or re-registers) a parsed table record."""
+        if node_id in self._entries:
+            self.remove(node_id)
+
+        name = self.normalize(data.get("label") or node_id)
+        catalog = self._qualifier(data.get("project"))
+        db = self._qualifier(data.get("dataset"))
+
+        self._entries[node_id] = (catalog, db, name)
+        self._by_id.setdefault(self.normalize(node_id), []).append(node_id)
+        self._by_name.setdefault(name, []).append(node_id)
+        for key in self._keys(catalog, db, name):
+            self._by_qualified.setdefault(key, []).append(node_id)
+        self._invalidate(name, node_id)
+
+    def remove(self, node_id):
+        entry = self._entries.pop(node_id, None)
+        if entry is None:
+            return
+        catalog, db, name = entry
+        # Another node with the same normalized id, if any, takes over
+        self._discard(self._by_id, self.normalize(node_id), node_id)
+        self._discard(self._by_name, name, node_id)
+        for key in self._keys(catalog, db, name):
+            self._discard(self._by_qualified, key, node_id)
+        self._invalidate(name, node_id)
+
+    @staticmethod
+    def _discard(index, key, node_id):
+        ids = index.get(key)
+        if ids and node_id in ids:
+            ids.remove(node_id)
+            if not ids:
+                del index[key]
+
+    def _invalidate(self, name, node_id):
+        self._memo.pop(name, None)
+        # References equal to the node id are memoised under their own last part
+        self._memo.pop(self.normalize(node_id).split(".")[-1], None)
+        self.ambiguities = {}
+
+    def candidates(self, reference):
+        """All equally good node ids for a reference (empty if unresolved)."""
+        parts = [self.normalize(part) for part in reference.split(".")]
+        name = parts[-1]
+        memo = self._memo.setdefault(name, {})
+        if reference in memo:
+            return memo[reference]
+
+        result = self._lookup(reference, parts)
+        memo[reference] = result
+        return result
+
+    def _lookup(self, reference, parts):
+        exact_ids = self._by_id.get(self.normalize(reference))
+        if exact_ids:
+            return [exact_ids[0]]
+
+        if len(parts) > 1:
+            exact = self._by_qualified.get(tuple(parts[-3:]))
+            if exact:
+                return sorted(exact)
+
+        # Suffix match on the table name; known qualifiers must not contradict the reference
+        db = parts[-2] if len(parts) >= 2 else None
+        catalog = parts[-3] if len(parts) >= 3 else None
+        best_score = -1
+        best = []
+        for node_id in self._by_name.get(parts[-1], ()):
+            node_catalog, node_db, _ = self._entries[node_id]
+            score = 0
+            if db is not None and node_db is not None:
+                if node_db != db:
+                    continue
+                score += 1
+            if catalog is not None and node_catalog is not None:
+                if node_catalog != catalog:
+                    continue
+                score += 1
+            if score > best_score:
+                best_score, best = score, [node_id]
+            elif score == best_score:
+                best.append(node_id)
+        return sorted(best)
+
+    def resolve(self, reference, source_id=None):
+        """
+        Node id a reference points to, or None. Other nodes are preferred over `source_id`,
+        which is only returned when it is the sole match (a self reference).
+        """
+        matches = self.candidates(reference)
+        candidates = [c for c in matches if c != source_id]
+        if not candidates:
+            return source_id if matches else None
+        if len(candidates) > 1:
+            self.ambiguities[reference] = candidates
+        return candidates[0]
+
+    def resolve_all(self, tables):
+        """
+        Resolves the dependencies of every table in one pass.
+        Returns {source_id: [(dependency, target_id or None), ...]}.
+        """
+        self.ambiguities = {}
+        return {
+            source_id: [(dep, self.resolve(dep, source_id)) for dep in data["dependencies"]]
+            for source_id, data in tables.items()
+        }
+
+    def ambiguity_report(self, tables=None):
+        """List of ambiguous references with their candidates and (given `tables`) referencing nodes."""
+        referenced_by = {}
+        if tables is not None:
+            for source_id, data in tables.items():
+                for dep in data["dependencies"]:
+                    if dep in self.ambiguities:
+                        referenced_by.setdefault(dep, []).append(source_id)
+
+        report = []
+        for reference, candidates in self.ambiguities.items():
+            item = {"reference": reference, "candidates": candidates, "resolvedTo": candidates[0]}
+            if tables is not None:
+                item["referencedBy"] = referenced_by.get(reference, [])
+            report.append(item)
+        return report
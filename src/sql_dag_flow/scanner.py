@@ -0,0 +1,330 @@
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+
+# Directories never descended into, on top of .gitignore rules: hidden folders (.git, .venv...),
+# dependencies and build output (dbt writes a compiled copy of every model to target/)
+DEFAULT_IGNORES = (".*/", "node_modules/", "dbt_packages/", "target/", "__pycache__/", "venv/")
+# Project-specific ignore rules, same syntax as .gitignore (read after it, so it can override it)
+IGNORE_FILE = ".sqldagflowignore"
+IGNORE_FILES = (".gitignore", IGNORE_FILE)
+
+# Folders modified this recently (seconds) are listed again on the next refresh: a change
+# within the same mtime tick as the listing would otherwise go unnoticed
+RACY_SECONDS = 2.0
+
+# Directory manifests kept in memory by get_manifest, most recently used last
+MAX_MANIFESTS = 16
+
+
+def compile_ignore_pattern(line):
+    """
+    (regex, negated, directory_only) for one .gitignore line, or None for blank lines and
+    comments. The regex matches paths relative to the folder of the ignore file.
+    """
+    line = line.rstrip("\r\n").rstrip(" ")
+    if not line or line.startswith("#"):
+        return None
+    negated = line.startswith("!")
+    if negated:
+        line = line[1:]
+    if line.startswith("\\"): # \# and \! escape a leading # or !
+        line = line[1:]
+    directory_only = line.endswith("/")
+    line = line.rstrip("/")
+    if not line:
+        return None
+    # Patterns with a slash are relative to the ignore file, the others match at any depth
+    prefix = "" if "/" in line else "(?:.*/)?"
+    line = line.lstrip("/")
+
+    regex = []
+    i = 0
+    while i < len(line):
+        if line.startswith("**/", i):
+            regex.append("(?:.*/)?")
+            i += 3
+        elif line.startswith("/**", i) and i + 3 == len(line):
+            regex.append("/.*")
+            i += 3
+        elif line[i] == "*":
+            regex.append("[^/]*")
+            i += 1
+        elif line[i] == "?":
+            regex.append("[^/]")
+            i += 1
+        elif line[i] == "[" and line.find("]", i + 2) != -1:
+            end = line.find("]", i + 2)
+            body = line[i + 1:end].replace("\\", "\\\\")
+            if body.startswith("!"):
+                body = "^" + body[1:]
+            regex.append(f"[{body}]")
+            i = end + 1
+        else:
+            regex.append(re.escape(line[i]))
+            i += 1
+    return re.compile(prefix + "".join(regex) + "$"), negated, directory_only
+
+
+def _rules(lines, base):
+    """Ignore rules (base, regex, negated, directory_only) of an ignore file in folder `base`."""
+    rules = []
+    for line in lines:
+        compiled = compile_ignore_pattern(line)
+        if compiled is not None:
+            rules.append((base, *compiled))
+    return tuple(rules)
+
+
+_DEFAULT_RULES = _rules(DEFAULT_IGNORES, "")
+
+
+def is_ignored(rules, rel_path, is_dir):
+    """Whether a path (relative to the scan root, with '/') is ignored; the last matching rule wins."""
+    ignored = False
+    for base, regex, negated, directory_only in rules:
+        if directory_only and not is_dir:
+            continue
+        if base:
+            if not rel_path.startswith(base + "/"):
+                continue
+            candidate = rel_path[len(base) + 1:]
+        else:
+            candidate = rel_path
+        if regex.match(candidate):
+            ignored = not negated
+    return ignored
+
+
+def is_ignored_path(rel_path, rules=None):
+    """
+    Whether a file path (relative, '/'-separated) or any of its folders is ignored, for
+    listings that do not come from a walk (e.g. a git tree). Defaults to DEFAULT_IGNORES.
+    """
+    if rules is None:
+        rules = _DEFAULT_RULES
+    parts = rel_path.split("/")
+    for depth in range(1, len(parts)):
+        if is_ignored(rules, "/".join(parts[:depth]), True):
+            return True
+    return is_ignored(rules, rel_path, False)
+
+
+class _Folder:
+    __slots__ = ("path", "mtime", "files", "subdirs", "links", "rules", "stamps")
+
+    def __init__(self, path):
+        self.path = path # as os.walk would spell it
+        self.mtime = None # st_mtime_ns when listed, None to list it again on the next refresh
+        self.files = [] # names of the .sql files to parse, in listing order
+        self.subdirs = [] # names of the non-ignored subfolders, in listing order
+        self.links = set() # subfolders that are symlinks: listed, but not descended into
+        self.rules = () # ignore rules in effect for the entries of this folder
+        self.stamps = () # (ignore file name, st_mtime_ns) of the ignore files of this folder
+
+
+def _subfolder_trie(subfolders):
+    """Nested dicts of the path parts of `subfolders`; the "" key marks a selected folder."""
+    trie = {}
+    for subfolder in subfolders:
+        node = trie
+        for part in subfolder.split("/"):
+            if part:
+                node = node.setdefault(part, {})
+        node[""] = True
+    return trie
+
+
+class DirectoryManifest:
+    """
+    Cached listing of a project tree: every non-ignored folder with its .sql files.
+
+    The first refresh() walks the tree with os.scandir, skipping DEFAULT_IGNORES and the
+    rules of .gitignore / IGNORE_FILE files (nested ones included) without descending into
+    ignored folders. Later refreshes only stat each known folder and list again those whose
+    mtime changed (a file was added, removed or renamed in them) or whose ignore files
+    changed, so the folder picker, fingerprints, builds and the watcher share one walk.
+    """
+
+    def __init__(self, root, ignores=DEFAULT_IGNORES, ignore_files=IGNORE_FILES):
+        self.root = root
+        self.ignore_files = ignore_files
+        self._base_rules = _rules(ignores, "")
+        self._folders = None # relative path ('/'-separated, "" for the root) -> _Folder
+        self._lock = threading.Lock()
+        self.listings = 0 # folders listed since creation, see refresh()
+
+    def refresh(self):
+        """Brings the manifest up to date with the file system and returns it."""
+        with self._lock:
+            if self._folders is None:
+                self._folders = {}
+                self._scan_tree("", self.root, self._base_rules)
+            else:
+                self._revalidate()
+        return self
+
+    def _list(self, rel, path, inherited):
+        folder = _Folder(path)
+        self.listings += 1
+        started = time.time()
+        try:
+            st = os.stat(path)
+            with os.scandir(path) as it:
+                entries = list(it)
+        except OSError:
+            return folder # Unreadable or gone, like os.walk; listed again next time
+        if started - st.st_mtime >= RACY_SECONDS:
+            folder.mtime = st.st_mtime_ns
+
+        rules = inherited
+        names = {entry.name for entry in entries}
+        stamps = []
+        for name in self.ignore_files:
+            if name not in names:
+                continue
+            try:
+                ignore_path = os.path.join(path, name)
+                mtime = os.stat(ignore_path).st_mtime_ns
+                with open(ignore_path, "r", encoding="utf-8", errors="replace") as f:
+                    rules = rules + _rules(f, rel)
+            except OSError:
+                continue
+            stamps.append((name, mtime))
+        folder.rules = rules
+        folder.stamps = tuple(stamps)
+
+        for entry in entries:
+            name = entry.name
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if is_dir:
+                if not is_ignored(rules, f"{rel}/{name}" if rel else name, True):
+                    folder.subdirs.append(name)
+                    if entry.is_symlink():
+                        folder.links.add(name)
+            elif name.endswith(".sql") and not is_ignored(rules, f"{rel}/{name}" if rel else name, False):
+                folder.files.append(name)
+        return folder
+
+    def _scan_tree(self, rel, path, inherited):
+        stack = [(rel, path, inherited)]
+        while stack:
+            rel, path, inherited = stack.pop()
+            folder = self._list(rel, path, inherited)
+            self._folders[rel] = folder
+            for name in folder.subdirs:
+                if name not in folder.links:
+                    stack.append((f"{rel}/{name}" if rel else name, os.path.join(path, name), folder.rules))
+
+    def _drop_tree(self, rel):
+        prefix = rel + "/"
+        for key in [key for key in self._folders if key == rel or key.startswith(prefix)]:
+            del self._folders[key]
+
+    def _stale(self, folder):
+        try:
+            if folder.mtime is None or os.stat(folder.path).st_mtime_ns != folder.mtime:
+                return True
+            # Editing an ignore file in place does not touch the folder's mtime
+            return any(os.stat(os.path.join(folder.path, name)).st_mtime_ns != mtime
+                       for name, mtime in folder.stamps)
+        except OSError:
+            return True
+
+    def _revalidate(self):
+        stale = [rel for rel, folder in self._folders.items() if self._stale(folder)]
+        # Parents first, so that a folder dropped with its parent's subtree is skipped
+        for rel in sorted(stale, key=lambda rel: (rel.count("/") if rel else -1, rel)):
+            old = self._folders.get(rel)
+            if old is None:
+                continue
+            parent = rel.rpartition("/")[0] if "/" in rel else ""
+            inherited = self._folders[parent].rules if rel else self._base_rules
+            folder = self._list(rel, old.path, inherited)
+            if folder.stamps != old.stamps:
+                # Different ignore rules: everything below may be affected
+                self._drop_tree(rel)
+                self._scan_tree(rel, old.path, inherited)
+                continue
+
+            self._folders[rel] = folder
+            kept = {name for name in folder.subdirs if name not in folder.links}
+            for name in old.subdirs:
+                if name not in old.links and name not in kept:
+                    self._drop_tree(f"{rel}/{name}" if rel else name)
+            for name in folder.subdirs:
+                child = f"{rel}/{name}" if rel else name
+                if name in kept and child not in self._folders:
+                    self._scan_tree(child, os.path.join(folder.path, name), folder.rules)
+
+    def _walk(self, trie=None):
+        """(folder, trie node) in os.walk (top-down) order, only towards selected folders."""
+        stack = [("", trie)]
+        while stack:
+            rel, node = stack.pop()
+            folder = self._folders.get(rel)
+            if folder is None:
+                continue
+            yield rel, folder, node
+            children = []
+            for name in folder.subdirs:
+                if name in folder.links:
+                    continue
+                if node is None:
+                    children.append((f"{rel}/{name}" if rel else name, None))
+                elif name in node:
+                    children.append((f"{rel}/{name}" if rel else name, node[name]))
+            stack.extend(reversed(children))
+
+    def folders(self):
+        """Relative paths ('/'-separated) of every non-ignored subfolder, sorted."""
+        with self._lock:
+            folders = []
+            for rel, folder, _ in self._walk():
+                folders.extend(f"{rel}/{name}" if rel else name for name in folder.subdirs)
+            return sorted(folders)
+
+    def sql_files(self, allowed_subfolders=None):
+        """
+        Paths of the .sql files to parse, in os.walk order. With `allowed_subfolders`
+        (relative paths like "sub1/nested") only files directly inside those folders count.
+        """
+        trie = _subfolder_trie(allowed_subfolders) if allowed_subfolders is not None else None
+        with self._lock:
+            paths = []
+            for _, folder, node in self._walk(trie):
+                if node is None or "" in node:
+                    paths.extend(os.path.join(folder.path, name) for name in folder.files)
+            return paths
+
+
+_MANIFESTS = OrderedDict() # directory -> DirectoryManifest, most recently used last
+_MANIFESTS_LOCK = threading.Lock()
+
+
+def get_manifest(directory):
+    """The shared (not yet refreshed) DirectoryManifest of a directory."""
+    with _MANIFESTS_LOCK:
+        manifest = _MANIFESTS.get(directory)
+        if manifest is None:
+            manifest = _MANIFESTS[directory] = DirectoryManifest(directory)
+            while len(_MANIFESTS) > MAX_MANIFESTS:
+                _MANIFESTS.popitem(last=False)
+        else:
+            _MANIFESTS.move_to_end(directory)
+        return manifest
+
+
+def iter_sql_files(directory, allowed_subfolders=None):
+    """Paths of the .sql files of a project to parse, honouring ignore rules and the subfolder filter."""
+    return iter(get_manifest(directory).refresh().sql_files(allowed_subfolders))
+
+
+def list_folders(directory):
+    """Every non-ignored subfolder of a directory (relative, '/'-separated, sorted)."""
+    return get_manifest(directory).refresh().folders()
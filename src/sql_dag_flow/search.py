@@ -0,0 +1,183 @@
+import re
+import math
+import heapq
+
+# Identifiers (table, column, CTE names) and keywords, matched case-insensitively
+TOKEN_RE = re.compile(r"[A-Za-z0-9_]+")
+
+# Weight of one occurrence of a token per field of a table record
+FIELD_WEIGHTS = {"name": 10, "cte": 3, "path": 2, "content": 1}
+
+# Score factor of a term matching only part of a token (e.g. "cust" in customer_id)
+SUBSTRING_FACTOR = 0.5
+
+# Result page size of /search, and its maximum
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+# Characters of SQL shown around the first match of a result
+SNIPPET_CHARS = 160
+
+
+def tokenize(text):
+    """Lowercased identifier tokens of a text ("a.b_c" -> ["a", "b_c"])."""
+    return [token.lower() for token in TOKEN_RE.findall(text or "")]
+
+
+def trigrams(token):
+    return {token[i:i + 3] for i in range(len(token) - 2)}
+
+
+def _fields(record):
+    """(field, text) pairs of a table record that are searchable."""
+    yield "name", record.get("id", "")
+    if record.get("label") != record.get("id"):
+        yield "name", record.get("label", "")
+    for name in record.get("ctes") or ():
+        yield "cte", name
+    path = record.get("path")
+    if path:
+        yield "path", path.replace("\\", "/").rsplit("/", 1)[-1]
+    yield "content", record.get("content", "")
+
+
+class SearchIndex:
+    """
+    Inverted index over the table records of a graph: names, CTE names, file names and SQL
+    content, tokenised into identifiers. Each token maps to the nodes containing it with a
+    field-weighted frequency; a trigram index over the token vocabulary finds the tokens a
+    substring query occurs in, so no query ever rescans SQL content.
+
+    Kept up to date per node with add() / remove() as records change.
+    """
+
+    def __init__(self):
+        self.records = {} # node id -> record
+        self.postings = {} # token -> {node id: weighted frequency}
+        self.grams = {} # trigram -> set of tokens
+        self._tokens = {} # node id -> tokens of the node, to remove it
+
+    def __len__(self):
+        return len(self.records)
+
+    def add(self, node_id, record):
+        if node_id in self.records:
+            self.remove(node_id)
+        weights = {}
+        for field, text in _fields(record):
+            weight = FIELD_WEIGHTS[field]
+            for token in tokenize(text):
+                weights[token] = weights.get(token, 0) + weight
+        for token, weight in weights.items():
+            docs = self.postings.get(token)
+            if docs is None:
+                docs = self.postings[token] = {}
+                for gram in trigrams(token):
+                    self.grams.setdefault(gram, set()).add(token)
+            docs[node_id] = weight
+        self.records[node_id] = record
+        self._tokens[node_id] = tuple(weights)
+
+    def remove(self, node_id):
+        if self.records.pop(node_id, None) is None:
+            return
+        for token in self._tokens.pop(node_id):
+            docs = self.postings[token]
+            del docs[node_id]
+            if not docs:
+                del self.postings[token]
+                for gram in trigrams(token):
+                    tokens = self.grams[gram]
+                    tokens.discard(token)
+                    if not tokens:
+                        del self.grams[gram]
+
+    def sync(self, old_tables, tables):
+        """Applies the difference between two {node id: record} mappings (records compared by identity)."""
+        for node_id, record in old_tables.items():
+            if tables.get(node_id) is not record:
+                self.remove(node_id)
+        for node_id, record in tables.items():
+            if old_tables.get(node_id) is not record:
+                self.add(node_id, record)
+
+    def _matching_tokens(self, term):
+        """(token, factor) of the vocabulary matching a query term: itself and, for 3+ characters, superstrings."""
+        matches = []
+        if term in self.postings:
+            matches.append((term, 1.0))
+        if len(term) >= 3:
+            candidates = None
+            for gram in trigrams(term):
+                tokens = self.grams.get(gram)
+                if not tokens:
+                    return matches
+                candidates = set(tokens) if candidates is None else candidates & tokens
+                if not candidates:
+                    return matches
+            matches.extend((token, SUBSTRING_FACTOR) for token in candidates if token != term and term in token)
+        return matches
+
+    def search(self, query, offset=0, limit=DEFAULT_LIMIT):
+        """
+        Nodes matching every term of `query` (as a whole token or, from 3 characters, part
+        of one), ranked by tf-idf with FIELD_WEIGHTS. Returns (total, [(node id, score,
+        matched tokens)]) for the requested page.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return 0, []
+        total_docs = len(self.records)
+        scores = None
+        matched = {}
+        for term in terms:
+            term_scores = {}
+            for token, factor in self._matching_tokens(term):
+                docs = self.postings[token]
+                idf = math.log(1 + total_docs / len(docs))
+                for node_id, weight in docs.items():
+                    score = factor * idf * (1 + math.log(weight))
+                    if score > term_scores.get(node_id, 0):
+                        term_scores[node_id] = score
+                    matched.setdefault(node_id, set()).add(token)
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {node_id: score + term_scores[node_id] for node_id, score in scores.items()
+                          if node_id in term_scores}
+            if not scores:
+                return 0, []
+
+        normalized = query.strip().lower()
+        for node_id in scores:
+            if node_id.lower() == normalized:
+                scores[node_id] *= 2 # Exact name match first
+        page = heapq.nsmallest(offset + limit, scores.items(), key=lambda item: (-item[1], item[0]))[offset:]
+        return len(scores), [(node_id, score, matched[node_id]) for node_id, score in page]
+
+
+def snippet(text, tokens, chars=SNIPPET_CHARS):
+    """
+    The line of `text` with the first occurrence of one of `tokens`, trimmed to about
+    `chars` characters around it, as {"line", "text", "highlights": [[start, end]]}
+    (offsets into the snippet text), or None if none occurs.
+    """
+    if not text or not tokens:
+        return None
+    pattern = re.compile("|".join(re.escape(token) for token in sorted(tokens, key=len, reverse=True)),
+                         re.IGNORECASE)
+    found = pattern.search(text)
+    if found is None:
+        return None
+    line_start = text.rfind("\n", 0, found.start()) + 1
+    line_end = text.find("\n", found.end())
+    if line_end == -1:
+        line_end = len(text)
+    start = max(line_start, found.start() - chars // 2)
+    end = min(line_end, start + chars)
+    excerpt = text[start:end]
+    return {
+        "line": text.count("\n", 0, found.start()) + 1,
+        "text": excerpt,
+        "highlights": [[m.start(), m.end()] for m in pattern.finditer(excerpt)],
+    }
@@ -0,0 +1,110 @@
+import json
+import zlib
+from fastapi.responses import StreamingResponse, Response
+
+try:
+    # Optional: brotli compresses graph JSON noticeably better than gzip
+    import brotli
+except ImportError:
+    brotli = None
+
+# Items serialised per chunk when streaming large arrays
+CHUNK_ITEMS = 500
+
+
+def negotiate_encoding(accept_encoding):
+    """Picks the best supported Content-Encoding from an Accept-Encoding header."""
+    accepted = set()
+    for part in (accept_encoding or "").split(","):
+        token, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0"):
+            continue
+        accepted.add(token.strip().lower())
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def iter_json(payload, stream_keys=("nodes", "edges")):
+    """
+    Serialises a dict to JSON in chunks. Lists under `stream_keys` are written
+    CHUNK_ITEMS elements at a time instead of as one giant string.
+    """
+    yield "{"
+    first = True
+    for key, value in payload.items():
+        yield ("" if first else ",") + json.dumps(key) + ":"
+        first = False
+        if key in stream_keys and isinstance(value, list):
+            yield "["
+            for start in range(0, len(value), CHUNK_ITEMS):
+                chunk = ",".join(json.dumps(item) for item in value[start:start + CHUNK_ITEMS])
+                yield ("," if start else "") + chunk
+            yield "]"
+        else:
+            yield json.dumps(value)
+    yield "}"
+
+
+def compress_chunks(chunks, encoding):
+    """Encodes text chunks to bytes, compressing them incrementally if requested."""
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=5)
+        for chunk in chunks:
+            data = compressor.process(chunk.encode("utf-8"))
+            if data:
+                yield data
+        yield compressor.finish()
+    elif encoding == "gzip":
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31) # wbits=31 -> gzip container
+        for chunk in chunks:
+            data = compressor.compress(chunk.encode("utf-8"))
+            if data:
+                yield data
+        yield compressor.flush()
+    else:
+        for chunk in chunks:
+            yield chunk.encode("utf-8")
+
+
+def encoded_etag(request, etag):
+    """
+    The ETag of the body json_stream_response sends for `etag`: gzip and brotli bodies
+    are other representations than the identity one, so they get their own strong tag.
+    """
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+    if etag and encoding:
+        return f'{etag[:-1]}-{encoding}"'
+    return etag
+
+
+def not_modified(etag):
+    """304 answer to a conditional request for a json_stream_response body."""
+    return Response(status_code=304, headers={"ETag": etag, "Vary": "Accept-Encoding"})
+
+
+def json_stream_response(request, chunks, etag=None, media_type="application/json"):
+    """
+    StreamingResponse for pre-chunked JSON, compressed according to the request. `etag`
+    should come from encoded_etag.
+    """
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+    headers = {"Vary": "Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    if etag:
+        # Clients may keep the response but must revalidate it every time
+        headers["ETag"] = etag
+        headers["Cache-Control"] = "no-cache"
+    return StreamingResponse(compress_chunks(chunks, encoding), media_type=media_type, headers=headers)
+
+
+def etag_matches(request, etag):
+    """Whether the request's If-None-Match header already names `etag`."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [tag.strip() for tag in header.split(",")]
+    return etag in candidates or f"W/{etag}" in candidates or "*" in candidates
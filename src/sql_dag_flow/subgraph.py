@@ -0,0 +1,87 @@
+from collections import OrderedDict
+
+DIRECTIONS = ("upstream", "downstream", "both")
+
+# Layers of nodes that don't come from a parsed file (discovery mode only)
+VIRTUAL_LAYERS = ("external", "cte")
+
+# Subgraph results kept per index, most recently used last
+MAX_CACHED_QUERIES = 256
+
+
+class GraphIndex:
+    """
+    Adjacency index over a built graph (the nodes and edges returned by build_graph),
+    answering upstream/downstream closure queries without scanning the edge list.
+    Built once per graph version; results of repeated queries are memoised.
+    """
+
+    def __init__(self, nodes, edges):
+        self.nodes = {node["id"]: node for node in nodes}
+        self.positions = {node_id: i for i, node_id in enumerate(self.nodes)}
+        self.upstream = {} # node id -> [edge], edges pointing to the node
+        self.downstream = {} # node id -> [edge], edges leaving the node
+        for edge in edges:
+            self.downstream.setdefault(edge["source"], []).append(edge)
+            self.upstream.setdefault(edge["target"], []).append(edge)
+        self.virtual = {node_id for node_id, node in self.nodes.items()
+                        if node["data"].get("layer") in VIRTUAL_LAYERS}
+        self._results = OrderedDict()
+
+    def closure(self, node_id, direction="both", depth=None, include_virtual=True):
+        """
+        Ids of the nodes reachable from `node_id` (included) walking edges backwards
+        (upstream), forwards (downstream) or both, at most `depth` hops away.
+        Ghost and CTE nodes are skipped, and not walked through, unless include_virtual.
+        """
+        selected = {node_id}
+        if direction in ("upstream", "both"):
+            self._walk(node_id, self.upstream, "source", depth, include_virtual, selected)
+        if direction in ("downstream", "both"):
+            self._walk(node_id, self.downstream, "target", depth, include_virtual, selected)
+        return selected
+
+    def _walk(self, node_id, adjacency, end, depth, include_virtual, selected):
+        seen = {node_id}
+        frontier = [node_id]
+        hops = 0
+        while frontier and (depth is None or hops < depth):
+            hops += 1
+            next_frontier = []
+            for current in frontier:
+                for edge in adjacency.get(current, ()):
+                    neighbour = edge[end]
+                    if neighbour in seen or (not include_virtual and neighbour in self.virtual):
+                        continue
+                    seen.add(neighbour)
+                    next_frontier.append(neighbour)
+            frontier = next_frontier
+        selected.update(seen)
+
+    def subgraph(self, node_id, direction="both", depth=None, include_virtual=True):
+        """
+        (nodes, edges) of the closure of `node_id`, with every edge between selected nodes.
+        Returns None if the node is not in the graph.
+        """
+        if node_id not in self.nodes:
+            return None
+        if direction not in DIRECTIONS:
+            raise ValueError(f"Unknown direction '{direction}', expected one of: {', '.join(DIRECTIONS)}")
+
+        key = (node_id, direction, depth, include_virtual)
+        if key in self._results:
+            self._results.move_to_end(key)
+            return self._results[key]
+
+        selected = self.closure(node_id, direction, depth, include_virtual)
+        # Keep the order of the full graph so views built from slices are stable
+        ordered = sorted(selected, key=self.positions.__getitem__)
+        nodes = [self.nodes[n] for n in ordered]
+        edges = [edge for source in ordered for edge in self.downstream.get(source, ())
+                 if edge["target"] in selected]
+
+        result = (nodes, edges)
+        self._results[key] = result
+        if len(self._results) > MAX_CACHED_QUERIES:
+            self._results.popitem(last=False)
+        return result
@@ -0,0 +1,63 @@
+from sql_dag_flow.analytics import graph_analytics, with_analytics, NODE_FIELDS
+from sql_dag_flow.cache import ParseCache
+from sql_dag_flow.project import ProjectState
+
+
+def graph(node_ids, pairs):
+    nodes = [{"id": node_id, "data": {"label": node_id}} for node_id in node_ids]
+    edges = [{"id": f"{source}-{target}", "source": source, "target": target} for source, target in pairs]
+    return nodes, edges
+
+
+def test_chains_hotspots_cycles_and_orphans():
+    # a -> b -> c -> d, a -> c, b <-> e (cycle), e -> c, f alone
+    nodes, edges = graph("abcdef", [("a", "b"), ("b", "c"), ("c", "d"), ("a", "c"), ("b", "e"), ("e", "b"),
+                                    ("e", "c")])
+    result = graph_analytics(nodes, edges)
+
+    metrics = result["nodes"]
+    assert metrics["a"] == {"descendantCount": 4, "chainDepth": 0, "chainHeight": 3, "fanIn": 0, "fanOut": 2,
+                            "inCycle": False}
+    assert metrics["b"]["inCycle"] and metrics["e"]["inCycle"]
+    assert metrics["b"]["descendantCount"] == 3 # c, d and e (b itself only through the cycle)
+    assert metrics["c"]["fanIn"] == 3
+    assert metrics["d"]["chainDepth"] == 3
+    assert result["longestChain"] == ["a", "b", "e", "c", "d"] # The {b, e} cycle counts as one hop
+    assert result["hotspots"]["fanIn"][0] == {"id": "c", "fanIn": 3}
+    assert result["hotspots"]["descendants"][0] == {"id": "a", "descendantCount": 4}
+    assert result["cycles"] == [["b", "e"]]
+    assert result["orphans"] == ["f"]
+    assert result["summary"] == {"nodes": 6, "edges": 7, "sources": 2, "sinks": 2, "cycles": 1,
+                                 "longestChain": 3}
+
+    enriched = with_analytics(nodes, metrics)
+    assert set(NODE_FIELDS) <= set(enriched[0]["data"])
+    assert "descendantCount" not in nodes[0]["data"]
+
+
+def test_longest_chain_through_a_cycle_entered_from_another_member():
+    # a -> x, x <-> y, y -> z: the chain enters the cycle at x and leaves it from y
+    nodes, edges = graph("axyz", [("a", "x"), ("x", "y"), ("y", "x"), ("y", "z")])
+    assert graph_analytics(nodes, edges)["longestChain"] == ["a", "x", "y", "z"]
+
+
+def test_project_analytics_cached_by_fingerprint(tmp_path):
+    project_dir = tmp_path / "project"
+    project_dir.mkdir()
+    (project_dir / "a.sql").write_text("CREATE TABLE a AS SELECT 1 AS x")
+    (project_dir / "b.sql").write_text("CREATE TABLE b AS SELECT * FROM a")
+    project = ProjectState(str(project_dir), cache=ParseCache(cache_dir=str(tmp_path / "cache")))
+
+    fingerprint = project.compute_fingerprint()
+    project.build(fingerprint=fingerprint)
+    first = project.analytics()
+    assert first["longestChain"] == ["a", "b"]
+    assert project.analytics() is first
+
+    (project_dir / "c.sql").write_text("CREATE TABLE c AS SELECT * FROM b")
+    project.build(fingerprint=project.compute_fingerprint())
+    assert project.analytics()["longestChain"] == ["a", "b", "c"]
+
+    (project_dir / "c.sql").unlink()
+    project.build(fingerprint=fingerprint)
+    assert project.analytics() is first # Same inputs as the first build
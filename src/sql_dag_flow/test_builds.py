@@ -0,0 +1,76 @@
+import asyncio
+import threading
+import pytest
+from sql_dag_flow.builds import BuildCoordinator, BuildQueueFull, ClientDisconnected
+from sql_dag_flow.parser import parse_files, ParseCancelled
+
+
+def test_concurrent_requests_share_one_build():
+    calls = []
+    release = threading.Event()
+
+    def build(cancelled):
+        calls.append(1)
+        release.wait(5)
+        return "graph"
+
+    async def scenario():
+        builds = BuildCoordinator()
+        first = asyncio.ensure_future(builds.run("fp", build))
+        second = asyncio.ensure_future(builds.run("fp", build))
+        await asyncio.sleep(0.05)
+        release.set()
+        return await first, await second, builds.pending()
+
+    assert asyncio.run(scenario()) == (("graph", False), ("graph", True), 0)
+    assert len(calls) == 1
+
+
+def test_queue_is_bounded():
+    release = threading.Event()
+
+    async def scenario():
+        builds = BuildCoordinator(max_pending=1)
+        running = asyncio.ensure_future(builds.run("a", lambda cancelled: release.wait(5)))
+        await asyncio.sleep(0.05)
+        with pytest.raises(BuildQueueFull):
+            await builds.run("b", lambda cancelled: None)
+        release.set()
+        await running
+
+    asyncio.run(scenario())
+
+
+def test_build_is_cancelled_when_its_client_disconnects():
+    observed = threading.Event()
+
+    def build(cancelled):
+        assert cancelled.wait(5)
+        observed.set()
+        raise ParseCancelled()
+
+    async def disconnected():
+        return True
+
+    async def scenario():
+        builds = BuildCoordinator()
+        with pytest.raises(ClientDisconnected):
+            await builds.run("fp", build, disconnected)
+        await asyncio.get_running_loop().run_in_executor(None, observed.wait, 5)
+        await asyncio.sleep(0.05)
+        return builds.pending()
+
+    assert asyncio.run(scenario()) == 0
+    assert observed.is_set()
+
+
+def test_parse_files_stops_when_cancelled(tmp_path):
+    path = tmp_path / "a.sql"
+    path.write_text("CREATE TABLE a AS SELECT 1 AS x")
+    cancelled = threading.Event()
+    cancelled.set()
+
+    with pytest.raises(ParseCancelled):
+        parse_files([str(path)], cancelled=cancelled)
+    with pytest.raises(ParseCancelled):
+        parse_files([str(path)], timeout=10, cancelled=cancelled)
@@ -0,0 +1,86 @@
+import os
+import json
+from sql_dag_flow.parser import parse_sql_files
+from sql_dag_flow.cache import ParseCache
+
+
+def write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+
+
+def test_warm_refresh_only_reparses_changed_files(tmp_path):
+    project = tmp_path / "project"
+    write(str(project / "bronze" / "raw.sql"), "CREATE TABLE ds.raw AS SELECT 1 AS id")
+    write(str(project / "silver" / "clean.sql"), "CREATE TABLE ds.clean AS SELECT * FROM ds.raw")
+
+    cache_dir = str(tmp_path / "cache")
+    stats = {}
+    cold = parse_sql_files(str(project), cache=ParseCache(cache_dir), stats=stats)
+    assert stats["files"] == 2 and stats["cache_hits"] == 0 and stats["cache_misses"] == 2
+
+    # A fresh cache instance must pick up the entries persisted on disk
+    stats = {}
+    warm = parse_sql_files(str(project), cache=ParseCache(cache_dir), stats=stats)
+    assert stats["cache_hits"] == 2 and stats["cache_misses"] == 0
+    assert warm == cold
+
+    write(str(project / "silver" / "clean.sql"), "CREATE TABLE ds.clean AS SELECT * FROM ds.other")
+    stats = {}
+    changed = parse_sql_files(str(project), cache=ParseCache(cache_dir), stats=stats)
+    assert stats["cache_hits"] == 1 and stats["cache_misses"] == 1
+    assert changed["clean"]["dependencies"] == ["ds.other"]
+
+
+def test_dialect_is_part_of_the_key(tmp_path):
+    project = tmp_path / "project"
+    write(str(project / "a.sql"), "SELECT 1")
+    cache = ParseCache(str(tmp_path / "cache"))
+
+    parse_sql_files(str(project), dialect="bigquery", cache=cache)
+    stats = {}
+    parse_sql_files(str(project), dialect="snowflake", cache=cache, stats=stats)
+    assert stats["cache_misses"] == 1
+
+
+def test_eviction_keeps_most_recently_used(tmp_path):
+    project = tmp_path / "project"
+    for name in ("a", "b", "c"):
+        write(str(project / f"{name}.sql"), f"SELECT * FROM src_{name}")
+
+    cache = ParseCache(str(tmp_path / "cache"), max_entries=2)
+    parse_sql_files(str(project), cache=cache)
+    assert cache.stats()["entries"] == 2
+
+
+def test_unchanged_stat_skips_hashing_the_file(tmp_path):
+    path = str(tmp_path / "project" / "a.sql")
+    write(path, "CREATE TABLE ds.a AS SELECT * FROM ds.x")
+    os.utime(path, (1_000_000, 1_000_000)) # Old enough not to be racy
+    cache = ParseCache(str(tmp_path / "cache"))
+    parse_sql_files(str(tmp_path / "project"), cache=cache)
+
+    # Same size and mtime: the cached records are served without hashing the file
+    write(path, "CREATE TABLE ds.a AS SELECT * FROM ds.y")
+    os.utime(path, (1_000_000, 1_000_000))
+    tables = parse_sql_files(str(tmp_path / "project"), cache=cache)
+    assert tables["a"]["dependencies"] == ["ds.x"]
+    # Only records are stored, the SQL text always comes from the file
+    assert "content" not in json.dumps(cache._entries)
+    assert tables["a"]["content"].endswith("ds.y")
+
+    os.utime(path, (2_000_000, 2_000_000))
+    stats = {}
+    tables = parse_sql_files(str(tmp_path / "project"), cache=cache, stats=stats)
+    assert tables["a"]["dependencies"] == ["ds.y"] and stats["cache_misses"] == 1
+
+
+def test_recently_modified_files_are_hashed(tmp_path):
+    path = str(tmp_path / "project" / "a.sql")
+    write(path, "CREATE TABLE ds.a AS SELECT 1 AS x")
+    cache = ParseCache(str(tmp_path / "cache"))
+    parse_sql_files(str(tmp_path / "project"), cache=cache)
+    # Written just now: a same-size edit within the mtime tick must not be missed
+    assert cache.lookup(path, "bigquery", "CREATE TABLE ds.a AS SELECT 1 AS x") is None
+    assert cache.get(path, "bigquery", "CREATE TABLE ds.a AS SELECT 1 AS x") is not None
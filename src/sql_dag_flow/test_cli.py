@@ -0,0 +1,63 @@
+import os
+import sys
+import json
+import subprocess
+import xml.dom.minidom
+
+EXAMPLES_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "sql_examples"))
+
+
+def run_export(*args, env=None):
+    return subprocess.run([sys.executable, "-m", "sql_dag_flow.cli", "export", EXAMPLES_DIR, "--no-cache", *args],
+                          capture_output=True, text=True, check=True, env=env)
+
+
+def test_export_formats_are_parseable(tmp_path):
+    for fmt in ("json", "ndjson", "graphml", "dot"):
+        output = str(tmp_path / f"lineage.{fmt}")
+        run_export("--discovery", "-o", output)
+
+        with open(output, encoding="utf-8") as f:
+            text = f.read()
+        if fmt == "json":
+            assert json.loads(text)["nodes"]
+        elif fmt == "ndjson":
+            records = [json.loads(line) for line in text.splitlines()]
+            assert records[0]["kind"] == "header"
+            assert records[0]["nodeCount"] == sum(r["kind"] == "node" for r in records)
+        elif fmt == "graphml":
+            assert xml.dom.minidom.parseString(text).getElementsByTagName("node")
+        else:
+            assert text.startswith("digraph lineage {") and "->" in text
+
+
+def test_export_does_not_import_the_web_stack():
+    code = ("import sys; from sql_dag_flow.cli import run_export; "
+            f"run_export([{EXAMPLES_DIR!r}, '--no-cache', '-o', '{os.devnull}']); "
+            "print('fastapi' in sys.modules or 'uvicorn' in sys.modules)")
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "False"
+
+
+def test_parse_timeout_is_opt_in():
+    from sql_dag_flow.cli import build_serve_parser, build_export_parser
+    from sql_dag_flow.parser import DEFAULT_PARSE_TIMEOUT
+    assert build_serve_parser().parse_args([]).parse_timeout == DEFAULT_PARSE_TIMEOUT == 0
+    assert build_export_parser().parse_args([".", "--parse-timeout", "5"]).parse_timeout == 5
+
+
+def test_graphml_edge_ids_are_unique(tmp_path):
+    from io import StringIO
+    from sql_dag_flow.export import write_graphml
+    from sql_dag_flow.parser import parse_sql_files, build_graph
+
+    (tmp_path / "a.sql").write_text("CREATE TABLE ds.a AS SELECT 1 AS x")
+    # The same table referenced twice, unqualified and qualified: two a -> b edges
+    (tmp_path / "b.sql").write_text("CREATE TABLE b AS SELECT * FROM a JOIN ds.a AS a2 USING (x)")
+    nodes, edges = build_graph(parse_sql_files(str(tmp_path)))
+    assert [edge["id"] for edge in edges] == ["a-b", "a-b"]
+
+    fp = StringIO()
+    write_graphml(nodes, edges, fp)
+    ids = [edge.getAttribute("id") for edge in xml.dom.minidom.parseString(fp.getvalue()).getElementsByTagName("edge")]
+    assert len(ids) == 2 and len(set(ids)) == 2
@@ -0,0 +1,51 @@
+from sql_dag_flow.cache import ParseCache
+from sql_dag_flow.clusters import ClusteredGraph, is_cluster
+from sql_dag_flow.project import ProjectState
+
+
+def test_ghosts_cluster_per_dataset_and_ctes_per_file(tmp_path):
+    project_dir = tmp_path / "project"
+    project_dir.mkdir()
+    (project_dir / "orders.sql").write_text(
+        "CREATE TABLE orders AS WITH a AS (SELECT * FROM raw.sales.o1), b AS (SELECT * FROM a) "
+        "SELECT * FROM b JOIN raw.sales.o2 USING (id) JOIN other.lonely USING (id)")
+    (project_dir / "report.sql").write_text("CREATE TABLE report AS SELECT * FROM orders JOIN raw.sales.o1 USING (id)")
+    project = ProjectState(str(project_dir), cache=ParseCache(cache_dir=str(tmp_path / "cache")))
+    nodes, edges = project.build(discovery=True)
+
+    clustered = project.clustered()
+    assert clustered is project.clustered()
+    ids = {node["id"] for node in clustered.nodes}
+    assert ids == {"orders", "report", "other.lonely", "cluster:external:raw.sales", "cluster:cte:orders"}
+    sales = next(node for node in clustered.nodes if node["id"] == "cluster:external:raw.sales")
+    assert sales["data"]["clusterSize"] == 2 and sales["data"]["layer"] == "external"
+
+    # One edge per distinct target, counting the member edges it stands for
+    cluster_edges = {(edge["source"], edge["target"]): edge["data"]["count"] for edge in clustered.edges
+                     if is_cluster(edge["source"])}
+    assert cluster_edges == {("cluster:external:raw.sales", "orders"): 2,
+                             ("cluster:external:raw.sales", "report"): 1,
+                             ("cluster:cte:orders", "orders"): 2}
+
+    members, member_edges = clustered.expand("cluster:external:raw.sales")
+    assert sorted(node["id"] for node in members) == ["raw.sales.o1", "raw.sales.o2"]
+    assert len(member_edges) == 3
+    assert clustered.expand("cluster:unknown") is None
+
+    positions = project.layout()
+    first_cte = clustered.members["cluster:cte:orders"][0]["id"]
+    assert clustered.layout(positions)["cluster:cte:orders"] == positions[first_cte]
+    # Expanding every cluster gives back the full graph
+    expanded_ids = {node["id"] for node in clustered.nodes if not is_cluster(node["id"])}
+    for cluster_id in clustered.members:
+        expanded_ids |= {node["id"] for node in clustered.expand(cluster_id)[0]}
+    assert expanded_ids == {node["id"] for node in nodes}
+
+
+def test_small_groups_stay_unclustered():
+    nodes = [{"id": "raw.a.t", "data": {"label": "t", "layer": "external",
+                                        "details": {"project": "raw", "dataset": "a"}}},
+             {"id": "x", "data": {"label": "x", "layer": "gold", "details": {}}}]
+    edges = [{"id": "raw.a.t-x", "source": "raw.a.t", "target": "x"}]
+    clustered = ClusteredGraph(nodes, edges)
+    assert clustered.nodes == nodes and clustered.edges == edges
@@ -0,0 +1,44 @@
+import gzip
+import json
+import pytest
+from sql_dag_flow.diagram import write_diagram, read_diagram, iter_diagram_json, DiagramFormatError, CHUNK_RECORDS
+
+NODES = [{"id": f"t{i}", "type": "custom", "position": {"x": i, "y": -i},
+          "data": {"label": f"t{i}", "details": {"content": "SELECT 1 -- \"quoted\"\n"}}}
+         for i in range(CHUNK_RECORDS + 3)]
+EDGES = [{"id": "e1", "source": "t0", "target": "t1"}]
+VIEWPORT = {"x": 10, "y": 20, "zoom": 0.5}
+
+
+@pytest.mark.parametrize("filename", ["diagram.ndjson", "diagram.ndjson.gz"])
+def test_streaming_diagram_round_trip(tmp_path, filename):
+    path = str(tmp_path / filename)
+    write_diagram(path, NODES, EDGES, viewport=VIEWPORT, metadata={"title": "T"})
+
+    data = read_diagram(path)
+    assert data["nodes"] == NODES
+    assert data["edges"] == EDGES
+    assert data["viewport"] == VIEWPORT
+    assert data["metadata"] == {"title": "T"}
+
+    positions = read_diagram(path, positions_only=True)
+    assert positions["nodes"][3] == {"id": "t3", "position": {"x": 3, "y": -3}}
+    assert positions["edges"] == []
+    if filename.endswith(".gz"):
+        with gzip.open(path, "rt") as f:
+            assert json.loads(f.readline())["nodeCount"] == len(NODES)
+
+
+def test_empty_and_legacy_diagrams(tmp_path):
+    path = str(tmp_path / "empty.ndjson")
+    write_diagram(path, [], [])
+    assert read_diagram(path) == {"metadata": {}, "nodes": [], "edges": [], "viewport": {"x": 0, "y": 0, "zoom": 1}}
+
+    legacy = tmp_path / "sql_diagram.json"
+    legacy.write_text(json.dumps({"nodes": NODES[:2], "edges": EDGES, "viewport": VIEWPORT, "metadata": {}}, indent=4))
+    assert read_diagram(str(legacy))["nodes"] == NODES[:2]
+    assert read_diagram(str(legacy), positions_only=True)["nodes"][1] == {"id": "t1", "position": {"x": 1, "y": -1}}
+
+    (tmp_path / "bad.ndjson").write_text('{"nodes": []}\n')
+    with pytest.raises(DiagramFormatError):
+        iter_diagram_json(str(tmp_path / "bad.ndjson"))
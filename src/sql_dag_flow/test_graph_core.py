@@ -0,0 +1,52 @@
+import pytest
+from sql_dag_flow.graph_core import GraphCore, EDGE_CTE, EDGE_STYLES, EDGE_TABLE
+from sql_dag_flow.parser import build_graph_core
+
+
+def details(label, dependencies=()):
+    return {"label": label, "layer": "silver", "type": "table", "project": "default", "dataset": "default",
+            "path": f"{label}.sql", "dependencies": list(dependencies), "content": ""}
+
+
+TABLES = {
+    "raw": details("raw", ["ext.source"]),
+    "clean": details("clean", ["raw"]),
+    "mart": details("mart", ["clean", "raw"]),
+}
+
+
+def test_interned_ids_and_csr_adjacency():
+    core = build_graph_core(TABLES, discovery_mode=True)
+
+    assert core.ids == ["raw", "clean", "mart", "ext.source"]
+    raw, clean, mart, ghost = range(4)
+    assert list(core.successors(raw)) == [clean, mart]
+    assert list(core.predecessors(mart)) == [clean, raw]
+    assert list(core.predecessors(raw)) == [ghost]
+    assert [(r.incoming, r.nested) for r in core.records] == [(1, 1), (1, 2), (2, 3), (0, 0)]
+    # Details are shared with the parsed tables, not copied
+    assert core.records[clean].details is TABLES["clean"]
+
+
+def test_render_shares_edge_styles():
+    core = GraphCore()
+    a = core.add_node("a", details("a"))
+    b = core.add_node("b", details("b"))
+    core.add_edge(a, b, EDGE_TABLE)
+    core.add_edge(a, b, EDGE_CTE)
+    core.compute_nested_counts()
+
+    nodes, edges = core.render()
+    assert [n["data"]["nestedCount"] for n in nodes] == [0, 1]
+    assert [n["data"]["incomingCount"] for n in nodes] == [0, 2]
+    assert edges[0] == {"id": "a-b", "source": "a", "target": "b", "animated": True, "style": {"stroke": "#b1b1b7"}}
+    assert edges[1]["style"] is EDGE_STYLES[EDGE_CTE]
+
+
+def test_networkx_export():
+    nx = pytest.importorskip("networkx")
+    graph = build_graph_core(TABLES).to_networkx()
+
+    assert isinstance(graph, nx.DiGraph)
+    assert sorted(graph.edges) == [("clean", "mart"), ("raw", "clean"), ("raw", "mart")]
+    assert graph.nodes["mart"]["layer"] == "silver"
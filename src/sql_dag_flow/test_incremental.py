@@ -0,0 +1,135 @@
+import os
+from collections import Counter
+from sql_dag_flow.cache import ParseCache
+from sql_dag_flow.project import ProjectState
+
+
+def full_graph(project_dir, cache_dir, discovery=False):
+    project = ProjectState(str(project_dir), cache=ParseCache(cache_dir=str(cache_dir)))
+    return project.build(discovery=discovery)
+
+
+def as_sets(nodes, edges):
+    node_set = {(node["id"], node["data"]["incomingCount"], node["data"]["nestedCount"], node["data"]["layer"],
+                 node["data"]["label"]) for node in nodes}
+    return node_set, Counter(edge["id"] for edge in edges)
+
+
+def assert_matches_full_build(project, project_dir, tmp_path):
+    nodes, edges = full_graph(project_dir, tmp_path / "full-cache", discovery=project.config[1])
+    assert as_sets(project.nodes, project.edges) == as_sets(nodes, edges)
+    assert {node["id"] for node in project.nodes} == set(project.details)
+
+
+def make_project(tmp_path, files, discovery=False):
+    project_dir = tmp_path / "project"
+    project_dir.mkdir()
+    for name, sql in files.items():
+        (project_dir / name).write_text(sql)
+    project = ProjectState(str(project_dir), cache=ParseCache(cache_dir=str(tmp_path / "cache")))
+    project.build(discovery=discovery)
+    return project, project_dir
+
+
+def test_add_modify_delete_and_rename_patch_the_graph(tmp_path):
+    project, project_dir = make_project(tmp_path, {
+        "a.sql": "CREATE TABLE a AS SELECT * FROM raw.src",
+        "b.sql": "CREATE TABLE b AS SELECT * FROM a",
+        "c.sql": "CREATE TABLE c AS SELECT * FROM b JOIN d USING (id)",
+    }, discovery=True)
+    version = project.version
+    # d is a ghost node until a file defines it
+    assert {node["id"] for node in project.nodes} == {"a", "b", "c", "raw.src", "d"}
+
+    # Added: the ghost d becomes a table; c already counted d, a is reached twice now
+    (project_dir / "d.sql").write_text("CREATE TABLE d AS SELECT * FROM a")
+    delta = project.apply_changes([{"event": "created", "path": str(project_dir / "d.sql")}])
+    assert delta["version"] == version + 1
+    updated = {node["id"]: node for node in delta["nodes"]["updated"]}
+    assert set(updated) == {"d"}
+    assert updated["d"]["data"]["layer"] != "external" and updated["d"]["data"]["incomingCount"] == 1
+    assert [edge["id"] for edge in delta["edges"]["added"]] == ["a-d"]
+    assert delta["nodes"]["added"] == delta["nodes"]["removed"] == delta["edges"]["removed"] == []
+    assert_matches_full_build(project, project_dir, tmp_path / "1")
+
+    # Modified: b stops reading a; c still reaches a through d
+    (project_dir / "b.sql").write_text("CREATE TABLE b AS SELECT 1 AS id")
+    delta = project.apply_changes([{"event": "modified", "path": str(project_dir / "b.sql")}])
+    assert delta["edges"] == {"added": [], "removed": ["a-b"]}
+    assert [node["id"] for node in delta["nodes"]["updated"]] == ["b"]
+    assert_matches_full_build(project, project_dir, tmp_path / "2")
+
+    # Deleted: a goes away and d's reference to it becomes a ghost node
+    (project_dir / "a.sql").unlink()
+    delta = project.apply_changes([{"event": "deleted", "path": str(project_dir / "a.sql")}])
+    assert delta["nodes"]["removed"] == ["raw.src"]
+    assert {node["id"] for node in delta["nodes"]["updated"]} == {"a", "d", "c"}
+    assert next(node for node in delta["nodes"]["updated"] if node["id"] == "a")["data"]["layer"] == "external"
+    assert delta["edges"] == {"added": [], "removed": ["raw.src-a"]}
+    assert_matches_full_build(project, project_dir, tmp_path / "3")
+
+    # Renamed: node ids follow file names, c's reference to d now resolves to e by its label
+    os.rename(project_dir / "d.sql", project_dir / "e.sql")
+    delta = project.apply_changes([{"event": "renamed", "path": str(project_dir / "e.sql"),
+                                    "src_path": str(project_dir / "d.sql")}])
+    assert [node["id"] for node in delta["nodes"]["added"]] == ["e"]
+    assert delta["nodes"]["removed"] == ["d"] and delta["nodes"]["updated"] == []
+    assert sorted(edge["id"] for edge in delta["edges"]["added"]) == ["a-e", "e-c"]
+    assert sorted(delta["edges"]["removed"]) == ["a-d", "d-c"]
+    assert project.details["e"]["path"] == str(project_dir / "e.sql")
+    assert_matches_full_build(project, project_dir, tmp_path / "4")
+
+
+def test_only_affected_nodes_are_sent(tmp_path):
+    files = {f"t{i}.sql": f"CREATE TABLE t{i} AS SELECT * FROM t{i - 1}" for i in range(1, 20)}
+    files["t0.sql"] = "CREATE TABLE t0 AS SELECT 1 AS id"
+    files["other.sql"] = "CREATE TABLE other AS SELECT 1 AS id"
+    project, project_dir = make_project(tmp_path, files)
+
+    (project_dir / "t15.sql").write_text("CREATE TABLE t15 AS SELECT * FROM other")
+    delta = project.apply_changes([{"event": "modified", "path": str(project_dir / "t15.sql")}])
+    assert {node["id"] for node in delta["nodes"]["updated"]} == {f"t{i}" for i in range(15, 20)}
+    assert [edge["id"] for edge in delta["edges"]["added"]] == ["other-t15"]
+    assert delta["edges"]["removed"] == ["t14-t15"]
+    assert_matches_full_build(project, project_dir, tmp_path)
+
+
+def test_discovery_ctes_and_ambiguities_follow_changes(tmp_path):
+    project, project_dir = make_project(tmp_path, {
+        "x.sql": "CREATE TABLE x AS WITH base AS (SELECT * FROM raw.s) SELECT * FROM base",
+        "y.sql": "CREATE TABLE y AS SELECT * FROM t",
+        "t1.sql": "CREATE TABLE p1.t AS SELECT 1 AS id",
+    }, discovery=True)
+    assert project.ambiguities == []
+
+    (project_dir / "t2.sql").write_text("CREATE TABLE p2.t AS SELECT 1 AS id")
+    project.apply_changes([{"event": "created", "path": str(project_dir / "t2.sql")}])
+    assert [item["reference"] for item in project.ambiguities] == ["t"]
+    assert_matches_full_build(project, project_dir, tmp_path / "1")
+
+    (project_dir / "x.sql").write_text("CREATE TABLE x AS SELECT * FROM raw.s")
+    delta = project.apply_changes([{"event": "modified", "path": str(project_dir / "x.sql")}])
+    assert [node_id for node_id in delta["nodes"]["removed"] if node_id.startswith("cte:")]
+    assert_matches_full_build(project, project_dir, tmp_path / "2")
+
+
+def test_same_file_name_in_two_folders_follows_the_walk_order(tmp_path):
+    project, project_dir = make_project(tmp_path, {
+        "a.sql": "CREATE TABLE a AS SELECT 1 AS id",
+        "b.sql": "CREATE TABLE b AS SELECT * FROM f1",
+    })
+    (project_dir / "sub").mkdir()
+    (project_dir / "sub" / "f1.sql").write_text("CREATE TABLE d AS SELECT 1 AS id")
+    project.apply_changes([{"event": "created", "path": str(project_dir / "sub" / "f1.sql")}])
+    assert project.details["f1"]["label"] == "d"
+
+    # Created later but walked first: the file in the subfolder still defines f1
+    (project_dir / "f1.sql").write_text("CREATE TABLE c AS SELECT * FROM a")
+    project.apply_changes([{"event": "created", "path": str(project_dir / "f1.sql")}])
+    assert project.details["f1"]["label"] == "d"
+    assert_matches_full_build(project, project_dir, tmp_path / "1")
+
+    (project_dir / "sub" / "f1.sql").unlink()
+    delta = project.apply_changes([{"event": "deleted", "path": str(project_dir / "sub" / "f1.sql")}])
+    assert [node["data"]["label"] for node in delta["nodes"]["updated"] if node["id"] == "f1"] == ["c"]
+    assert_matches_full_build(project, project_dir, tmp_path / "2")
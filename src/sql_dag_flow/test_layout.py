@@ -0,0 +1,67 @@
+from sql_dag_flow.parser import build_graph
+from sql_dag_flow.layout import LayeredLayout, RANK_SPACING
+from sql_dag_flow.project import ProjectState
+
+
+def table(label, layer, dependencies=()):
+    return {"label": label, "layer": layer, "type": "table", "project": "default", "dataset": "default",
+            "path": f"{label}.sql", "dependencies": list(dependencies), "content": ""}
+
+
+TABLES = {
+    "orders": table("orders", "bronze", ["raw.orders_dump"]),
+    "users": table("users", "bronze"),
+    "clean_orders": table("clean_orders", "silver", ["orders"]),
+    "clean_users": table("clean_users", "silver", ["users"]),
+    "report": table("report", "gold", ["clean_orders", "clean_users", "users"]),
+    # A cycle: both members share a rank
+    "a": table("a", "silver", ["b", "orders"]),
+    "b": table("b", "silver", ["a"]),
+}
+
+
+def test_edges_point_right_and_ranks_group_medallion_layers():
+    nodes, edges = build_graph(TABLES, discovery_mode=True)
+    positions = LayeredLayout().update(nodes, edges)
+    x = {node_id: position[0] for node_id, position in positions.items()}
+
+    for edge in edges:
+        if {edge["source"], edge["target"]} != {"a", "b"}:
+            assert x[edge["source"]] < x[edge["target"]]
+    assert x["a"] == x["b"]
+    # Sources sit next to their first consumer
+    assert x["raw.orders_dump"] == x["orders"] - RANK_SPACING
+    # External tables above bronze ones within a rank
+    assert x["users"] == x["raw.orders_dump"]
+    assert positions["raw.orders_dump"][1] < positions["users"][1]
+
+
+def test_incremental_update_keeps_untouched_ranks():
+    nodes, edges = build_graph(TABLES)
+    layout = LayeredLayout()
+    before = layout.update(nodes, edges)
+
+    changed = dict(TABLES, report=table("report", "gold", ["clean_orders", "clean_users", "users", "a"]))
+    nodes, edges = build_graph(changed)
+    after = layout.update(nodes, edges)
+
+    touched = {before["report"][0], after["report"][0], before["a"][0]}
+    for node_id, position in before.items():
+        if position[0] not in touched:
+            assert after[node_id] == position
+
+
+def test_project_layout_is_cached_by_fingerprint(tmp_path):
+    (tmp_path / "a.sql").write_text("CREATE TABLE a AS SELECT 1 AS x")
+    (tmp_path / "b.sql").write_text("CREATE TABLE b AS SELECT x FROM a")
+    project = ProjectState(str(tmp_path))
+    project.build(fingerprint=project.compute_fingerprint())
+
+    positions = project.layout()
+    assert positions["a"][0] < positions["b"][0]
+    assert project.layout() is positions
+
+    project.build(fingerprint="other")
+    assert project.layout() is not positions
+    project.build(fingerprint=project.compute_fingerprint())
+    assert project.layout() is positions
@@ -0,0 +1,81 @@
+from sql_dag_flow.parser import parse_sql_file
+from sql_dag_flow.resolver import TableResolver
+from sql_dag_flow.lineage import ColumnLineage
+
+
+def parse_project(tmp_path, files):
+    tables = {}
+    for name, sql in files.items():
+        path = tmp_path / name
+        path.write_text(sql)
+        tables.update(parse_sql_file(str(path)))
+    return tables, TableResolver.from_tables(tables)
+
+
+def sources(result):
+    return {c["column"]: sorted(f"{s['node'] or s['table']}.{s['column']}" for s in c["sources"])
+            for c in result["columns"]}
+
+
+def test_star_expansion_uses_upstream_create_statements(tmp_path):
+    tables, resolver = parse_project(tmp_path, {
+        "orders.sql": "CREATE TABLE sales.orders (id INT64, user_id INT64, amount NUMERIC)",
+        "users.sql": "CREATE TABLE crm.users AS SELECT id, name FROM raw.users_dump",
+        "report.sql": """
+            CREATE TABLE gold.report AS
+            WITH enriched AS (
+                SELECT o.*, u.name FROM sales.orders o JOIN crm.users u ON o.user_id = u.id
+            )
+            SELECT id, name, amount * 2 AS double_amount FROM enriched
+        """,
+    })
+    lineage = ColumnLineage()
+
+    assert sources(lineage.node_lineage("report", tables, resolver)) == {
+        "id": ["orders.id"],
+        "name": ["users.name"],
+        "double_amount": ["orders.amount"],
+    }
+    assert sources(lineage.node_lineage("orders", tables, resolver)) == {
+        "id": [], "user_id": [], "amount": [],
+    }
+    # External tables are reported by name
+    assert sources(lineage.node_lineage("users", tables, resolver))["name"] == ["raw.users_dump.name"]
+
+
+def test_results_are_memoised_by_content(tmp_path):
+    tables, resolver = parse_project(tmp_path, {
+        "a.sql": "CREATE TABLE a AS SELECT x FROM src",
+    })
+    lineage = ColumnLineage()
+    first = lineage.node_lineage("a", tables, resolver)
+    assert lineage.node_lineage("a", tables, resolver) is first
+
+    tables["a"] = dict(tables["a"], content="CREATE TABLE a AS SELECT y FROM src")
+    lineage.reset_catalog()
+    assert sources(lineage.node_lineage("a", tables, resolver)) == {"y": ["src.y"]}
+    assert lineage.node_lineage("missing", tables, resolver) is None
+
+
+def test_repeat_requests_skip_parsing(tmp_path, monkeypatch):
+    from sql_dag_flow import lineage as lineage_module
+    tables, resolver = parse_project(tmp_path, {
+        "a.sql": "CREATE TABLE a AS SELECT x, y FROM src",
+        "b.sql": "CREATE TABLE b AS SELECT * FROM a",
+    })
+    lineage = ColumnLineage()
+    first = lineage.node_lineage("b", tables, resolver)
+    assert sources(first) == {"x": ["a.x"], "y": ["a.y"]}
+
+    parsed = []
+    statement_for = lineage_module._statement_for
+    monkeypatch.setattr(lineage_module, "_statement_for", lambda *args: parsed.append(args) or statement_for(*args))
+    lineage.reset_catalog() # A rebuild with the same files
+    assert lineage.node_lineage("b", tables, resolver) is first
+    assert parsed == []
+
+    # An upstream change is a miss: b's star now expands to other columns
+    tables["a"] = dict(tables["a"], content="CREATE TABLE a AS SELECT z FROM src")
+    lineage.reset_catalog()
+    assert sources(lineage.node_lineage("b", tables, resolver)) == {"z": ["a.z"]}
+    assert parsed
@@ -0,0 +1,85 @@
+import shutil
+import subprocess
+import pytest
+from sql_dag_flow.cache import ParseCache, content_hash
+from sql_dag_flow.lineage_diff import diff_lineage, open_revision, DirectoryRevision, DiffError
+
+FILES = {
+    "bronze/orders.sql": "CREATE TABLE orders AS SELECT * FROM raw.orders",
+    "bronze/users.sql": "CREATE TABLE users AS SELECT * FROM raw.users",
+    "silver/clean_orders.sql": "CREATE TABLE clean_orders AS SELECT * FROM orders",
+    "gold/report.sql": "CREATE TABLE report AS SELECT * FROM clean_orders JOIN users USING (id)",
+    "gold/other.sql": "CREATE TABLE other AS SELECT * FROM users",
+}
+
+
+def write_tree(root, files):
+    for rel, sql in files.items():
+        path = root / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(sql)
+
+
+def change(files):
+    changed = dict(files)
+    changed["bronze/orders.sql"] = "CREATE TABLE orders AS SELECT id FROM raw.orders_v2"
+    del changed["gold/other.sql"]
+    changed["gold/kpis.sql"] = "CREATE TABLE kpis AS SELECT * FROM report"
+    return changed
+
+
+def test_directory_diff_reports_changes_and_impact(tmp_path):
+    write_tree(tmp_path / "base", FILES)
+    write_tree(tmp_path / "head", change(FILES))
+
+    result = diff_lineage(DirectoryRevision(str(tmp_path / "base")), DirectoryRevision(str(tmp_path / "head")))
+    assert result["files"] == {"added": ["gold/kpis.sql"], "removed": ["gold/other.sql"],
+                               "modified": ["bronze/orders.sql"]}
+    assert result["nodes"] == {"added": ["kpis"], "removed": ["other"], "modified": ["orders"]}
+    assert result["edges"]["added"] == [{"source": "report", "target": "kpis"}]
+    assert result["edges"]["removed"] == [{"source": "users", "target": "other"}]
+    assert result["impacted"] == ["clean_orders", "report"]
+    # Unchanged files are parsed once for both sides, differing ones once per side
+    assert result["stats"]["parsed"] == 3 + 2 + 2
+
+
+@pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+def test_git_refs_and_working_tree(tmp_path):
+    def git(*args):
+        subprocess.run(["git", "-C", str(tmp_path), *args], check=True, capture_output=True)
+
+    write_tree(tmp_path, FILES)
+    git("init", "-q")
+    git("add", ".")
+    git("-c", "user.name=t", "-c", "user.email=t@t", "commit", "-qm", "base")
+    (tmp_path / "gold" / "other.sql").unlink()
+    write_tree(tmp_path, change(FILES))
+
+    cache = ParseCache(cache_dir=str(tmp_path / ".cache"))
+    result = diff_lineage(open_revision("HEAD", str(tmp_path)), open_revision(None, str(tmp_path)), cache=cache)
+    assert result["nodes"] == {"added": ["kpis"], "removed": ["other"], "modified": ["orders"]}
+    assert result["impacted"] == ["clean_orders", "report"]
+
+    # The base side is cached without the working tree file's stat, so it is never served for it
+    orders = tmp_path / "bronze" / "orders.sql"
+    assert cache.file_hash(str(orders)) == content_hash(orders.read_text())
+    again = diff_lineage(open_revision("HEAD", str(tmp_path)), open_revision(None, str(tmp_path)), cache=cache)
+    # Both versions of orders.sql share one cache entry; everything else is served from the cache
+    assert again["stats"]["parsed"] == 2
+
+    with pytest.raises(DiffError):
+        open_revision("no-such-ref", str(tmp_path))
+
+
+@pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+def test_directories_outside_the_allowed_roots_are_git_refs(tmp_path):
+    project, elsewhere = tmp_path / "project", tmp_path / "elsewhere"
+    write_tree(project / "base", FILES)
+    write_tree(elsewhere, FILES)
+    roots = [str(project)]
+
+    assert isinstance(open_revision(str(project / "base"), str(project), allowed_roots=roots), DirectoryRevision)
+    assert isinstance(open_revision(str(elsewhere), str(project)), DirectoryRevision) # CLI: any directory
+    for spec in (str(elsewhere), str(project / "base" / ".." / ".." / "elsewhere"), "--output=x"):
+        with pytest.raises(DiffError):
+            open_revision(spec, str(project), allowed_roots=roots)
@@ -0,0 +1,104 @@
+import os
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from sql_dag_flow import main
+from sql_dag_flow.builds import BuildCoordinator
+from sql_dag_flow.registry import ProjectRegistry
+
+
+@pytest.fixture
+def project_dir(tmp_path, monkeypatch):
+    project_dir = tmp_path / "project"
+    (project_dir / "gold").mkdir(parents=True)
+    (project_dir / "silver").mkdir()
+    (project_dir / "silver" / "orders.sql").write_text(
+        "CREATE TABLE orders AS WITH base AS (SELECT * FROM raw.o) SELECT * FROM base")
+    (project_dir / "gold" / "report.sql").write_text("CREATE TABLE report AS SELECT * FROM orders")
+    monkeypatch.setattr(main, "CURRENT_DIRECTORY", str(project_dir))
+    monkeypatch.setattr(main, "REGISTRY", ProjectRegistry(cache_root=str(tmp_path / "cache")))
+    return project_dir
+
+
+def test_client_workers_are_clamped_to_the_cpu_count():
+    assert main.request_workers(None) == main.PARSE_WORKERS
+    assert main.request_workers(10_000) == (os.cpu_count() or 1)
+    assert main.request_workers(0) == (os.cpu_count() or 1)
+    assert main.request_workers(1) == 1
+    with pytest.raises(HTTPException):
+        main.request_workers("many")
+
+
+def test_node_sql_outside_the_current_build(project_dir):
+    client = TestClient(main.app)
+    graph = client.post("/graph/filtered", json={"subfolders": ["gold"]}).json()
+    assert {node["id"] for node in graph["nodes"]} == {"report"}
+
+    response = client.get("/node/sql", params={"id": "orders"})
+    assert response.status_code == 200
+    assert response.json()["content"].startswith("CREATE TABLE orders")
+    cte = client.get("/node/sql", params={"id": "cte:orders:base"}).json()
+    assert cte["content"].startswith("base AS (")
+    assert client.get("/node/sql", params={"id": "missing"}).status_code == 404
+    assert client.get("/node/sql", params={"id": "cte:orders:missing"}).status_code == 404
+
+
+def test_node_sql_after_a_restart(project_dir, tmp_path, monkeypatch):
+    client = TestClient(main.app)
+    client.get("/graph")
+    sql = client.get("/node/sql", params={"id": "report"}).json()
+
+    # A new process whose browser still shows the graph it loaded before: nothing is built yet
+    monkeypatch.setattr(main, "REGISTRY", ProjectRegistry(cache_root=str(tmp_path / "cache")))
+    client = TestClient(main.app)
+    assert client.get("/node/sql", params={"id": "report"}).json() == sql
+    assert main.get_project().config is None
+
+
+def test_endpoints_served_from_the_last_build_go_through_the_build_pool(project_dir, monkeypatch):
+    client = TestClient(main.app)
+    endpoints = [("/graph/subgraph", {"id": "report"}), ("/graph/analytics", {}), ("/search", {"q": "orders"}),
+                 ("/graph/cluster", {"id": "cluster:external:raw"})]
+    monkeypatch.setattr(main, "BUILDS", BuildCoordinator(max_pending=0))
+    for path, params in endpoints:
+        assert client.get(path, params=params).status_code == 503
+
+    monkeypatch.setattr(main, "BUILDS", BuildCoordinator())
+    assert client.get("/graph/subgraph", params={"id": "report"}).json()["root"] == "report"
+    assert client.get("/search", params={"q": "orders"}).json()["total"] == 2
+    # Built for this dialect/discovery mode already: no build needed, even with a full queue
+    monkeypatch.setattr(main, "BUILDS", BuildCoordinator(max_pending=0))
+    assert client.get("/graph/analytics").json()["summary"]["nodes"] == 2
+
+
+def test_graph_payload_matches_the_build_it_came_from(project_dir, monkeypatch):
+    project = main.get_project()
+    build = project.build
+
+    def racing_build(**kwargs):
+        graph = build(**kwargs)
+        # Another request builds the gold folder alone before this one writes its response
+        build(dialect=kwargs["dialect"], discovery=kwargs["discovery"], subfolders=["gold"])
+        return graph
+
+    monkeypatch.setattr(project, "build", racing_build)
+    client = TestClient(main.app)
+    graph = client.post("/graph/filtered", json={"subfolders": ["silver", "gold"], "layout": True,
+                                                 "analytics": True}).json()
+
+    assert {node["id"] for node in graph["nodes"]} == {"orders", "report"}
+    assert set(graph["layout"]) >= {"orders", "report"}
+    assert {node["id"]: node["data"]["descendantCount"] for node in graph["nodes"]} == {"orders": 1, "report": 0}
+    assert graph["version"] != project.version
+
+
+def test_progressive_graph_goes_through_the_build_pool(project_dir, monkeypatch):
+    client = TestClient(main.app)
+    monkeypatch.setattr(main, "BUILDS", BuildCoordinator(max_pending=0))
+    assert client.get("/graph/progressive").status_code == 503
+
+    monkeypatch.setattr(main, "BUILDS", BuildCoordinator())
+    events = [line[len("event: "):] for line in client.get("/graph/progressive").text.splitlines()
+              if line.startswith("event: ")]
+    assert events == ["skeleton", "refine", "done"]
+    assert main.get_project().is_current("bigquery", False, None)
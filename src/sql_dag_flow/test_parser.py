@@ -1,6 +1,6 @@
 import os
 import json
-from parser import parse_sql_files, build_graph
+from sql_dag_flow.parser import parse_sql_files, build_graph
 
 def test_parser():
     # Path to sql_examples
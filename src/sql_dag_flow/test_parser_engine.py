@@ -0,0 +1,104 @@
+import os
+import json
+import pytest
+from sql_dag_flow.parser import parse_sql_files, MAX_PARSE_BYTES
+
+EXAMPLES_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "sql_examples"))
+
+
+def test_parallel_parse_matches_serial():
+    serial = parse_sql_files(EXAMPLES_DIR)
+    stats = {}
+    parallel = parse_sql_files(EXAMPLES_DIR, workers=2, chunksize=1, stats=stats)
+
+    assert stats["workers"] == 2
+    assert list(parallel) == list(serial)
+    assert json.dumps(parallel) == json.dumps(serial)
+
+
+def test_count_ancestors_matches_networkx_with_cycles():
+    import random
+    nx = pytest.importorskip("networkx")
+    from sql_dag_flow.graph_core import count_ancestors
+
+    rng = random.Random(7)
+    for _ in range(20):
+        node_count = rng.randint(1, 60)
+        edges = [(f"n{rng.randrange(node_count)}", f"n{rng.randrange(node_count)}")
+                 for _ in range(rng.randint(0, node_count * 3))]
+
+        G = nx.DiGraph()
+        G.add_edges_from(edges)
+        expected = {n: len(nx.ancestors(G, n)) for n in G.nodes}
+        assert count_ancestors(edges) == expected
+
+
+def test_multi_statement_script_emits_one_node_per_target(tmp_path):
+    from sql_dag_flow.parser import parse_sql_file
+
+    script = tmp_path / "silver" / "load_orders.sql"
+    script.parent.mkdir()
+    script.write_text("""
+        DECLARE cutoff DATE DEFAULT (SELECT MAX(day) FROM ds.calendar);
+        CREATE OR REPLACE TABLE proj.ds.orders AS
+            WITH recent AS (SELECT * FROM ds.orders_raw)
+            SELECT * FROM recent;
+        INSERT INTO ds.orders_audit (id) SELECT id FROM proj.ds.orders JOIN ds.users USING (id);
+        MERGE ds.orders_audit T USING ds.refunds S ON T.id = S.id
+            WHEN MATCHED THEN UPDATE SET id = S.id;
+    """)
+
+    records = parse_sql_file(str(script))
+    assert list(records) == ["load_orders", "load_orders:ds.orders_audit"]
+
+    orders = records["load_orders"]
+    assert (orders["project"], orders["dataset"], orders["label"]) == ("proj", "ds", "orders")
+    assert orders["dependencies"] == ["cte:load_orders:recent", "ds.orders_raw", "ds.calendar"]
+
+    audit = records["load_orders:ds.orders_audit"]
+    assert audit["label"] == "orders_audit" and audit["type"] == "table"
+    assert audit["dependencies"] == ["proj.ds.orders", "ds.users", "ds.refunds", "ds.calendar"]
+
+
+def test_create_with_column_list_is_not_its_own_dependency(tmp_path):
+    from sql_dag_flow.parser import parse_sql_file
+
+    ddl = tmp_path / "raw_users.sql"
+    ddl.write_text("CREATE TABLE bronze_ds.users (id INT64, name STRING)")
+
+    record = parse_sql_file(str(ddl))["raw_users"]
+    assert (record["dataset"], record["label"], record["dependencies"]) == ("bronze_ds", "users", [])
+
+
+def test_oversized_files_take_the_fast_path(tmp_path):
+    from sql_dag_flow.parser import parse_files
+
+    script = tmp_path / "gold" / "big.sql"
+    script.parent.mkdir()
+    rows = ",\n".join(f"({i}, 'FROM not_a_table {i}')" for i in range(2000))
+    script.write_text(f"INSERT INTO gold.big (id, note) VALUES\n{rows};\n"
+                      "INSERT INTO gold.big SELECT id, note FROM silver.src s JOIN UNNEST(s.tags) t -- FROM x\n")
+
+    stats = {}
+    [(_, records)] = parse_files([str(script)], max_bytes=1000, stats=stats)
+
+    assert stats["degraded"] == 1
+    assert records["big"]["degraded"] == "size"
+    assert records["big"]["dependencies"] == ["silver.src"]
+
+    # Generated files past MAX_PARSE_BYTES take the fast path by default, with no time budget needed
+    rows = ",\n".join(f"({i}, 'row {i:08d}')" for i in range(60000))
+    script.write_text(f"INSERT INTO gold.big (id, note) VALUES\n{rows};\n")
+    assert script.stat().st_size > MAX_PARSE_BYTES
+    [(_, records)] = parse_files([str(script)])
+    assert records["big"]["degraded"] == "size"
+
+
+def test_isolated_parsing_matches_in_process():
+    from sql_dag_flow.parser import parse_files
+    from sql_dag_flow.scanner import iter_sql_files
+
+    filepaths = list(iter_sql_files(EXAMPLES_DIR))
+    isolated = parse_files(filepaths, timeout=30, workers=2)
+
+    assert json.dumps(isolated) == json.dumps(parse_files(filepaths))
@@ -0,0 +1,66 @@
+import os
+import pytest
+from sql_dag_flow.cache import ParseCache
+from sql_dag_flow.parser import compact_nodes
+from sql_dag_flow.project import ProjectState, REFINE_MIN_BATCH
+
+
+def test_progressive_build_converges_to_full_build(tmp_path):
+    project_dir = tmp_path / "project"
+    project_dir.mkdir()
+    for i in range(REFINE_MIN_BATCH + 5):
+        (project_dir / f"t{i}.sql").write_text(
+            f"CREATE TABLE t{i} AS WITH base AS (SELECT * FROM t{i - 1}) SELECT * FROM base" if i else
+            "CREATE TABLE t0 AS SELECT 1 AS x")
+    cache = ParseCache(cache_dir=str(tmp_path / "cache"))
+    project = ProjectState(str(project_dir), cache=cache)
+
+    events = list(project.build_progressive(discovery=True, layout=True))
+    names = [name for name, _ in events]
+    assert names == ["skeleton", "refine", "refine", "done"]
+    skeleton = events[0][1]
+    assert skeleton["stats"] == {"files": REFINE_MIN_BATCH + 5, "pending": REFINE_MIN_BATCH + 5}
+    assert set(skeleton["layout"]) == {node["id"] for node in skeleton["nodes"]}
+    assert events[2][1]["pending"] == 0
+
+    nodes = {node["id"]: node for node in skeleton["nodes"]}
+    edges = {edge["id"]: edge for edge in skeleton["edges"]}
+    for name, delta in events[1:3]:
+        for node_id in delta["nodes"]["removed"]:
+            del nodes[node_id]
+        nodes.update((node["id"], node) for node in delta["nodes"]["added"] + delta["nodes"]["updated"])
+        for edge_id in delta["edges"]["removed"]:
+            del edges[edge_id]
+        edges.update((edge["id"], edge) for edge in delta["edges"]["added"])
+
+    full = ProjectState(str(project_dir), cache=cache)
+    full_nodes, full_edges = full.build(discovery=True)
+    assert nodes == {node["id"]: node for node in compact_nodes(full_nodes)}
+    assert set(edges) == {edge["id"] for edge in full_edges}
+
+    # Everything is cached now: the skeleton is already the full graph
+    assert [name for name, _ in project.build_progressive(discovery=True)] == ["skeleton", "done"]
+
+
+def test_stopping_early_leaves_no_partial_graph_behind(tmp_path, monkeypatch):
+    project_dir = tmp_path / "project"
+    project_dir.mkdir()
+    (project_dir / "a.sql").write_text("CREATE TABLE a AS SELECT * FROM raw.x")
+    (project_dir / "b.sql").write_text("CREATE TABLE b AS SELECT * FROM a")
+    for path in project_dir.iterdir():
+        os.utime(path, (1_000_000, 1_000_000)) # Older than RACY_SECONDS
+    cache = ParseCache(cache_dir=str(tmp_path / "cache"))
+    project = ProjectState(str(project_dir), cache=cache)
+
+    events = project.build_progressive()
+    assert next(events)[0] == "skeleton"
+    assert project.config is not None
+    events.close() # The client went away before the refinement
+    assert project.config is None and project.fingerprint is None
+
+    assert [name for name, _ in project.build_progressive()] == ["skeleton", "refine", "done"]
+    # Unchanged files are served by their mtime and size, without hashing them again
+    monkeypatch.setattr(cache, "get", lambda *args, **kwargs: pytest.fail("hashed an unchanged file"))
+    events = project.build_progressive()
+    assert [name for name, _ in events] == ["skeleton", "done"]
+    assert project.config == ("bigquery", False, None)
@@ -0,0 +1,78 @@
+import os
+from sql_dag_flow.registry import ProjectRegistry, project_id
+
+
+def make_project(path, name):
+    path.mkdir()
+    (path / f"{name}.sql").write_text(f"CREATE TABLE {name} AS SELECT 1 AS x")
+    (path / f"{name}_report.sql").write_text(f"CREATE TABLE {name}_report AS SELECT x FROM {name}")
+    return str(path)
+
+
+def test_cold_projects_are_moved_to_disk_and_restored(tmp_path):
+    registry = ProjectRegistry(cache_root=str(tmp_path / "cache"), max_active=1)
+    first = registry.register(make_project(tmp_path / "one", "a"))
+    second = registry.register(make_project(tmp_path / "two", "b"))
+    assert first == project_id(str(tmp_path / "one")) and first != second
+    assert registry.register(str(tmp_path / "one")) == first
+
+    project = registry.get(first)
+    project.build(fingerprint=project.compute_fingerprint())
+    nodes = project.nodes
+    version = project.version
+
+    registry.get(second)
+    assert [p["id"] for p in registry.projects() if p["active"]] == [second]
+    assert os.path.exists(tmp_path / "cache" / "projects" / first / "graph.json")
+
+    restored = registry.get(first)
+    assert restored is not project
+    assert restored.nodes == nodes
+    assert restored.version > version
+    assert restored.config == ("bigquery", False, None)
+
+    # A change while on disk invalidates the snapshot
+    registry.get(second)
+    (tmp_path / "one" / "a.sql").write_text("CREATE TABLE a AS SELECT 2 AS x")
+    assert registry.get(first).config is None
+
+    assert registry.unregister(first)
+    assert registry.get(first) is None
+    assert not registry.unregister(first)
+
+
+def test_loading_happens_outside_the_registry_lock(tmp_path, monkeypatch):
+    import threading
+    from sql_dag_flow.project import ProjectState
+    registry = ProjectRegistry(cache_root=str(tmp_path / "cache"), max_active=1)
+    first = registry.register(make_project(tmp_path / "one", "a"))
+    second = registry.register(make_project(tmp_path / "two", "b"))
+    active = registry.get(first)
+
+    started, release = threading.Event(), threading.Event()
+    load_snapshot = ProjectState.load_snapshot
+    loads = []
+
+    def slow_load(project, path):
+        loads.append(project.project_id)
+        started.set()
+        assert release.wait(5)
+        return load_snapshot(project, path)
+
+    monkeypatch.setattr(ProjectState, "load_snapshot", slow_load)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(registry.get(second))) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    assert started.wait(5)
+    # The registry stays usable while the snapshot is read
+    assert registry.get(first) is active
+    assert len(registry.projects()) == 2
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert loads == [second] # Both requests shared one load
+    assert results[0] is results[1] is registry.get(second)
+    # The evicted project's parse cache is not kept around
+    assert registry.cache(first) is not active.cache
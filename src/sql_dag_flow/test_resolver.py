@@ -0,0 +1,69 @@
+from sql_dag_flow.parser import build_graph
+from sql_dag_flow.resolver import TableResolver
+
+
+def table(label, dataset="default", project="default", dependencies=()):
+    return {"label": label, "layer": "silver", "type": "table", "project": project, "dataset": dataset,
+            "path": f"{label}.sql", "dependencies": list(dependencies), "content": ""}
+
+
+def test_qualifier_conflict_is_not_resolved_by_short_name():
+    tables = {
+        "orders": table("orders", dataset="sales"),
+        "report": table("report", dependencies=["finance.orders", "sales.orders"]),
+    }
+    nodes, edges = build_graph(tables, discovery_mode=True)
+
+    sources = {edge["source"] for edge in edges}
+    assert "orders" in sources
+    # finance.orders is another table, not a fuzzy match of sales.orders
+    assert "finance.orders" in sources
+
+
+def test_collisions_are_reported_and_resolved_deterministically():
+    tables = {
+        "b_users": table("users", dataset="crm"),
+        "a_users": table("users", dataset="app"),
+        "report": table("report", dependencies=["users", "crm.users"]),
+    }
+    resolver = TableResolver.from_tables(tables)
+    resolved = resolver.resolve_all(tables)
+
+    assert resolved["report"] == [("users", "a_users"), ("crm.users", "b_users")]
+    report = resolver.ambiguity_report(tables)
+    assert report == [{"reference": "users", "candidates": ["a_users", "b_users"],
+                       "resolvedTo": "a_users", "referencedBy": ["report"]}]
+
+
+def test_incremental_add_and_remove():
+    resolver = TableResolver()
+    resolver.add("orders", table("orders", dataset="sales"))
+    assert resolver.resolve("sales.orders") == "orders"
+
+    resolver.remove("orders")
+    assert resolver.resolve("sales.orders") is None
+
+    resolver.add("orders_v2", table("orders", dataset="sales"))
+    assert resolver.resolve("sales.orders") == "orders_v2"
+
+
+def test_case_normalisation_follows_dialect():
+    record = table("Orders", dataset="Sales")
+
+    assert TableResolver.from_tables({"Orders": record}, dialect="duckdb").resolve("sales.ORDERS") == "Orders"
+    assert TableResolver.from_tables({"Orders": record}, dialect="snowflake").resolve("SALES.orders") == "Orders"
+    # BigQuery table names are case-sensitive
+    assert TableResolver.from_tables({"Orders": record}, dialect="bigquery").resolve("sales.orders") is None
+
+
+def test_removing_a_node_id_hands_it_to_the_next_one_added():
+    resolver = TableResolver(dialect="duckdb")
+    for node_id in ("Orders", "ORDERS", "orders"):
+        resolver.add(node_id, table("x_" + node_id))
+    assert resolver.resolve("orders") == "Orders"
+
+    resolver.remove("Orders")
+    assert resolver.resolve("orders") == "ORDERS"
+    resolver.add("Orders", table("x_Orders")) # Re-added last
+    resolver.remove("ORDERS")
+    assert resolver.resolve("orders") == "orders"
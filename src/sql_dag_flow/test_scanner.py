@@ -0,0 +1,61 @@
+import os
+from sql_dag_flow.scanner import DirectoryManifest, compile_ignore_pattern, is_ignored, _rules
+
+
+def write(root, rel, content="SELECT 1"):
+    path = root / rel
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content)
+
+
+def names(manifest, subfolders=None):
+    return [os.path.relpath(p, manifest.root).replace(os.sep, "/") for p in manifest.sql_files(subfolders)]
+
+
+def test_ignore_patterns_follow_gitignore_rules():
+    rules = _rules(["# comment", "*.tmp.sql", "build/", "/top.sql", "docs/**/draft.sql", "!keep.tmp.sql"], "")
+    assert is_ignored(rules, "a/b/x.tmp.sql", False)
+    assert not is_ignored(rules, "a/keep.tmp.sql", False)
+    assert is_ignored(rules, "a/build", True) and not is_ignored(rules, "a/build", False)
+    assert is_ignored(rules, "top.sql", False) and not is_ignored(rules, "a/top.sql", False)
+    assert is_ignored(rules, "docs/draft.sql", False) and is_ignored(rules, "docs/a/b/draft.sql", False)
+    assert compile_ignore_pattern("   ") is None
+    # Rules of a nested ignore file only apply below its folder
+    nested = _rules(["*.sql"], "sub")
+    assert is_ignored(nested, "sub/x.sql", False) and not is_ignored(nested, "x.sql", False)
+
+
+def test_manifest_skips_ignored_folders_and_filters_exact_subfolders(tmp_path):
+    for rel in ("a.sql", "models/m.sql", "models/staging/s.sql", "models/old/o.sql", ".git/x.sql",
+                "node_modules/pkg/p.sql", "target/compiled/c.sql", "notes.txt"):
+        write(tmp_path, rel)
+    write(tmp_path, ".gitignore", "old/\n")
+    write(tmp_path, "models/staging/.sqldagflowignore", "s.sql\n")
+
+    manifest = DirectoryManifest(str(tmp_path)).refresh()
+    assert manifest.folders() == ["models", "models/staging"]
+    assert names(manifest) == ["a.sql", "models/m.sql"]
+    # Only files directly inside a selected folder, not in its subfolders
+    assert names(manifest, ["models"]) == ["models/m.sql"]
+    assert names(manifest, [""]) == ["a.sql"]
+    assert names(manifest, ["models/staging", "missing"]) == []
+
+
+def test_refresh_only_lists_changed_folders(tmp_path):
+    write(tmp_path, "a/x.sql")
+    write(tmp_path, "b/y.sql")
+    manifest = DirectoryManifest(str(tmp_path)).refresh()
+    # Pretend every listing is old enough to be trusted
+    for folder in manifest._folders.values():
+        folder.mtime = os.stat(folder.path).st_mtime_ns
+    listings = manifest.listings
+
+    manifest.refresh()
+    assert manifest.listings == listings
+
+    write(tmp_path, "a/new/z.sql")
+    (tmp_path / "b" / "y.sql").unlink()
+    write(tmp_path, ".sqldagflowignore", "x.sql\n")
+    os.utime(tmp_path / "a", ns=(1, 1)) # Changes the folder mtime even on coarse file systems
+    os.utime(tmp_path / "b", ns=(1, 1))
+    assert names(manifest.refresh()) == ["a/new/z.sql"]
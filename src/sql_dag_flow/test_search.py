@@ -0,0 +1,64 @@
+from sql_dag_flow.cache import ParseCache
+from sql_dag_flow.project import ProjectState
+from sql_dag_flow.search import SearchIndex, snippet, tokenize
+
+
+def record(node_id, content, ctes=()):
+    return {"id": node_id, "label": node_id, "path": f"/p/{node_id}.sql", "content": content,
+            "ctes": {name: "" for name in ctes}}
+
+
+def test_ranking_substrings_and_pagination():
+    index = SearchIndex()
+    index.add("orders", record("orders", "SELECT id, customer_id FROM raw.orders"))
+    index.add("customers", record("customers", "SELECT customer_id, name FROM raw.customers"))
+    index.add("report", record("report", "SELECT * FROM orders JOIN customers USING (customer_id)", ctes=["base"]))
+
+    total, page = index.search("customers")
+    assert total == 2
+    assert page[0][0] == "customers" # Name matches outweigh content matches
+
+    # Every term must match; "cust" matches part of customer_id / customers
+    total, page = index.search("cust orders")
+    assert [node_id for node_id, _, _ in page] == ["orders", "report"]
+    assert page[0][2] == {"customer_id", "orders"}
+
+    assert index.search("base")[1][0][0] == "report" # CTE names are indexed
+    assert index.search("cu")[0] == 0 # Too short for a substring match
+    total, page = index.search("customer_id", offset=1, limit=1)
+    assert total == 3 and len(page) == 1
+
+    index.remove("customers")
+    assert index.search("name") == (0, [])
+    assert "name" not in index.postings and not any("name" in tokens for tokens in index.grams.values())
+
+
+def test_snippet_highlights():
+    text = "CREATE TABLE t AS\nSELECT id, Customer_ID FROM s"
+    result = snippet(text, {"customer_id"})
+    assert result["line"] == 2
+    start, end = result["highlights"][0]
+    assert result["text"][start:end] == "Customer_ID"
+    assert snippet(text, {"missing"}) is None
+    assert tokenize("`a.b_c`") == ["a", "b_c"]
+
+
+def test_project_search_follows_file_changes(tmp_path):
+    project_dir = tmp_path / "project"
+    project_dir.mkdir()
+    (project_dir / "a.sql").write_text("CREATE TABLE a AS SELECT 1 AS customer_id")
+    (project_dir / "b.sql").write_text("CREATE TABLE b AS SELECT * FROM a")
+    project = ProjectState(str(project_dir), cache=ParseCache(cache_dir=str(tmp_path / "cache")))
+    project.build()
+
+    result = project.search("customer_id")
+    assert [hit["id"] for hit in result["results"]] == ["a"]
+    assert result["results"][0]["snippet"]["text"].endswith("customer_id")
+
+    (project_dir / "b.sql").write_text("CREATE TABLE b AS SELECT customer_id FROM a")
+    project.apply_changes([{"event": "modified", "path": str(project_dir / "b.sql")}])
+    assert project.search("customer_id")["total"] == 2
+
+    (project_dir / "a.sql").unlink()
+    project.apply_changes([{"event": "deleted", "path": str(project_dir / "a.sql")}])
+    assert [hit["id"] for hit in project.search("customer_id")["results"]] == ["b"]
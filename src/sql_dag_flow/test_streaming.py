@@ -0,0 +1,90 @@
+import gzip
+import json
+import pytest
+from fastapi.testclient import TestClient
+from sql_dag_flow import main, streaming
+from sql_dag_flow.registry import ProjectRegistry
+from sql_dag_flow.streaming import iter_json, compress_chunks, negotiate_encoding
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    project_dir = tmp_path / "project"
+    project_dir.mkdir()
+    for i in range(30):
+        source = f"SELECT * FROM t{i - 1}" if i else "SELECT 1 AS id"
+        (project_dir / f"t{i}.sql").write_text(f"CREATE TABLE t{i} AS {source}")
+    monkeypatch.setattr(main, "CURRENT_DIRECTORY", str(project_dir))
+    monkeypatch.setattr(main, "REGISTRY", ProjectRegistry(cache_root=str(tmp_path / "cache")))
+    return TestClient(main.app)
+
+
+def test_etag_revalidation(client, monkeypatch):
+    response = client.get("/graph")
+    etag = response.headers["ETag"]
+    assert main.SERVER_INSTANCE in etag
+    assert response.headers["Cache-Control"] == "no-cache"
+
+    response = client.get("/graph", headers={"If-None-Match": etag})
+    assert response.status_code == 304 and response.headers["ETag"] == etag
+    assert client.get("/graph", headers={"If-None-Match": f"W/{etag}"}).status_code == 304
+    # Other variants of the same graph have their own tag
+    assert client.get("/graph", params={"compact": True}, headers={"If-None-Match": etag}).status_code == 200
+    assert client.get("/graph", params={"timings": True}, headers={"If-None-Match": etag}).status_code == 200
+
+    # After a restart versions start over, so earlier tags no longer match
+    monkeypatch.setattr(main, "SERVER_INSTANCE", "restarted")
+    response = client.get("/graph", headers={"If-None-Match": etag})
+    assert response.status_code == 200 and response.headers["ETag"] != etag
+
+
+def test_encoding_negotiation(client, monkeypatch):
+    assert negotiate_encoding("gzip, deflate") == "gzip"
+    assert negotiate_encoding("gzip;q=0, identity") is None
+    assert negotiate_encoding(None) is None
+
+    response = client.get("/graph", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert len(response.json()["nodes"]) == 30 # Decoded by the client
+
+    gzip_etag = response.headers["ETag"]
+
+    response = client.get("/graph", headers={"Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in response.headers
+    assert "Accept-Encoding" in response.headers["Vary"]
+    # Each encoding is its own representation, with its own strong tag
+    identity_etag = response.headers["ETag"]
+    assert identity_etag != gzip_etag and not identity_etag.startswith("W/")
+    response = client.get("/graph", headers={"Accept-Encoding": "identity", "If-None-Match": gzip_etag})
+    assert response.status_code == 200
+    response = client.get("/graph", headers={"Accept-Encoding": "gzip", "If-None-Match": gzip_etag})
+    assert response.status_code == 304 and "Accept-Encoding" in response.headers["Vary"]
+
+    # Without the optional brotli package "br" falls back to gzip
+    monkeypatch.setattr(streaming, "brotli", None)
+    assert negotiate_encoding("br, gzip") == "gzip"
+    assert negotiate_encoding("br") is None
+
+
+def test_brotli():
+    brotli = pytest.importorskip("brotli")
+    assert negotiate_encoding("gzip, br") == "br"
+    data = b"".join(compress_chunks(iter_json({"nodes": [{"id": i} for i in range(10)]}), "br"))
+    assert json.loads(brotli.decompress(data)) == {"nodes": [{"id": i} for i in range(10)]}
+
+
+def test_chunked_streaming(client, monkeypatch):
+    monkeypatch.setattr(streaming, "CHUNK_ITEMS", 7)
+    payload = {"nodes": [{"id": i} for i in range(20)], "edges": [], "stats": {"files": 20}}
+    chunks = list(iter_json(payload))
+    assert chunks[:3] == ["{", '"nodes":', "["] and len(chunks) == 13 # 3 node chunks
+    assert json.loads("".join(chunks)) == payload
+    gzipped = list(compress_chunks(iter(chunks), "gzip"))
+    assert json.loads(gzip.decompress(b"".join(gzipped))) == payload
+
+    with client.stream("GET", "/graph", headers={"Accept-Encoding": "identity"}) as response:
+        assert "content-length" not in response.headers # Streamed, not buffered into one body
+        body = b"".join(response.iter_raw())
+    graph = json.loads(body)
+    assert len(graph["nodes"]) == 30 and len(graph["edges"]) == 29
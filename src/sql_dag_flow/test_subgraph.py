@@ -0,0 +1,47 @@
+from sql_dag_flow.parser import build_graph
+from sql_dag_flow.subgraph import GraphIndex
+
+
+def table(label, dependencies=()):
+    return {"label": label, "layer": "silver", "type": "table", "project": "default", "dataset": "default",
+            "path": f"{label}.sql", "dependencies": list(dependencies), "content": ""}
+
+
+# raw -> clean -> mart -> report, clean -> audit, with an external source for raw
+TABLES = {
+    "raw": table("raw", ["ext.source"]),
+    "clean": table("clean", ["raw"]),
+    "mart": table("mart", ["clean", "raw"]),
+    "report": table("report", ["mart"]),
+    "audit": table("audit", ["clean"]),
+}
+
+
+def ids(result):
+    nodes, edges = result
+    return [n["id"] for n in nodes], sorted((e["source"], e["target"]) for e in edges)
+
+
+def test_upstream_and_downstream_closures():
+    index = GraphIndex(*build_graph(TABLES))
+
+    nodes, edges = ids(index.subgraph("mart", "upstream"))
+    assert nodes == ["raw", "clean", "mart"]
+    assert edges == [("clean", "mart"), ("raw", "clean"), ("raw", "mart")]
+
+    assert ids(index.subgraph("clean", "downstream"))[0] == ["clean", "mart", "report", "audit"]
+    assert ids(index.subgraph("clean", "both", depth=1))[0] == ["raw", "clean", "mart", "audit"]
+    assert ids(index.subgraph("report", "upstream", depth=0))[0] == ["report"]
+    assert index.subgraph("missing") is None
+
+
+def test_virtual_nodes_can_be_excluded():
+    index = GraphIndex(*build_graph(TABLES, discovery_mode=True))
+
+    assert "ext.source" in ids(index.subgraph("clean", "upstream"))[0]
+    assert "ext.source" not in ids(index.subgraph("clean", "upstream", include_virtual=False))[0]
+
+
+def test_repeated_queries_are_memoised():
+    index = GraphIndex(*build_graph(TABLES))
+    assert index.subgraph("mart") is index.subgraph("mart")
@@ -0,0 +1,52 @@
+from sql_dag_flow.parser import parse_files, build_graph
+from sql_dag_flow.timings import Timings, Metrics, timed_iter
+
+
+def test_phases_and_slowest_files():
+    timings = Timings()
+    with timings.phase("walk"):
+        pass
+    timings.add("parse.sqlglot", 0.5)
+    timings.add("parse.sqlglot", 0.25)
+    timings.add_file("a.sql", 0.1)
+    timings.add_file("b.sql", 0.3)
+    timings.add_file("c.sql", 0.2)
+
+    assert timings.phases["parse.sqlglot"] == 0.75
+    assert [path for path, _ in timings.slowest(2)] == ["b.sql", "c.sql"]
+    summary = timings.as_dict(limit=1)
+    assert summary["files"] == 3
+    assert summary["slowestFiles"] == [{"path": "b.sql", "ms": 300.0}]
+    assert set(summary["phases"]) == {"walk", "parse.sqlglot"}
+
+
+def test_parse_and_build_are_timed(tmp_path):
+    (tmp_path / "a.sql").write_text("CREATE TABLE a AS SELECT * FROM b")
+    (tmp_path / "b.sql").write_text("CREATE TABLE b AS SELECT 1 AS x")
+    timings = Timings()
+    parsed = dict(parse_files(sorted(str(p) for p in tmp_path.iterdir()), timings=timings))
+    tables = {}
+    for records in parsed.values():
+        tables.update(records)
+    build_graph(tables, timings=timings)
+
+    assert {"read", "parse", "parse.sqlglot", "parse.extract", "resolve", "edges"} <= set(timings.phases)
+    assert sorted(timings.files) == sorted(parsed)
+
+
+def test_prometheus_rendering():
+    metrics = Metrics()
+    timings = Timings()
+    timings.add("parse", 1.5)
+    timings.add_file('odd"name.sql', 1.5)
+    metrics.observe(timings, {"cache_hits": 2, "cache_misses": 1, "degraded": 0})
+    metrics.set_gauge("graph_nodes", 7)
+    chunks = list(timed_iter(iter(["a", "b"]), lambda seconds: metrics.add_phase("serialise", seconds)))
+
+    text = metrics.render()
+    assert chunks == ["a", "b"]
+    assert 'sql_dag_flow_phase_seconds_total{phase="parse"} 1.500000' in text
+    assert 'sql_dag_flow_phase_calls_total{phase="serialise"} 1' in text
+    assert "sql_dag_flow_cache_hits_total 2" in text
+    assert "sql_dag_flow_graph_nodes 7" in text
+    assert 'sql_dag_flow_file_parse_seconds{path="odd\\"name.sql"} 1.500000' in text
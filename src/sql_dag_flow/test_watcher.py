@@ -0,0 +1,45 @@
+import os
+from sql_dag_flow.watcher import PollingWatcher
+
+
+def test_poll_reports_created_modified_deleted_and_renamed(tmp_path):
+    (tmp_path / "a.sql").write_text("SELECT 1")
+    (tmp_path / "b.sql").write_text("SELECT 2")
+    (tmp_path / "c.sql").write_text("SELECT 3")
+    (tmp_path / "notes.txt").write_text("ignored")
+    watcher = PollingWatcher(str(tmp_path), on_change=None)
+    assert watcher.poll() == [] # First snapshot
+
+    (tmp_path / "d.sql").write_text("SELECT 4 -- new")
+    (tmp_path / "a.sql").write_text("SELECT 1 + 1")
+    (tmp_path / "b.sql").unlink()
+    os.rename(tmp_path / "c.sql", tmp_path / "e.sql")
+    (tmp_path / "notes.txt").write_text("still ignored")
+
+    changes = watcher.poll()
+    assert sorted(changes, key=lambda change: change["path"]) == [
+        {"event": "modified", "path": str(tmp_path / "a.sql")},
+        {"event": "deleted", "path": str(tmp_path / "b.sql")},
+        {"event": "created", "path": str(tmp_path / "d.sql")},
+        {"event": "renamed", "path": str(tmp_path / "e.sql"), "src_path": str(tmp_path / "c.sql")},
+    ]
+    assert watcher.poll() == []
+
+
+def test_watcher_thread_calls_on_change(tmp_path):
+    import threading
+    received = []
+    called = threading.Event()
+
+    def on_change(changes):
+        received.extend(changes)
+        called.set()
+
+    watcher = PollingWatcher(str(tmp_path), on_change, interval=0.05)
+    watcher.start()
+    try:
+        (tmp_path / "a.sql").write_text("SELECT 1")
+        assert called.wait(5)
+    finally:
+        watcher.stop()
+    assert received == [{"event": "created", "path": str(tmp_path / "a.sql")}]
@@ -0,0 +1,147 @@
+import time
+import threading
+from contextlib import contextmanager, nullcontext
+
+# Files listed by default in "slowest files" reports
+SLOWEST_FILES = 10
+
+
+class Timings:
+    """
+    Durations collected while building one graph: wall-clock seconds per phase
+    (walk, read, parse, resolve, ancestors...) and the parse time of every file.
+    Phases named "parse.*" are sums over files, possibly spread across worker processes.
+    """
+
+    def __init__(self):
+        self.phases = {}
+        self.files = {} # path -> seconds spent parsing it
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def add(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def add_file(self, path, seconds):
+        self.files[path] = seconds
+
+    def slowest(self, limit=SLOWEST_FILES):
+        """[(path, seconds)] of the slowest files to parse, slowest first."""
+        return sorted(self.files.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+    def as_dict(self, limit=SLOWEST_FILES):
+        """JSON-friendly summary, in milliseconds."""
+        return {
+            "unit": "ms",
+            "phases": {name: round(seconds * 1000, 3) for name, seconds in self.phases.items()},
+            "files": len(self.files),
+            "slowestFiles": [{"path": path, "ms": round(seconds * 1000, 3)} for path, seconds in self.slowest(limit)],
+        }
+
+
+def phase(timings, name):
+    """timings.phase(name), or a no-op context when timings is None."""
+    return timings.phase(name) if timings is not None else nullcontext()
+
+
+def timed_iter(chunks, on_done):
+    """
+    Yields from `chunks`, measuring only the time spent producing them (not the time
+    the consumer takes between chunks), then calls on_done(seconds).
+    """
+    iterator = iter(chunks)
+    total = 0.0
+    while True:
+        started = time.perf_counter()
+        try:
+            chunk = next(iterator)
+        except StopIteration:
+            total += time.perf_counter() - started
+            break
+        total += time.perf_counter() - started
+        yield chunk
+    on_done(total)
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metrics:
+    """
+    Process-wide totals of every graph build, rendered in the Prometheus text format.
+    Keeps the last parse time of every file for "slowest files" reports.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.phase_seconds = {}
+        self.phase_calls = {}
+        self.counters = {}
+        self.gauges = {}
+        self.file_seconds = {}
+
+    def observe(self, timings, stats=None):
+        """Adds a finished build: its Timings and, optionally, its parse_files stats."""
+        with self._lock:
+            for name, seconds in timings.phases.items():
+                self.phase_seconds[name] = self.phase_seconds.get(name, 0.0) + seconds
+                self.phase_calls[name] = self.phase_calls.get(name, 0) + 1
+            self.file_seconds.update(timings.files)
+            self.counters["builds"] = self.counters.get("builds", 0) + 1
+            for key in ("cache_hits", "cache_misses", "degraded"):
+                if stats and isinstance(stats.get(key), int):
+                    self.counters[key] = self.counters.get(key, 0) + stats[key]
+            self.counters["files_parsed"] = self.counters.get("files_parsed", 0) + len(timings.files)
+
+    def add_phase(self, name, seconds):
+        with self._lock:
+            self.phase_seconds[name] = self.phase_seconds.get(name, 0.0) + seconds
+            self.phase_calls[name] = self.phase_calls.get(name, 0) + 1
+
+    def set_gauge(self, name, value):
+        with self._lock:
+            self.gauges[name] = value
+
+    def slowest_files(self, limit=SLOWEST_FILES):
+        with self._lock:
+            items = list(self.file_seconds.items())
+        return sorted(items, key=lambda item: item[1], reverse=True)[:limit]
+
+    def render(self, slowest=SLOWEST_FILES):
+        """Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            phase_seconds = dict(self.phase_seconds)
+            phase_calls = dict(self.phase_calls)
+            counters = dict(self.counters)
+            gauges = dict(self.gauges)
+
+        lines = [
+            "# HELP sql_dag_flow_phase_seconds_total Time spent in each graph build phase.",
+            "# TYPE sql_dag_flow_phase_seconds_total counter",
+        ]
+        lines += [f'sql_dag_flow_phase_seconds_total{{phase="{_escape_label(name)}"}} {seconds:.6f}'
+                  for name, seconds in phase_seconds.items()]
+        lines += [
+            "# HELP sql_dag_flow_phase_calls_total Number of times each graph build phase ran.",
+            "# TYPE sql_dag_flow_phase_calls_total counter",
+        ]
+        lines += [f'sql_dag_flow_phase_calls_total{{phase="{_escape_label(name)}"}} {calls}'
+                  for name, calls in phase_calls.items()]
+        for name, value in counters.items():
+            lines += [f"# TYPE sql_dag_flow_{name}_total counter", f"sql_dag_flow_{name}_total {value}"]
+        for name, value in gauges.items():
+            lines += [f"# TYPE sql_dag_flow_{name} gauge", f"sql_dag_flow_{name} {value}"]
+        lines += [
+            "# HELP sql_dag_flow_file_parse_seconds Last parse time of the slowest files.",
+            "# TYPE sql_dag_flow_file_parse_seconds gauge",
+        ]
+        lines += [f'sql_dag_flow_file_parse_seconds{{path="{_escape_label(path)}"}} {seconds:.6f}'
+                  for path, seconds in self.slowest_files(slowest)]
+        return "\n".join(lines) + "\n"
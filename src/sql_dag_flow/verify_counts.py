@@ -1,4 +1,4 @@
-from parser import parse_sql_files, build_graph
+from sql_dag_flow.parser import parse_sql_files, build_graph
 import os
 
 # Use the example directory
@@ -0,0 +1,126 @@
+import os
+import threading
+from .scanner import iter_sql_files
+
+try:
+    # Optional: native filesystem notifications. Without it we simply poll.
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+
+class _WakeHandler(FileSystemEventHandler):
+    """Wakes the polling loop as soon as the OS reports a change."""
+
+    def __init__(self, wake_event):
+        self.wake_event = wake_event
+
+    def on_any_event(self, event):
+        self.wake_event.set()
+
+
+class PollingWatcher:
+    """
+    Watches a directory tree for .sql file changes.
+
+    Changes are detected by diffing (mtime, size) snapshots, so it works everywhere.
+    When the optional `watchdog` package is installed, native notifications are used
+    to trigger a scan immediately instead of waiting for the next poll.
+
+    `on_change` is called from the watcher thread with a list of changes:
+    {"event": "created" | "modified" | "deleted", "path": ...} or
+    {"event": "renamed", "path": new_path, "src_path": old_path}.
+    """
+
+    def __init__(self, directory, on_change, interval=1.0):
+        self.directory = directory
+        self.on_change = on_change
+        self.interval = interval
+        self._snapshot = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+        self._observer = None
+
+    def snapshot(self):
+        files = {}
+        # Ignored folders (.git, node_modules...) are skipped like the folder picker does
+        for path in iter_sql_files(self.directory):
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue # Deleted while walking
+            files[path] = (st.st_mtime_ns, st.st_size)
+        return files
+
+    def poll(self):
+        """Takes a new snapshot and returns the changes since the previous one."""
+        current = self.snapshot()
+        previous = self._snapshot
+        self._snapshot = current
+        if previous is None:
+            return []
+
+        created = [p for p in current if p not in previous]
+        deleted = [p for p in previous if p not in current]
+        modified = [p for p in current if p in previous and current[p] != previous[p]]
+
+        changes = []
+        # A rename keeps mtime and size, so pair up deletions and creations on that signature
+        deleted_by_sig = {}
+        for path in deleted:
+            deleted_by_sig.setdefault(previous[path], []).append(path)
+        for path in created:
+            candidates = deleted_by_sig.get(current[path])
+            if candidates:
+                changes.append({"event": "renamed", "path": path, "src_path": candidates.pop(0)})
+            else:
+                changes.append({"event": "created", "path": path})
+        for paths in deleted_by_sig.values():
+            for path in paths:
+                changes.append({"event": "deleted", "path": path})
+        for path in modified:
+            changes.append({"event": "modified", "path": path})
+        return changes
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._snapshot = self.snapshot()
+
+        if Observer is not None:
+            try:
+                self._observer = Observer()
+                self._observer.schedule(_WakeHandler(self._wake), self.directory, recursive=True)
+                self._observer.start()
+            except Exception as e:
+                print(f"Native file watching unavailable ({e}), polling every {self.interval}s")
+                self._observer = None
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer = None
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            try:
+                changes = self.poll()
+                if changes:
+                    self.on_change(changes)
+            except Exception as e:
+                print(f"Error while watching {self.directory}: {e}")